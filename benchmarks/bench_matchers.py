@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Compare the gene matchers used by the rules model.
+
+Candidate words are sampled from the gene list and from common words
+so that both hits and misses are measured. The script checks that all
+matchers return identical results before reporting their timings.
+
+Usage:
+    $ python -m benchmarks.bench_matchers --candidates 2000
+"""
+import argparse
+import random
+import time
+
+from pangaea import GENES_FILE, STEMS_FILE
+from pangaea import models
+from pangaea.matchers import MATCHERS
+
+WORDS = ['protein', 'expression', 'cells', 'cancer', 'mutation', 'pathway',
+         'tumour', 'binding', 'receptor', 'kinase', 'activity', 'levels']
+
+
+def get_candidates(genes, number, seed=0):
+    """Build candidate words similar to the ones built from n-grams"""
+    random.seed(seed)
+    candidates = []
+    for _ in range(number):
+        parts = random.sample(WORDS, random.randint(0, 3))
+        if random.random() < 0.5:
+            parts.append(random.choice(genes))
+        random.shuffle(parts)
+        candidates.append(''.join(parts) or random.choice(WORDS))
+    return candidates
+
+
+def time_matcher(matcher, candidates):
+    start = time.perf_counter()
+    results = [matcher.match(candidate) for candidate in candidates]
+    return time.perf_counter() - start, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark gene matchers')
+    parser.add_argument('--genes', '-g', default=GENES_FILE)
+    parser.add_argument('--synonyms', '-s', default=None)
+    parser.add_argument('--candidates', '-n', type=int, default=2000)
+    args = parser.parse_args()
+
+    model = models.RulesExtractor(args.genes, STEMS_FILE, args.synonyms, matcher='scan')
+    genes = list(model.genes_short) + list(model.genes_long)
+    candidates = get_candidates(genes, args.candidates)
+    print('{:,} short genes, {:,} long genes, {:,} candidates'.format(
+        len(model.genes_short), len(model.genes_long), len(candidates)))
+
+    timings = {}
+    expected = None
+    for name, matcher_class in sorted(MATCHERS.items(), reverse=True):
+        start = time.perf_counter()
+        matcher = matcher_class(model.genes_short, model.genes_long)
+        build_time = time.perf_counter() - start
+        elapsed, results = time_matcher(matcher, candidates)
+        if expected is None:
+            expected = results
+        elif results != expected:
+            raise SystemExit('Matcher "{}" returned different results'.format(name))
+        timings[name] = elapsed
+        print('{:>6}: build {:8.3f}s, match {:8.3f}s ({:,.0f} candidates/s)'.format(
+            name, build_time, elapsed, len(candidates) / elapsed))
+
+    print('Speed-up: {:,.0f}x'.format(timings['scan'] / timings['index']))
+
+
+if __name__ == '__main__':
+    main()
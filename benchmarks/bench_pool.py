@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""Measure the cost of sending the model to the worker processes.
+
+Reports the startup time of each worker process (from the creation of
+the pool until the worker has received the model), and the number of
+bytes pickled per article when the model is sent with every task, as
+it used to be, compared with sending it once per worker.
+
+Usage:
+    $ python -m benchmarks.bench_pool --cores 4
+"""
+import argparse
+import functools
+import multiprocessing as mp
+import pickle
+import time
+
+from pangaea import GENES_FILE, STEMS_FILE
+from pangaea import models, parser
+
+XML_FILE = 'pangaea/data/test/tp53_test.xml'
+CHUNKSIZE = 5
+
+
+def timed_init(started, times, model=None):
+    parser.init_worker(model)
+    times.put(time.time() - started)
+
+
+def startup_times(method, model, cores):
+    """Return the startup time of each worker process"""
+    context = mp.get_context(method)
+    times = context.Queue()
+    started = time.time()
+    if method == 'fork':
+        parser._worker.update(model=model)
+        initargs = (started, times)
+    else:
+        initargs = (started, times, model)
+    with context.Pool(processes=cores, initializer=timed_init, initargs=initargs):
+        return sorted(times.get() for _ in range(cores))
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark worker startup and IPC')
+    arg_parser.add_argument('--cores', '-c', type=int, default=4)
+    arg_parser.add_argument('--synonyms', '-s', default=None)
+    args = arg_parser.parse_args()
+
+    model = models.RulesExtractor(GENES_FILE, STEMS_FILE, args.synonyms)
+    papers = list(parser.Parser(XML_FILE, model, '', args.cores).parse_papers())
+
+    article_bytes = sum(len(pickle.dumps(paper)) for paper in papers) / len(papers)
+    task = functools.partial(parser.Parser.extract_features, model=model)
+    model_bytes = len(pickle.dumps(task))
+    print('IPC bytes per article:')
+    print('  model in every task:  {:12,.0f}'.format(article_bytes + model_bytes / CHUNKSIZE))
+    print('  model once per worker:{:12,.0f}'.format(article_bytes))
+
+    print('Worker startup time (s):')
+    for method in mp.get_all_start_methods():
+        times = startup_times(method, model, args.cores)
+        print('  {:>10}: min {:.3f}, max {:.3f}'.format(method, times[0], times[-1]))
+
+
+if __name__ == '__main__':
+    main()
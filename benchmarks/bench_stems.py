@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""Compare the ways of finding the relation stems in the sentences.
+
+The sentences of the demo results are scanned for the relation stems by
+checking each stem separately (as before) and with a `StemMatcher`. Extra
+random stems can be added to measure larger `--relations` files. The
+script checks that both methods return identical stems before reporting
+their timings.
+
+Usage:
+    $ python -m benchmarks.bench_stems --extra-stems 5000
+"""
+import argparse
+import json
+import random
+import string
+import time
+
+from pangaea import STEMS_FILE
+from pangaea import utils
+from pangaea.matchers import StemMatcher
+
+DEMO_FILE = 'pangaea/data/demo/demo.json'
+
+
+def get_sentences(filename):
+    with open(filename) as f:
+        return [relation['Sentence'] for result in json.load(f) for relation in result['Relations']]
+
+
+def random_stems(number, seed=0):
+    random.seed(seed)
+    return [''.join(random.choice(string.ascii_lowercase) for _ in range(random.randint(4, 9)))
+            for _ in range(number)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark relation stem matching')
+    parser.add_argument('--relations', '-r', default=STEMS_FILE)
+    parser.add_argument('--extra-stems', '-n', type=int, default=0,
+                        help='Number of random stems added to the relation stems')
+    args = parser.parse_args()
+
+    stems = utils.parse_file(args.relations) + random_stems(args.extra_stems)
+    sentences = get_sentences(DEMO_FILE)
+    print('{:,} stems, {:,} sentences'.format(len(stems), len(sentences)))
+
+    start = time.perf_counter()
+    expected = [[stem for stem in stems if stem in sentence] for sentence in sentences]
+    scan_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    stem_matcher = StemMatcher(stems)
+    build_time = time.perf_counter() - start
+    start = time.perf_counter()
+    results = [stem_matcher.find(sentence) for sentence in sentences]
+    matcher_time = time.perf_counter() - start
+    if results != expected:
+        raise SystemExit('StemMatcher returned different stems')
+
+    print('   scan: {:8.3f}s ({:,.0f} sentences/s)'.format(scan_time, len(sentences) / scan_time))
+    print('matcher: {:8.3f}s ({:,.0f} sentences/s), built in {:.3f}s'.format(
+        matcher_time, len(sentences) / matcher_time, build_time))
+
+
+if __name__ == '__main__':
+    main()
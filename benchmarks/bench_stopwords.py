@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""Measure stopword removal per sentence.
+
+Compares reading the stopwords file for every word (the previous
+approach) against a set loaded once, using the sentences stored in
+the demo output.
+
+Usage:
+    $ python -m benchmarks.bench_stopwords --sentences 200
+"""
+import argparse
+import json
+import time
+
+from pangaea import utils
+
+DEMO_FILE = 'pangaea/data/demo/demo.json'
+
+
+def get_sentences(number):
+    with open(DEMO_FILE) as f:
+        articles = json.load(f)
+    sentences = [relation['Sentence'].lower().split()
+                 for article in articles for relation in article['Relations']]
+    return sentences[:number]
+
+
+def per_sentence(function, sentences):
+    start = time.perf_counter()
+    for words in sentences:
+        function(words)
+    return (time.perf_counter() - start) / len(sentences)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark stopword removal')
+    parser.add_argument('--sentences', '-n', type=int, default=200)
+    args = parser.parse_args()
+    sentences = get_sentences(args.sentences)
+
+    stopwords = utils.load_stopwords()
+    reread = per_sentence(
+        lambda words: [word for word in words if word not in utils.get_stopwords()], sentences)
+    preloaded = per_sentence(
+        lambda words: [word for word in words if word not in stopwords], sentences)
+
+    print('{:,} sentences'.format(len(sentences)))
+    print('Re-read per word: {:10.1f} us/sentence'.format(reread * 1e6))
+    print('Preloaded set:    {:10.1f} us/sentence'.format(preloaded * 1e6))
+    print('Speed-up: {:,.0f}x'.format(reread / preloaded))
+
+
+if __name__ == '__main__':
+    main()
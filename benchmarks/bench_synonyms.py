@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Compare the ways of resolving the synonyms of the genes.
+
+The test synonyms database is scaled up with random genes, and the genes
+provided by the user are drawn from its symbols and synonyms. The synonyms
+are resolved with the previous implementation of `process_synonyms`, which
+searched the list of genes for every symbol and synonym, and with
+`utils.resolve_synonyms`. The script checks that both return the same
+synonyms before reporting their timings.
+
+The previous implementation modified the lists of the database, and it
+never finished when the lowercase symbol of a gene matched by a synonym
+was also in the genes, so the random genes never use such names.
+
+Usage:
+    $ python -m benchmarks.bench_synonyms --extra-genes 20000 --genes 2000
+"""
+import argparse
+import copy
+import json
+import random
+import string
+import time
+
+from pangaea import utils
+
+SYNONYMS_FILE = 'pangaea/data/test/gene_to_synonyms_test.json'
+
+
+def previous_process_synonyms(genes, gene_to_syns):
+    target_to_syns = {}
+    targets_lower = [target.lower() for target in genes]
+
+    for symbol, synonyms in gene_to_syns.items():
+        if symbol in genes:
+            target_to_syns[symbol] = synonyms
+        else:
+            for synonym in synonyms:
+                if synonym.lower() in targets_lower:
+                    target_to_syns[synonym] = synonyms
+                    target_to_syns[synonym].append(symbol)
+
+    return target_to_syns
+
+
+def random_name(length):
+    return ''.join(random.choice(string.ascii_uppercase + string.digits) for _ in range(length))
+
+
+def scale_database(gene_to_syns, extra_genes, seed=0):
+    random.seed(seed)
+    database = dict(gene_to_syns)
+    for _ in range(extra_genes):
+        database['G' + random_name(7)] = ['s' + random_name(6).lower()
+                                          for _ in range(random.randint(0, 5))]
+    return database
+
+
+def random_genes(database, number):
+    genes = []
+    for symbol, synonyms in random.sample(list(database.items()), number):
+        if synonyms and random.random() < 0.5:
+            genes.append(random.choice(synonyms))
+        else:
+            genes.append(symbol)
+    # Leave out the genes which would make the previous implementation loop forever
+    symbols_lower = set(symbol.lower() for symbol in database)
+    return [gene for gene in genes if gene in database or gene.lower() not in symbols_lower]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark synonym resolution')
+    parser.add_argument('--synonyms', '-s', default=SYNONYMS_FILE)
+    parser.add_argument('--extra-genes', '-n', type=int, default=20000,
+                        help='Number of random genes added to the synonyms database')
+    parser.add_argument('--genes', '-g', type=int, default=2000,
+                        help='Number of genes provided by the user')
+    args = parser.parse_args()
+
+    with open(args.synonyms) as f:
+        database = scale_database(json.load(f), args.extra_genes)
+    genes = random_genes(database, min(args.genes, len(database)))
+    print('{:,} genes in the database, {:,} genes provided'.format(len(database), len(genes)))
+
+    previous_database = copy.deepcopy(database)
+    start = time.perf_counter()
+    expected = previous_process_synonyms(genes, previous_database)
+    previous_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results, canonical = utils.resolve_synonyms(genes, database)
+    resolve_time = time.perf_counter() - start
+    if results != expected:
+        raise SystemExit('resolve_synonyms returned different synonyms')
+
+    print('previous: {:8.3f}s'.format(previous_time))
+    print(' resolve: {:8.3f}s ({:.0f}x faster), {:,} canonical names'.format(
+        resolve_time, previous_time / resolve_time, len(canonical)))
+
+
+if __name__ == '__main__':
+    main()
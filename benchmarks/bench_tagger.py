@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""Compare the throughput of POS tagging one sentence at a time and in batches.
+
+The sentences of the abstracts in an XML file are prepared as in the rules
+model (punctuation and stopwords removed), and tagged with:
+    - `nltk.pos_tag`, one sentence at a time (as before);
+    - `BatchTagger` without NumPy, which tags the sentences one at a time
+      with a single tagger;
+    - `BatchTagger` with NumPy, which scores the words of a whole batch
+      together.
+The script checks that all methods return identical tags before reporting
+the number of tokens tagged per second.
+
+Usage:
+    $ python -m benchmarks.bench_tagger --repeat 10 --batch-size 500
+"""
+import argparse
+import time
+
+import nltk
+
+from pangaea import utils
+from pangaea.parser import iter_articles
+from pangaea.preprocess import normalize
+from pangaea.tagger import BatchTagger, np
+
+XML_FILE = 'pangaea/data/test/tp53_test.xml'
+
+
+def get_sentences(xml_file, repeat):
+    stopwords = utils.load_stopwords()
+    sentences = []
+    for paper in iter_articles(xml_file):
+        for sentence in nltk.sent_tokenize(paper['Abstract']):
+            words = nltk.word_tokenize(normalize(sentence))
+            sentences.append([word for word in words if word not in stopwords])
+    return sentences * repeat
+
+
+def time_tagger(tag_sents, sentences, batch_size):
+    start = time.perf_counter()
+    tagged = []
+    for batch in utils.chunks(sentences, batch_size):
+        tagged.extend(tag_sents(batch))
+    return time.perf_counter() - start, tagged
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark batch POS tagging')
+    parser.add_argument('--xml-file', default=XML_FILE)
+    parser.add_argument('--repeat', '-n', type=int, default=10,
+                        help='Number of times the sentences are repeated')
+    parser.add_argument('--batch-size', '-b', type=int, default=500,
+                        help='Number of sentences tagged at once')
+    args = parser.parse_args()
+
+    sentences = get_sentences(args.xml_file, args.repeat)
+    tokens = sum(len(sentence) for sentence in sentences)
+    print('{:,} sentences, {:,} tokens'.format(len(sentences), tokens))
+
+    taggers = [('nltk.pos_tag', lambda batch: [nltk.pos_tag(words) for words in batch]),
+               ('batch (python)', BatchTagger(vectorize=False).tag_sents)]
+    if np is not None:
+        start = time.perf_counter()
+        taggers.append(('batch (numpy)', BatchTagger(vectorize=True).tag_sents))
+        print('Weight matrix built in {:.2f}s'.format(time.perf_counter() - start))
+    else:
+        print('NumPy is not installed, skipping the vectorized tagger')
+
+    expected = None
+    for name, tag_sents in taggers:
+        elapsed, tagged = time_tagger(tag_sents, sentences, args.batch_size)
+        if expected is None:
+            expected = tagged
+        elif tagged != expected:
+            raise SystemExit('{} returned different tags'.format(name))
+        print('{:>15}: {:10,.0f} tokens/s'.format(name, tokens / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""Measure the extraction throughput and its scaling with the number of cores.
+
+A synthetic XML file (see `benchmarks.synthetic`) is generated, and the
+following are measured, each one `--repeat` times (the best time is kept):
+    - `parse_sentence.<model>`: time taken by `model.parse` per sentence,
+      for the rules and the simple models;
+    - `parse_papers`: throughput of `Parser.parse_papers` (XML parsing);
+    - `process_papers.cores_<n>`: end-to-end throughput of
+      `Parser.process_papers` with 1 to `--cores` processes.
+
+Everything runs offline, from the data shipped with the package. The
+results are written to a JSON file together with the commit and the
+machine they were measured on, and `--compare` reports the change of
+each throughput against the results of a previous run, so regressions
+can be spotted across commits.
+
+Usage:
+    $ python -m benchmarks.suite --size 20 --cores 4 --output results.json
+    $ python -m benchmarks.suite --size 20 --cores 4 --compare results.json
+    $ python -m benchmarks.suite --size 20 --cores 4 --scheduler adaptive --compare results.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import multiprocessing as mp
+
+from pangaea import GENES_FILE, STEMS_FILE
+from pangaea import models
+from pangaea.parser import Parser
+from pangaea.scheduler import SCHEDULERS
+
+from benchmarks import synthetic
+
+REGRESSION = 0.1 # Relative loss of throughput reported as a regression
+
+
+def get_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def best_time(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def get_models():
+    return {
+        'rules': models.RulesExtractor(GENES_FILE, STEMS_FILE),
+        'simple': models.SimpleExtractor(GENES_FILE, STEMS_FILE),
+    }
+
+
+def bench_parse_sentence(model, sentences, repeat):
+    seconds = best_time(lambda: [model.parse(sentence) for sentence in sentences], repeat)
+    return {
+        'sentences': len(sentences),
+        'seconds': seconds,
+        'sentences_per_second': len(sentences) / seconds,
+        'us_per_sentence': seconds / len(sentences) * 10 ** 6,
+    }
+
+
+def bench_parse_papers(xml_file, repeat):
+    papers = []
+    seconds = best_time(lambda: papers.append(len(list(Parser(xml_file, None, '', 1).parse_papers()))),
+                        repeat)
+    size = os.path.getsize(xml_file) / 10 ** 6
+    return {
+        'megabytes': size,
+        'seconds': seconds,
+        'mb_per_second': size / seconds,
+        'papers_per_second': papers[0] / seconds,
+    }
+
+
+def bench_process_papers(xml_file, model, cores, papers, repeat, output_dir, scheduler='fixed'):
+    output_file = os.path.join(output_dir, 'output_{}'.format(cores))
+
+    def run():
+        # The progress bar and the summary are not part of the benchmark
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            Parser(xml_file, model, output_file, cores, scheduler=scheduler).process_papers()
+
+    seconds = best_time(run, repeat)
+    return {
+        'cores': cores,
+        'seconds': seconds,
+        'papers_per_second': papers / seconds,
+    }
+
+
+def run_suite(args):
+    results = {}
+    all_models = get_models()
+    sentences = random.Random(args.seed).sample(synthetic.load_sentences(), args.sentences)
+    for name, model in all_models.items():
+        print('Parsing {:,} sentences with the {} model...'.format(len(sentences), name))
+        results['parse_sentence.{}'.format(name)] = bench_parse_sentence(model, sentences, args.repeat)
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        xml_file = os.path.join(output_dir, 'synthetic.xml')
+        papers = synthetic.generate_xml(xml_file, size=args.size, seed=args.seed)
+        print('Parsing {:,} papers ({:.1f} MB) from XML...'.format(
+            papers, os.path.getsize(xml_file) / 10 ** 6))
+        results['parse_papers'] = bench_parse_papers(xml_file, args.repeat)
+        for cores in range(1, args.cores + 1):
+            print('Processing {:,} papers with {} core{}...'.format(
+                papers, cores, 's' if cores > 1 else ''))
+            results['process_papers.cores_{}'.format(cores)] = bench_process_papers(
+                xml_file, all_models['rules'], cores, papers, args.repeat, output_dir, args.scheduler)
+    single = results['process_papers.cores_1']['papers_per_second']
+    for cores in range(1, args.cores + 1):
+        result = results['process_papers.cores_{}'.format(cores)]
+        result['speedup'] = result['papers_per_second'] / single
+    return results
+
+
+def get_throughputs(results):
+    """Return the throughputs (higher is better) of the results of a run"""
+    return {
+        '{}.{}'.format(name, key): value
+        for name, result in results.items() for key, value in result.items()
+        if key.endswith('_per_second')
+    }
+
+
+def compare(results, previous):
+    """Print the change of each throughput from a previous run.
+
+    Returns:
+        list: Names of the throughputs which dropped by more than `REGRESSION`.
+    """
+    print('Compared with {} ({}):'.format(previous.get('commit'), previous.get('date')))
+    current = get_throughputs(results)
+    before = get_throughputs(previous['results'])
+    regressions = []
+    for name in sorted(current):
+        if name not in before:
+            continue
+        change = current[name] / before[name] - 1
+        flag = ''
+        if change < -REGRESSION:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print('  {:45} {:12,.1f} {:+7.1%}{}'.format(name, current[name], change, flag))
+    return regressions
+
+
+def print_results(results):
+    for name, value in sorted(get_throughputs(results).items()):
+        print('  {:45} {:12,.1f}'.format(name, value))
+    for name, result in sorted(results.items()):
+        if 'speedup' in result:
+            print('  {:45} {:12.2f}x'.format(name + '.speedup', result['speedup']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark extraction throughput and scaling')
+    parser.add_argument('--size', type=float, default=10,
+                        help='Approximate size of the synthetic XML file (MB)')
+    parser.add_argument('--sentences', type=int, default=500,
+                        help='Number of sentences parsed by each model')
+    parser.add_argument('--cores', '-c', type=int, default=mp.cpu_count(),
+                        help='Maximum number of processes used by process_papers')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs of each benchmark')
+    parser.add_argument('--scheduler', default='fixed', choices=sorted(SCHEDULERS),
+                        help='Scheduler used by process_papers')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', '-o', help='Write the results to a JSON file')
+    parser.add_argument('--compare', help='JSON file of a previous run to compare with')
+    args = parser.parse_args()
+
+    report = {
+        'commit': get_commit(),
+        'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': mp.cpu_count(),
+        'parameters': {
+            'size': args.size, 'sentences': args.sentences, 'cores': args.cores,
+            'repeat': args.repeat, 'seed': args.seed, 'scheduler': args.scheduler,
+        },
+        'results': run_suite(args),
+    }
+    print('Throughput:')
+    print_results(report['results'])
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print('Results written to {}'.format(args.output))
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report['results'], json.load(f))
+        if regressions:
+            sys.exit('{} regression(s) found'.format(len(regressions)))
+
+
+if __name__ == '__main__':
+    main()
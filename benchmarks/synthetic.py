@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""Generate synthetic PubMed XML files of any size for the benchmarks.
+
+The articles of `tp53_test.xml` are used as templates, so the synthetic
+articles have the same structure as the articles returned by Entrez.
+Each article gets a new PMID and an abstract made of random sentences
+taken from the abstracts of the test file and from the relations of the
+demo results, so that a realistic share of the sentences contain genes
+and relation stems. The file is generated from a seed, so the same
+arguments always produce the same file.
+
+Usage:
+    $ python -m benchmarks.synthetic --size 50 --output synthetic.xml
+"""
+import argparse
+import copy
+import json
+import random
+import re
+
+from lxml import etree
+
+XML_FILE = 'pangaea/data/test/tp53_test.xml'
+DEMO_FILE = 'pangaea/data/demo/demo.json'
+
+HEADER = b'<?xml version="1.0" ?>\n<PubmedArticleSet>\n'
+FOOTER = b'</PubmedArticleSet>\n'
+FIRST_PMID = 90000000 # Synthetic PMIDs do not collide with the test articles
+MIN_SENTENCES = 3
+MAX_SENTENCES = 12
+
+
+def load_templates(xml_file=XML_FILE):
+    """Return the `PubmedArticle` elements of an XML file"""
+    return etree.parse(xml_file).getroot().findall('PubmedArticle')
+
+
+def load_sentences(xml_file=XML_FILE, demo_file=DEMO_FILE):
+    """Return the sentences of the test abstracts and of the demo relations"""
+    sentences = []
+    for article in load_templates(xml_file):
+        abstract = ''.join(article.find('MedlineCitation/Article/Abstract').itertext())
+        sentences.extend(sentence.strip() for sentence in re.split(r'(?<=\.)\s+', abstract)
+                         if sentence.strip())
+    with open(demo_file) as f:
+        sentences.extend(relation['Sentence'] for result in json.load(f)
+                         for relation in result['Relations'])
+    return sentences
+
+
+def iter_articles(templates, sentences, seed=0):
+    """Generate synthetic articles as XML (bytes), one at a time"""
+    rng = random.Random(seed)
+    pmid = FIRST_PMID
+    while True:
+        article = copy.deepcopy(rng.choice(templates))
+        article.find('MedlineCitation/PMID').text = str(pmid)
+        abstract = article.find('MedlineCitation/Article/Abstract')
+        for child in list(abstract):
+            abstract.remove(child)
+        text = etree.SubElement(abstract, 'AbstractText')
+        text.text = ' '.join(rng.choice(sentences)
+                             for _ in range(rng.randint(MIN_SENTENCES, MAX_SENTENCES)))
+        yield etree.tostring(article) + b'\n'
+        pmid += 1
+
+
+def generate_xml(filename, size=None, articles=None, seed=0):
+    """Write a synthetic XML file.
+
+    Args:
+        filename (str): Path of the XML file.
+        size (float, optional): Approximate size of the file, in MB.
+        articles (int, optional): Number of articles. Either `size` or
+            `articles` must be given.
+        seed (int, optional): Seed of the random generator.
+
+    Returns:
+        int: Number of articles written.
+    """
+    if size is None and articles is None:
+        raise ValueError('Either the size or the number of articles must be given.')
+    templates = load_templates()
+    sentences = load_sentences()
+    written = 0
+    with open(filename, 'wb') as f:
+        f.write(HEADER)
+        total = len(HEADER) + len(FOOTER)
+        for article in iter_articles(templates, sentences, seed):
+            if articles is not None and written >= articles:
+                break
+            if size is not None and total >= size * 10 ** 6:
+                break
+            f.write(article)
+            total += len(article)
+            written += 1
+        f.write(FOOTER)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic PubMed XML file')
+    parser.add_argument('--output', '-o', default='synthetic.xml')
+    parser.add_argument('--size', type=float, help='Approximate size of the file (MB)')
+    parser.add_argument('--articles', '-n', type=int, help='Number of articles')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    if args.size is None and args.articles is None:
+        args.size = 10
+    written = generate_xml(args.output, args.size, args.articles, args.seed)
+    print('{:,} articles written to {}'.format(written, args.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""Cache the relations extracted from each paper between runs.
+
+Two caches are kept in SQLite databases:
+    - `ExtractionCache` stores the relations extracted by a model;
+    - `DocumentCache` stores the sentences and POS tagged words of the
+      abstracts (see `pangaea.preprocess`), which do not depend on the
+      model, so switching gene lists or models does not tag the
+      sentences again.
+
+The relations extracted from a paper depend only on its abstract and on
+the configuration of the model, so they are stored in an SQLite database
+keyed by the PMID and the fingerprint of the model, together with a hash
+of the abstract. A paper is extracted again only if its abstract changed,
+or if it was never processed with the same model configuration.
+
+The worker processes only read from the caches, and the new entries are
+written by the main process, so there is a single writer. The database
+uses write-ahead logging, which lets the workers read while it is written.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import zlib
+
+TIMEOUT = 60 # Seconds to wait for the database to be unlocked
+
+
+def hash_text(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class SQLiteCache:
+    """Base class of the caches stored in an SQLite database.
+
+    The connection is opened when it is first needed, and it is opened
+    again in each process which uses the cache, so the object can be
+    shared with the worker processes.
+
+    Args:
+        filename (str): Path of the database (created if needed).
+        fingerprint (str): Fingerprint of the configuration which produced
+            the cached values, stored with each entry.
+    """
+    SCHEMA = None # Statement creating the table of the cache
+
+    def __init__(self, filename, fingerprint):
+        self.filename = filename
+        self.fingerprint = fingerprint
+        self._connection = None
+        self._pid = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_connection'] = None
+        state['_pid'] = None
+        return state
+
+    @property
+    def connection(self):
+        if self._connection is None or self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.filename, timeout=TIMEOUT)
+            self._pid = os.getpid()
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute(self.SCHEMA)
+            self._connection.commit()
+        return self._connection
+
+    def close(self):
+        if self._connection is not None and self._pid == os.getpid():
+            self._connection.close()
+        self._connection = None
+
+
+class ExtractionCache(SQLiteCache):
+    """Store the relations extracted from papers in an SQLite database.
+
+    Args:
+        filename (str): Path of the database (created if needed).
+        fingerprint (str): Fingerprint of the model configuration (see
+            `RelationsExtractor.fingerprint`).
+    """
+    SCHEMA = ('CREATE TABLE IF NOT EXISTS relations ('
+              'pmid TEXT, model TEXT, abstract TEXT, relations TEXT, '
+              'PRIMARY KEY (pmid, model))')
+
+    def get(self, pmid, abstract_hash):
+        """Return the cached relations of a paper.
+
+        Returns:
+            list: Relations of the paper, or None if the paper is not in the
+                cache or if its abstract changed.
+        """
+        row = self.connection.execute(
+            'SELECT abstract, relations FROM relations WHERE pmid = ? AND model = ?',
+            (pmid, self.fingerprint)).fetchone()
+        if row is None or row[0] != abstract_hash:
+            return None
+        return json.loads(row[1])
+
+    def put_many(self, entries):
+        """Store the relations of papers in the cache.
+
+        Args:
+            entries (list): (pmid, abstract_hash, relations) tuples.
+        """
+        if not entries:
+            return
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO relations VALUES (?, ?, ?, ?)',
+                [(pmid, self.fingerprint, abstract_hash, json.dumps(relations))
+                 for pmid, abstract_hash, relations in entries])
+
+
+class DocumentCache(SQLiteCache):
+    """Store the preprocessed abstracts in an SQLite database.
+
+    Documents are keyed by the hash of the abstract rather than by PMID,
+    so identical abstracts are preprocessed once. Each document is stored
+    as zlib-compressed JSON, which keeps the database small since the
+    tagged words repeat the same tags.
+
+    Args:
+        filename (str): Path of the database (created if needed).
+        fingerprint (str): Fingerprint of the preprocessing settings (see
+            `Preprocessor.fingerprint`).
+    """
+    SCHEMA = ('CREATE TABLE IF NOT EXISTS documents ('
+              'abstract TEXT, preprocessor TEXT, document BLOB, '
+              'PRIMARY KEY (abstract, preprocessor))')
+
+    def get(self, abstract_hash):
+        """Return a cached document.
+
+        Returns:
+            dict: Document as passed to `put_many`, or None if the
+                abstract is not in the cache.
+        """
+        row = self.connection.execute(
+            'SELECT document FROM documents WHERE abstract = ? AND preprocessor = ?',
+            (abstract_hash, self.fingerprint)).fetchone()
+        if row is None:
+            return None
+        return json.loads(zlib.decompress(row[0]).decode('utf-8'))
+
+    def put_many(self, entries):
+        """Store documents in the cache, replacing older versions.
+
+        Args:
+            entries (list): (abstract_hash, document) tuples, where the
+                document is a JSON serializable dictionary.
+        """
+        if not entries:
+            return
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO documents VALUES (?, ?, ?)',
+                [(abstract_hash, self.fingerprint,
+                  zlib.compress(json.dumps(document).encode('utf-8')))
+                 for abstract_hash, document in entries])
@@ -0,0 +1,77 @@
+"""Resume a run which was interrupted.
+
+With `--checkpoint-every` or `--resume`, the output files are written in
+committed segments: every `checkpoint_interval` papers, the writers close
+the current segment of their file (ending the gzip member or zstd frame
+if the file is compressed) and sync it to disk, and the position reached
+in the XML files is saved in a `Checkpoint` next to the output, together
+with the size of each output file and the number of results it contains.
+
+The results are written in the order of the XML files, so the position
+is the number of papers (or of parts of the XML files, see
+`Parser.get_tasks`) whose results are all written. When the run is
+resumed, the output files are truncated to their committed size, the
+papers before the position are skipped without being extracted, and the
+results are appended to the output files, which are valid once the run
+is complete. With multiple XML files (or `--split-xml`), the parts of the
+files already processed are skipped without being parsed.
+"""
+
+import json
+import os
+
+from . import utils
+
+CHECKPOINT_INTERVAL = 10000 # Default number of papers between checkpoints
+
+
+class Checkpoint:
+    """Position of a run, saved next to the output files.
+
+    The state is written to a temporary file first, so the checkpoint is
+    never left half written.
+
+    Args:
+        output_file (str): Output filename (with or without extension).
+    """
+    def __init__(self, output_file):
+        self.filename = utils.generate_filename(output_file, 'checkpoint')
+        self.state = None # State loaded when the run is resumed
+
+    def exists(self):
+        return os.path.isfile(self.filename)
+
+    def load(self):
+        with open(self.filename) as f:
+            return json.load(f)
+
+    def save(self, state):
+        temp_filename = '{}.tmp'.format(self.filename)
+        with open(temp_filename, 'w') as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_filename, self.filename)
+
+    def remove(self):
+        if os.path.isfile(self.filename):
+            os.remove(self.filename)
+
+
+def check_run(state, run):
+    """Check that a checkpoint was saved by the same run.
+
+    Args:
+        state (dict): State loaded from the checkpoint.
+        run (dict): Input files, model fingerprint and output files of
+            the current run, as saved in the checkpoint.
+
+    Raises:
+        ValueError: If the input files, model settings or output files
+            differ from those of the checkpoint.
+    """
+    for key, description in (('inputs', 'input files (or --split-xml or --shard options)'),
+                             ('model', 'model settings'), ('outputs', 'output files')):
+        if state['run'][key] != run[key]:
+            raise ValueError('Cannot resume: the checkpoint was saved with other {}. '
+                             'Run again without --resume to start from the beginning.'.format(description))
@@ -3,13 +3,27 @@
 import argparse
 import os
 import sys
+from collections import Counter
 
-from . import GENES_FILE, STEMS_FILE, SYNONYMS_FILE
+from . import GENES_FILE, STEMS_FILE, STOPWORDS_FILE, SYNONYMS_FILE
 from . import models
-from .download import download_pubmed
-from .parser import Parser
+from .matchers import MATCHERS
+from .download import download_pubmed, stream_pubmed
+from .parser import Parser, CHUNKSIZE, iter_documents
+from .checkpoint import CHECKPOINT_INTERVAL
+from .scheduler import SCHEDULERS
+from .shard import merge_results, parse_shard
+from .writers import WRITERS, COMPRESSIONS, FLUSH_INTERVAL
 from .version import __version__
 
+def shard_type(text):
+    """Parse the --shard argument"""
+    try:
+        return parse_shard(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
 def get_args():
     """Parse shell arguments"""
     parser = argparse.ArgumentParser(
@@ -34,15 +48,86 @@ def get_args():
     parent_parser.add_argument(
         '--synonyms', '-s', type=str, dest='synonyms_file',
         help='Look up synonyms for the genes (use "default" for default synonyms database)')
+    parent_parser.add_argument(
+        '--stopwords', type=str, dest='stopwords_file', default=STOPWORDS_FILE,
+        help='Use a JSON file which contains the stopwords to be removed')
     parent_parser.add_argument(
         '--model', '-m', action='store', dest='model', default='rules',
         choices=['simple', 'rules'],
         help='Select the model used for parsing the text'
     )
+    parent_parser.add_argument(
+        '--canonical-names', action='store_true', dest='canonical_names',
+        help='Report the official symbol of the genes found by their synonyms'
+    )
+    parent_parser.add_argument(
+        '--index', type=str, dest='index_file',
+        help='Load the genes and synonyms from an index built with "pangaea build-index"'
+    )
+    parent_parser.add_argument(
+        '--matcher', action='store', dest='matcher', default='index',
+        choices=sorted(MATCHERS),
+        help='Select the method used by the rules model to match gene names'
+    )
     parent_parser.add_argument(
         '--cores', '-c', type=int, dest='cores', default=0,
         help='Choose number of cores to be used for processing'
     )
+    parent_parser.add_argument(
+        '--format', '-f', dest='output_formats', action='append',
+        choices=sorted(WRITERS),
+        help='Output format: JSON array (default), JSON Lines, or edge list as CSV '
+             'or Parquet (may be used more than once)'
+    )
+    parent_parser.add_argument(
+        '--compress', dest='compression', choices=sorted(COMPRESSIONS),
+        help='Compress the output file'
+    )
+    parent_parser.add_argument(
+        '--flush-every', type=int, dest='flush_interval', default=FLUSH_INTERVAL,
+        help='Number of results written between flushes of the output file'
+    )
+    parent_parser.add_argument(
+        '--chunksize', type=int, dest='chunksize', default=CHUNKSIZE,
+        help='Number of papers sent to a process at once'
+    )
+    parent_parser.add_argument(
+        '--scheduler', dest='scheduler', default='fixed', choices=sorted(SCHEDULERS),
+        help='Send the papers to the processes in chunks of --chunksize papers (fixed), or in '
+             'batches sized from the estimated cost of the papers and the observed latency (adaptive)'
+    )
+    parent_parser.add_argument(
+        '--ordered', action='store_true',
+        help='Write the results in the same order as the papers in the XML file'
+    )
+    parent_parser.add_argument(
+        '--cache', type=str, dest='cache_file',
+        help='Cache the relations extracted in an SQLite database, so papers which '
+             'did not change are not parsed again with the same model settings'
+    )
+    parent_parser.add_argument(
+        '--nlp-cache', type=str, dest='documents_file',
+        help='Cache the sentences and POS tags of the abstracts in an SQLite database, '
+             'so they are reused with other genes, relation words or models'
+    )
+    parent_parser.add_argument(
+        '--split-xml', action='store_true', dest='split_xml',
+        help='Split the XML file by byte offsets and parse the parts in parallel'
+    )
+    parent_parser.add_argument(
+        '--profile', action='store_true',
+        help='Measure the time spent in each stage of the extraction and print a summary'
+    )
+    parent_parser.add_argument(
+        '--metrics-file', type=str, dest='metrics_file',
+        help='Write the time spent in each stage and the counts of the items processed '
+             'to a JSON file'
+    )
+    parent_parser.add_argument(
+        '--profile-dir', type=str, dest='profile_dir',
+        help='Profile the main and worker processes with cProfile and write their stats '
+             'to this directory'
+    )
 
     # Download parser
     parser_download = subparsers.add_parser('download',
@@ -53,33 +138,163 @@ def get_args():
     parser_download.add_argument(
         '--number', '-n', type=int, default=10,
         help='Number of articles to be downloaded')
+    parser_download.add_argument(
+        '--api-key', type=str, dest='api_key', default=os.environ.get('NCBI_API_KEY'),
+        help='NCBI API key, allowing 10 requests per second instead of 3 '
+             '(defaults to the NCBI_API_KEY environment variable)')
+    parser_download.add_argument(
+        '--stream', action='store_true',
+        help='Parse the articles while they are downloaded, instead of once the XML file is complete')
+    parser_download.add_argument(
+        '--save-xml', action='store_true', dest='save_xml',
+        help='Save the articles to an XML file when streaming')
 
     # Local parser
     parser_local = subparsers.add_parser('local',
-            help='Parse local XML file', parents=[parent_parser])
+            help='Parse local XML files', parents=[parent_parser])
+    parser_local.add_argument(
+        'xml_file', type=str, nargs='+',
+        help='XML files to be parsed (may be compressed with gzip), '
+             'directories containing XML files, or glob patterns')
+    parser_local.add_argument(
+        '--sync', type=str, dest='sync_file',
+        help='Process PubMed update files in order, keeping the articles processed in an '
+             'SQLite database so that only new or revised articles are extracted and deleted '
+             'citations are removed; the output contains the results of all the articles')
     parser_local.add_argument(
-        'xml_file', type=str,
-        help='XML file to be parsed')
+        '--shard', type=shard_type,
+        help='Process only the i-th of N parts of the articles ("i/N"), split by file if there '
+             'are multiple XML files and by PMID otherwise; combine the outputs with "pangaea merge"')
+    parser_local.add_argument(
+        '--checkpoint-every', type=int, dest='checkpoint_interval',
+        help='Save a checkpoint every N papers, writing the output in committed segments '
+             '(default with --resume: {:,})'.format(CHECKPOINT_INTERVAL))
+    parser_local.add_argument(
+        '--resume', action='store_true',
+        help='Continue an interrupted run from its last checkpoint, skipping the articles '
+             'already processed and appending to the output files')
+
+    # Index parser
+    parser_index = subparsers.add_parser('build-index',
+            help='Build an index of the genes and synonyms, loaded quickly with --index')
+    parser_index.add_argument(
+        '--genes', '-g', type=str, default=GENES_FILE,
+        help='Use a file which contains genes to filter by (separated by newline)')
+    parser_index.add_argument(
+        '--synonyms', '-s', type=str, dest='synonyms_file',
+        help='Look up synonyms for the genes (use "default" for default synonyms database)')
+    parser_index.add_argument(
+        '--canonical-names', action='store_true', dest='canonical_names',
+        help='Report the official symbol of the genes found by their synonyms')
+    parser_index.add_argument(
+        '--output', '-o', type=str, dest='index_file', default='genes.index',
+        help='Output filename of the index')
+
+    # Merge parser
+    parser_merge = subparsers.add_parser('merge',
+            help='Combine the outputs of several shards, keeping one result per PMID')
+    parser_merge.add_argument(
+        'results_files', type=str, nargs='+',
+        help='Output files of the shards (JSON or JSON Lines, may be compressed)')
+    parser_merge.add_argument(
+        '--output', '-o', type=str, default='output',
+        help='Output filename')
+    parser_merge.add_argument(
+        '--format', '-f', dest='output_formats', action='append',
+        choices=sorted(WRITERS),
+        help='Output format: JSON array (default), JSON Lines, or edge list as CSV '
+             'or Parquet (may be used more than once)')
+    parser_merge.add_argument(
+        '--compress', dest='compression', choices=sorted(COMPRESSIONS),
+        help='Compress the output file')
+    parser_merge.add_argument(
+        '--flush-every', type=int, dest='flush_interval', default=FLUSH_INTERVAL,
+        help='Number of results written between flushes of the output file')
 
     return parser.parse_args()
 
 def download_and_parse():
     args = get_args()
+    if args.mode == 'merge':
+        merge(args)
+        return
     if args.synonyms_file == 'default':
         args.synonyms_file = SYNONYMS_FILE
-    if args.mode == 'download':
-        xml_file = download_pubmed(args.terms, args.number, output_filename=args.output)
+    if args.mode == 'build-index':
+        build_index(args)
+        return
+    papers = None
+    sync_file = args.sync_file if args.mode == 'local' else None
+    shard = args.shard if args.mode == 'local' else None
+    checkpoint_interval = args.checkpoint_interval if args.mode == 'local' else None
+    resume = args.resume if args.mode == 'local' else False
+    if args.mode == 'download' and args.stream:
+        xml_file = None
+        papers = iter_documents(stream_pubmed(
+            args.terms, args.number, output_filename=args.output if args.save_xml else None,
+            api_key=args.api_key))
+    elif args.mode == 'download':
+        xml_file = download_pubmed(args.terms, args.number, output_filename=args.output,
+                                   api_key=args.api_key)
     elif args.mode == 'local':
         xml_file = args.xml_file
 
-    if args.model == 'simple':
-        model = models.SimpleExtractor(args.genes, args.relations)
-    elif args.model == 'rules':
-        model = models.RulesExtractor(args.genes, args.relations, args.synonyms_file)
-
     try:
-        parser = Parser(xml_file, model, args.output, args.cores)
-        print('Processing papers from {}'.format(xml_file))
-        parser.process_papers()
+        if args.model == 'simple':
+            model = models.SimpleExtractor(args.genes, args.relations)
+        elif args.model == 'rules':
+            model = models.RulesExtractor(args.genes, args.relations, args.synonyms_file,
+                                          matcher=args.matcher,
+                                          stopwords_file=args.stopwords_file,
+                                          index_file=args.index_file,
+                                          canonical_names=args.canonical_names)
+        parser = Parser(xml_file, model, args.output, args.cores,
+                        ordered=args.ordered, chunksize=args.chunksize,
+                        output_formats=args.output_formats or ['json'], compression=args.compression,
+                        flush_interval=args.flush_interval, split_xml=args.split_xml,
+                        cache_file=args.cache_file, documents_file=args.documents_file,
+                        sync_file=sync_file, profile=args.profile,
+                        metrics_file=args.metrics_file, profile_dir=args.profile_dir,
+                        scheduler=args.scheduler, shard=shard,
+                        checkpoint_interval=checkpoint_interval, resume=resume)
+        if papers is not None:
+            print('Processing papers as they are downloaded')
+        elif len(parser.xml_files) == 1:
+            print('Processing papers from {}'.format(parser.xml_files[0]))
+        else:
+            print('Processing papers from {:,} files'.format(len(parser.xml_files)))
+        if shard is not None:
+            print('Shard {}: articles split by {}'.format(
+                shard, 'PMID' if parser.pmid_shard is not None else 'file'))
+        if sync_file:
+            parser.sync_papers()
+        else:
+            parser.process_papers(papers)
     except ValueError as e:
         sys.exit('\nERROR: {}'.format(e))
+
+def build_index(args):
+    """Build the index of the genes and synonyms used by the rules model"""
+    print('Building index of {}{}'.format(
+        args.genes, ' and {}'.format(args.synonyms_file) if args.synonyms_file else ''))
+    try:
+        model = models.RulesExtractor(args.genes, STEMS_FILE, args.synonyms_file,
+                                      canonical_names=args.canonical_names)
+        model.build_index(args.index_file)
+    except (OSError, ValueError) as e:
+        sys.exit('\nERROR: {}'.format(e))
+    print('{:,} short genes and {:,} long genes written to {}'.format(
+        len(model.genes_short), len(model.genes_long), args.index_file))
+
+def merge(args):
+    """Combine the outputs of the shards into a single output"""
+    print('Merging {:,} files'.format(len(args.results_files)))
+    stats = Counter()
+    parser = Parser(None, None, args.output, 1, output_formats=args.output_formats or ['json'],
+                    compression=args.compression, flush_interval=args.flush_interval)
+    try:
+        parser.write_files(merge_results(args.results_files, stats))
+    except (OSError, ValueError) as e:
+        sys.exit('\nERROR: {}'.format(e))
+    print('{:,} results read, {:,} duplicates removed'.format(
+        stats['results read'], stats['duplicates']))
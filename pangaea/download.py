@@ -1,28 +1,59 @@
 #!/usr/bin/env python3
+"""Download PubMed articles from the Entrez E-utilities.
+
+The IDs of the articles are found with `esearch`, and the articles are
+then fetched in batches of `MAX_POST_LIMIT` IDs with `efetch` by several
+threads at once. All the requests go through an `EntrezClient`, which
+reuses the connections of a single `requests` session and shares a
+token bucket between the threads, so the rate limit of the API (3
+requests per second, or 10 with an API key) is never exceeded. Failed
+requests are retried with exponential backoff.
+
+The batches are appended to the XML file in the order of the IDs, and a
+checkpoint is saved after each batch with the number of articles and
+bytes written. If the download is interrupted, running the same command
+again truncates the file to the last complete batch and fetches only the
+remaining articles, so no article is missing or duplicated.
+
+`stream_pubmed` yields the batches as they are downloaded instead, so
+that they can be parsed while the next batches are fetched.
+"""
 import argparse
-import time
-import re
+import collections
+import json
 import os
+import queue
 import sys
-import json
-import subprocess
-from urllib3.exceptions import ProtocolError
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
+from requests.adapters import HTTPAdapter
 
-SEARCH_URL = 'https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi'
-FETCH_URL = 'https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi'
-POST_URL = 'https://eutils.ncbi.nlm.nih.gov/entrez/eutils/epost.fcgi'
+EUTILS_URL = 'https://eutils.ncbi.nlm.nih.gov/entrez/eutils/'
+SEARCH_ENDPOINT = 'esearch.fcgi'
+FETCH_ENDPOINT = 'efetch.fcgi'
 
 MAX_POST_LIMIT = 1000
 MAX_IDS_LIMIT = 100000
-BATCH_IDS = 3000
 OUTPUT_EXT = 'xml'
-SLEEP_TIME = 1
-LARGER_SLEEP_TIME = 60
 
-END_TAG = '</PubmedArticleSet>'
-START_TAG = '<PubmedArticle>'
+RATE_LIMIT = 3 # Requests per second allowed without an API key
+API_KEY_RATE_LIMIT = 10 # Requests per second allowed with an API key
+MAX_RETRIES = 5 # Number of times a failed request is sent again
+BACKOFF = 1 # Seconds waited before the first retry, doubled for each retry
+TIMEOUT = 300 # Seconds to wait for the server to respond
+QUEUE_SIZE = 4 # Number of batches downloaded ahead of the parsing when streaming
+READ_SIZE = 2 ** 16 # Number of bytes of a response read or copied at once
+TAIL_SIZE = 256 # Number of bytes at the end of a response searched for the closing tag
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+RETRY_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError,
+                requests.exceptions.Timeout)
+
+END_TAG = b'</PubmedArticleSet>'
+START_TAG = b'<PubmedArticle>'
 
 def postprocess_text(output_file):
     """Fix the XML file
@@ -31,89 +62,365 @@ def postprocess_text(output_file):
     a contiguous XML file, so we add the tag here once the file
     has been written to.
     """
-    with open(output_file, 'a') as text_file:
+    with open(output_file, 'ab') as text_file:
         text_file.write(END_TAG)
 
     return output_file
 
-def preprocess_text(text, first_article):
-    """Fix XML text
+class ArticleSetFilter:
+    """Remove the wrapper tags of an `efetch` response.
 
     Because multiple calls are made to retrieve the text,
     there are also multiple endtags. However, we want only
-    one contiguous XML file, so the endtags are removed here."""
+    one contiguous XML file, so the endtags (and the starting
+    tags, except for the first batch) are removed here.
+
+    The response is fed in chunks of bytes, and the end of each chunk
+    which could be the start of a tag split between two chunks is kept
+    until the next chunk, so the response is never held in memory.
+
+    Args:
+        first_article (bool): Keep the starting tags (XML declaration and
+            `<PubmedArticleSet>`), for the first batch of the file.
+    """
+    def __init__(self, first_article):
+        self.started = first_article
+        self.ended = False
+        self.pending = b''
+
+    def feed(self, chunk):
+        """Return the part of the chunk which belongs to the XML file"""
+        if self.ended:
+            return b''
+        data = self.pending + chunk
+        end_index = data.find(END_TAG)
+        if not self.started:
+            start_index = data.find(START_TAG)
+            if start_index == -1 or -1 < end_index < start_index:
+                self.ended = end_index != -1 # No articles in this batch
+                self.pending = data[-(len(END_TAG) - 1):]
+                return b''
+            self.started = True
+            data = data[start_index:]
+            end_index = data.find(END_TAG)
+        if end_index != -1:
+            self.ended = True
+            self.pending = b''
+            return data[:end_index]
+        keep = len(END_TAG) - 1
+        self.pending = data[-keep:]
+        return data[:-keep]
+
+
+def append_articles(source, target, first_article):
+    """Append the articles of an `efetch` response to the XML file.
+
+    Args:
+        source (file): Response, opened in binary mode.
+        target (file): XML file, opened in binary mode.
+        first_article (bool): Keep the starting tags of the response.
+    """
+    article_filter = ArticleSetFilter(first_article)
+    for chunk in iter(lambda: source.read(READ_SIZE), b''):
+        target.write(article_filter.feed(chunk))
+
+
+def save_response(response):
+    """Stream the body of a response to a temporary file.
+
+    Raises:
+        requests.exceptions.ChunkedEncodingError: If the response does
+            not end with `END_TAG`, e.g. because it was cut short.
+
+    Returns:
+        file: Temporary file containing the body, at position 0. It is
+            deleted when closed.
+    """
+    f = tempfile.TemporaryFile()
+    try:
+        tail = b''
+        for chunk in response.iter_content(READ_SIZE):
+            f.write(chunk)
+            tail = (tail + chunk[-TAIL_SIZE:])[-TAIL_SIZE:]
+        if not tail.rstrip().endswith(END_TAG):
+            raise requests.exceptions.ChunkedEncodingError('Incomplete response')
+    except BaseException:
+        f.close()
+        raise
+    f.seek(0)
+    return f
+
+
+class RateLimiter:
+    """Token bucket shared by the threads sending requests.
+
+    Tokens are added continuously at `rate` per second, up to `capacity`
+    tokens, and each request takes one token, waiting if there is none.
 
-    end_index = text.find(END_TAG)
-    if first_article: # Keep starting tags for the first article
-        text = text[:end_index]
-    else:
-        start_index = text.find(START_TAG)
-        text = text[start_index:end_index]
-    return text
+    Args:
+        rate (float): Number of requests allowed per second.
+        capacity (int, optional): Maximum number of requests sent at once
+            after a pause. Defaults to `rate`.
+    """
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1, int(rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
 
 
-def get_xml(query_key, web_env, count, output_file, offset=0):
-    """Get XML files from the Entrez queue
+class EntrezClient:
+    """Send requests to the E-utilities, respecting their rate limit.
 
-    This downloads in batches of `MAX_POST_LIMIT` to adhere
-    to the rules imposed by Entrez API
+    The client can be used by several threads at once: they share the
+    connection pool of the session and the token bucket.
+
+    Args:
+        api_key (str, optional): NCBI API key, which raises the rate limit.
+        base_url (str, optional): URL of the E-utilities (e.g. of a local
+            server in tests).
+        rate (float, optional): Number of requests per second. Defaults to
+            the rate limit of the API.
+        retries (int, optional): Number of times a failed request is sent again.
+        backoff (float, optional): Seconds waited before the first retry.
+        pool_size (int, optional): Number of connections kept open.
     """
-    with open(output_file, "ab") as text_file:
-        for retstart in range(0, count, MAX_POST_LIMIT):
-            print("Downloading from ID {:,}...".format(retstart + offset))
-            time.sleep(SLEEP_TIME)
-            payload = {
-                'db': 'pubmed',
-                'retmode': 'xml',
-                'WebEnv': web_env,
-                'query_key': query_key,
-                'retstart': retstart,
-                'retmax': min(MAX_POST_LIMIT, count - retstart),
-            }
+    def __init__(self, api_key=None, base_url=EUTILS_URL, rate=None, retries=MAX_RETRIES,
+                 backoff=BACKOFF, pool_size=API_KEY_RATE_LIMIT):
+        self.api_key = api_key
+        self.base_url = base_url if base_url.endswith('/') else base_url + '/'
+        self.rate = rate or (API_KEY_RATE_LIMIT if api_key else RATE_LIMIT)
+        self.limiter = RateLimiter(self.rate)
+        self.retries = retries
+        self.backoff = backoff
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def request(self, endpoint, params=None, data=None, read=None):
+        """Send a request, retrying if it fails.
+
+        A request is retried if the connection fails, if the server
+        returns one of `RETRY_STATUS_CODES`, or if `read` fails to read
+        the whole response.
+
+        Args:
+            endpoint (str): Name of the E-utility (e.g. `SEARCH_ENDPOINT`).
+            params (dict, optional): Parameters sent in the URL.
+            data (dict, optional): Parameters sent in the body of a POST request.
+            read (callable, optional): Called with the response to read its
+                body as a stream (e.g. `save_response`). It raises one of
+                `RETRY_ERRORS` if the response is incomplete.
+
+        Raises:
+            requests.exceptions.RequestException: If the request still
+                fails after all the retries.
+
+        Returns:
+            requests.Response: Response of the server, or the value
+                returned by `read`.
+        """
+        arguments = dict(data if data is not None else params or {})
+        if self.api_key:
+            arguments['api_key'] = self.api_key
+        method = 'POST' if data is not None else 'GET'
+        url = self.base_url + endpoint
+        for attempt in range(self.retries + 1):
+            wait = self.backoff * 2 ** attempt
+            self.limiter.acquire()
             try:
-                r = requests.get(FETCH_URL, params=payload)
-            except requests.exceptions.ChunkedEncodingError:
-                print("Request failed")
-                continue
-            except requests.exceptions.SSLError:
-                print("Request failed. Waiting {} seconds".format(LARGER_SLEEP_TIME))
-                time.sleep(LARGER_SLEEP_TIME)
-                continue
-            
-            text = preprocess_text(r.text, offset == retstart)
-            text_file.write(text.encode('utf-8'))
-
-
-
-def post_ids(ids):
-    """Post IDs to the Entrez server
-
-    Entrez recommend to post the IDs to their servers
-    and then retrieve them in batches via a get request
-    at `FETCH_URL`. Uses `query_key` and `WebEnv` for
-    identification.
+                stream = read is not None
+                if method == 'POST':
+                    r = self.session.post(url, data=arguments, timeout=TIMEOUT, stream=stream)
+                else:
+                    r = self.session.get(url, params=arguments, timeout=TIMEOUT, stream=stream)
+                with r:
+                    if r.status_code in RETRY_STATUS_CODES:
+                        wait = max(wait, float(r.headers.get('Retry-After', 0)))
+                        error = requests.exceptions.HTTPError(
+                            'Response {}: {}'.format(r.status_code, r.reason), response=r)
+                    else:
+                        r.raise_for_status()
+                        return r if read is None else read(r)
+            except RETRY_ERRORS as e:
+                error = e
+            if attempt < self.retries:
+                print('Request failed ({}). Retrying in {:g} seconds'.format(error, wait))
+                time.sleep(wait)
+        raise error
+
+    def fetch(self, ids):
+        """Fetch the XML of a batch of articles.
+
+        The response is streamed to a temporary file in chunks, so it is
+        never held in memory.
+
+        Returns:
+            file: Temporary file containing the XML of the articles, in a
+                `PubmedArticleSet` (see `save_response`).
+        """
+        payload = {
+            'db': 'pubmed',
+            'retmode': 'xml',
+            'id': ','.join(ids),
+        }
+        return self.request(FETCH_ENDPOINT, data=payload, read=save_response)
+
+
+class Checkpoint:
+    """Progress of a download, saved next to the XML file.
+
+    The IDs of the articles are saved once, when the download starts, and
+    the state (the query, and the number of articles and bytes written to
+    the XML file) after each batch. The state is written to a temporary
+    file first, so the checkpoint is never left half written.
+
+    Args:
+        output_file (str): Path of the XML file.
+    """
+    def __init__(self, output_file):
+        self.filename = '{}.checkpoint'.format(output_file)
+        self.ids_filename = '{}.ids'.format(output_file)
+
+    def exists(self):
+        return os.path.isfile(self.filename)
+
+    def load(self):
+        """Return the saved state and the IDs of the articles"""
+        with open(self.filename) as f:
+            state = json.load(f)
+        with open(self.ids_filename) as f:
+            ids = json.load(f)
+        return state, ids
+
+    def start(self, state, ids):
+        with open(self.ids_filename, 'w') as f:
+            json.dump(ids, f)
+        self.save(state)
+
+    def save(self, state):
+        temp_filename = '{}.tmp'.format(self.filename)
+        with open(temp_filename, 'w') as f:
+            json.dump(state, f)
+        os.replace(temp_filename, self.filename)
+
+    def remove(self):
+        for filename in (self.filename, self.ids_filename):
+            if os.path.isfile(filename):
+                os.remove(filename)
+
+
+def iter_ordered(executor, function, items, window):
+    """Apply `function` to the items in a thread pool, yielding the results in order.
+
+    At most `window` items are processed at once, so the results which
+    arrive before those of earlier items are not kept indefinitely.
     """
-    payload = {
-        'db': 'pubmed',
-        'id': ','.join(ids),
-    }
-    r = requests.post(POST_URL, data=payload)
-    if r.status_code != 200:
-        sys.exit('Response {}: {}'.format(r.status_code, r.reason))
+    items = iter(items)
+    futures = collections.deque()
     try:
-        query_key = re.findall(r'<QueryKey>(\d)+', r.text)[0]
-    except IndexError:
-        sys.exit("Keyword(s) returned no results")
-    web_env = re.findall(r'<WebEnv>([\w.]+)', r.text)[0]
-    return query_key, web_env, len(ids)
+        for item in items:
+            futures.append(executor.submit(function, item))
+            if len(futures) >= window:
+                yield futures.popleft().result()
+        while futures:
+            yield futures.popleft().result()
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def iter_xml(client, ids, start=0, workers=None):
+    """Fetch the articles in batches of `MAX_POST_LIMIT` IDs.
 
+    The batches are fetched by `workers` threads, but they are yielded in
+    the order of the IDs.
 
-def get_ids(terms, number, sort, ids_list=[], debug=False):
+    Args:
+        client (EntrezClient): Client used to send the requests.
+        ids (list): IDs of the articles.
+        start (int, optional): Number of articles to skip.
+        workers (int, optional): Number of threads. Defaults to the number
+            of requests allowed per second.
+
+    Yields:
+        (list, file): IDs and XML of each batch, in a temporary file which
+            is deleted when closed.
+    """
+    workers = workers or max(1, int(client.rate))
+    batches = [ids[index:index + MAX_POST_LIMIT] for index in range(start, len(ids), MAX_POST_LIMIT)]
+    with ThreadPoolExecutor(workers) as executor:
+        responses = iter_ordered(executor, client.fetch, batches, 2 * workers)
+        try:
+            for batch, response in zip(batches, responses):
+                yield batch, response
+        finally:
+            responses.close()
+
+
+def get_xml(client, ids, output_file, checkpoint, state, workers=None, on_batch=None):
+    """Get the XML of the articles from the Entrez API.
+
+    The articles are fetched with `iter_xml`, starting from the number of
+    articles in `state`. Each batch is appended to the XML file, and the
+    checkpoint is saved once it is on disk.
+
+    Args:
+        client (EntrezClient): Client used to send the requests.
+        ids (list): IDs of all the articles of the download.
+        output_file (str): Path of the XML file.
+        checkpoint (Checkpoint): Checkpoint of the download.
+        state (dict): Number of `articles` and bytes (`size`) already written.
+        workers (int, optional): Number of threads.
+        on_batch (callable, optional): Called with the XML of each batch
+            once it is written, as a temporary file which it must close.
+            Otherwise, the temporary files are closed once written.
+    """
+    mode = 'r+b' if os.path.isfile(output_file) else 'wb'
+    with open(output_file, mode) as text_file:
+        # Remove anything written after the last checkpoint
+        text_file.truncate(state['size'])
+        text_file.seek(state['size'])
+        for batch, response in iter_xml(client, ids, state['articles'], workers):
+            try:
+                append_articles(response, text_file, state['size'] == 0)
+            except BaseException:
+                response.close()
+                raise
+            text_file.flush()
+            os.fsync(text_file.fileno())
+            state['articles'] += len(batch)
+            state['size'] = text_file.tell()
+            checkpoint.save(state)
+            if on_batch is None:
+                response.close()
+                print("Downloaded {:,} of {:,} articles".format(state['articles'], len(ids)))
+            else:
+                response.seek(0)
+                on_batch(response)
+
+
+def get_ids(terms, number, sort, ids_list=[], debug=False, client=None):
     """Return IDs of articles to be downloaded
 
     To honour the requirements of the API, each request asks for at most
     MAX_IDS_LIMIT
     """
+    client = client or EntrezClient()
     print("Fetching {:,} IDs...".format(number))
     results = []
     for retstart in range(0, number, MAX_IDS_LIMIT):
@@ -126,10 +433,9 @@ def get_ids(terms, number, sort, ids_list=[], debug=False):
             'term': terms,
             'usehistory': 'y'
         }
-        
+
         print("Fetching from ID {:,}...".format(retstart))
-        r = requests.get(SEARCH_URL, params=payload)
-        time.sleep(SLEEP_TIME)
+        r = client.request(SEARCH_ENDPOINT, params=payload)
         try:
             results.extend(r.json()['esearchresult']['idlist'])
         except KeyError:
@@ -160,6 +466,10 @@ def get_args():
     parser.add_argument(
         '--ids', '-i', action="store_true",
         help='Save IDs')
+    parser.add_argument(
+        '--api-key', type=str, dest='api_key', default=os.environ.get('NCBI_API_KEY'),
+        help='NCBI API key, allowing 10 requests per second instead of 3 '
+             '(defaults to the NCBI_API_KEY environment variable)')
     parser.add_argument(
         '--debug', '-d', action="store_true",
         help='Show debug messages')
@@ -176,28 +486,162 @@ def parse_filename(filename):
     return '{}.{}'.format(os.path.splitext(filename)[0], 'xml')
 
 
-def download_pubmed(terms, number, output_filename, sort='relevance', ids_flag=False, debug=False):
+def download_pubmed(terms, number, output_filename, sort='relevance', ids_flag=False, debug=False,
+                    api_key=None, workers=None, client=None):
+    """Download the articles matching the search terms to an XML file.
+
+    If a checkpoint of the same query is found next to the XML file, the
+    download resumes from the last batch written.
+
+    Args:
+        client (EntrezClient, optional): Client used to send the requests.
+            Defaults to a client of the Entrez API using `api_key`.
+
+    Returns:
+        str: Path of the XML file.
+    """
     output_filename = parse_filename(output_filename)
-    if os.path.isfile(output_filename):
-        sys.exit('ERROR: Output file already exists.')
-    ids = get_ids(terms, number, sort, debug=debug)
-    if not ids:
-        sys.exit('No articles were found.')
-    if ids_flag:
-        save_ids(ids, output_filename)
-        return output_filename
-    print("Downloading {:,} results to {}".format(len(ids), output_filename))
-    for index in range(0, len(ids), BATCH_IDS):
-        ids_slice = ids[index: index + BATCH_IDS]
-        web_env, query_key, count = post_ids(ids_slice)
-        get_xml(web_env, query_key, count, output_filename, offset=index)
+    client = client or EntrezClient(api_key)
+    checkpoint = Checkpoint(output_filename)
+    query = {'terms': terms, 'number': number, 'sort': sort}
+    try:
+        if checkpoint.exists():
+            state, ids = checkpoint.load()
+            if state['query'] != query:
+                sys.exit('ERROR: {} is the download of another query. Please remove it and {} '
+                         'to start again.'.format(output_filename, checkpoint.filename))
+            print("Resuming download to {}: {:,} of {:,} articles already downloaded".format(
+                output_filename, state['articles'], len(ids)))
+        else:
+            if os.path.isfile(output_filename):
+                sys.exit('ERROR: Output file already exists.')
+            ids = get_ids(terms, number, sort, debug=debug, client=client)
+            if not ids:
+                sys.exit('No articles were found.')
+            if ids_flag:
+                save_ids(ids, output_filename)
+                return output_filename
+            print("Downloading {:,} results to {}".format(len(ids), output_filename))
+            state = {'query': query, 'articles': 0, 'size': 0}
+            checkpoint.start(state, ids)
+        get_xml(client, ids, output_filename, checkpoint, state, workers)
+    except requests.exceptions.RequestException as e:
+        sys.exit('ERROR: {}\nRun the same command again to resume the download.'.format(e))
     postprocess_text(output_filename)
+    checkpoint.remove()
     return output_filename
 
 
+def stream_pubmed(terms, number, sort='relevance', output_filename=None, api_key=None,
+                  workers=None, client=None, queue_size=QUEUE_SIZE):
+    """Download the articles matching the search terms, yielding each batch as it arrives.
+
+    The IDs are fetched first, then the batches of articles are downloaded
+    by a background thread and put in a queue of at most `queue_size`
+    batches. When the batches are not consumed as fast as they are
+    downloaded, the queue fills up and the download waits, so the memory
+    used does not depend on the number of articles.
+
+    Args:
+        output_filename (str, optional): Also save the articles to this
+            XML file. If the download is interrupted, running
+            `download_pubmed` with the same query completes the file.
+        client (EntrezClient, optional): Client used to send the requests.
+            Defaults to a client of the Entrez API using `api_key`.
+
+    Returns:
+        iterator: XML of each batch, in a temporary file which is deleted
+            when closed, in the order of the IDs. A ValueError is raised
+            by the iterator if the download fails.
+    """
+    client = client or EntrezClient(api_key)
+    if output_filename is not None:
+        output_filename = parse_filename(output_filename)
+        if os.path.isfile(output_filename):
+            sys.exit('ERROR: Output file already exists.')
+    ids = get_ids(terms, number, sort, client=client)
+    if not ids:
+        sys.exit('No articles were found.')
+    print("Streaming {:,} results{}".format(
+        len(ids), ' to {}'.format(output_filename) if output_filename else ''))
+
+    def produce(put):
+        if output_filename is None:
+            for batch, response in iter_xml(client, ids, workers=workers):
+                put(response)
+            return
+        checkpoint = Checkpoint(output_filename)
+        state = {'query': {'terms': terms, 'number': number, 'sort': sort}, 'articles': 0, 'size': 0}
+        checkpoint.start(state, ids)
+        get_xml(client, ids, output_filename, checkpoint, state, workers, on_batch=put)
+        postprocess_text(output_filename)
+        checkpoint.remove()
+
+    return iter_background(produce, queue_size)
+
+
+class StopProducer(Exception):
+    """Raised in the producer thread of `iter_background` when the items are no longer consumed"""
+
+
+def iter_background(produce, maxsize):
+    """Run a producer in a background thread, yielding the items it produces.
+
+    The items are passed through a queue of at most `maxsize` items, so
+    the producer waits when they are not consumed fast enough. If the
+    iterator is closed before the end, the producer is stopped the next
+    time it puts an item in the queue.
+
+    Args:
+        produce (callable): Called with a `put` function, which it calls
+            with each item.
+
+    Raises:
+        ValueError: If the producer fails.
+    """
+    items = queue.Queue(maxsize)
+    stopped = threading.Event()
+    done = object()
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+        raise StopProducer()
+
+    def run():
+        try:
+            produce(put)
+            put(done)
+        except StopProducer:
+            pass
+        except (Exception, SystemExit) as e:
+            try:
+                put(e)
+            except StopProducer:
+                pass
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = items.get()
+            if item is done:
+                return
+            if isinstance(item, BaseException):
+                raise ValueError('The download failed: {}'.format(item))
+            yield item
+    finally:
+        stopped.set()
+
+
 def download():
     args = get_args()
-    output_filename = download_pubmed(args.terms, args.number, args.output, args.sort, args.ids, args.debug)
+    output_filename = download_pubmed(args.terms, args.number, args.output, args.sort, args.ids,
+                                      args.debug, api_key=args.api_key)
     print('Output appended to {}.'.format(output_filename))
 
 if __name__ == '__main__':
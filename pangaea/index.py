@@ -0,0 +1,118 @@
+"""Store the gene vocabulary of the rules model in an index file.
+
+Building the gene dictionaries of `RulesExtractor` (and the automaton of the
+`IndexMatcher`) from the genes and synonyms files takes a long time with
+large files, and it used to be repeated on every run. `pangaea build-index`
+builds them once and stores them in an index file, which is loaded in
+milliseconds when the model is given the index with `--index`.
+
+The index is keyed by the hashes of the files it was built from, so a
+stale index (built from other files, with other settings, or by another
+version of the index format) is detected when the model is created. The
+file starts with a small header containing the key, so the key can be
+checked without loading the genes, which are loaded only when they are
+first used.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+
+VERSION = 1 # Increase when the contents of the index change
+
+READ_SIZE = 2 ** 20 # Number of bytes read at once when hashing files
+
+
+def hash_file(filename):
+    """Return the SHA-1 hash of the contents of a file"""
+    sha1 = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(READ_SIZE), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+def index_key(genes_file, synonyms_file=None, settings=None):
+    """Return the key of the index built from the given files and settings.
+
+    Args:
+        genes_file (str): Path of the genes file.
+        synonyms_file (str, optional): Path of the synonyms file.
+        settings (dict, optional): Settings of the model which change
+            the contents of the index.
+    """
+    inputs = {
+        'version': VERSION,
+        'genes': hash_file(genes_file),
+        'synonyms': hash_file(synonyms_file) if synonyms_file else None,
+        'settings': settings or {},
+    }
+    return hashlib.sha1(json.dumps(inputs, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def write_index(filename, key, genes_short, genes_long, matcher=None):
+    """Write the gene vocabulary to an index file.
+
+    The file is written to a temporary file first, so an existing index
+    is replaced only once the new one is complete.
+
+    Args:
+        filename (str): Path of the index file.
+        key (str): Key of the index (see `index_key`).
+        genes_short (dict): Short genes (see `RulesExtractor.process_genes`).
+        genes_long (dict): Long genes.
+        matcher (IndexMatcher, optional): Matcher built from the genes.
+    """
+    temp_filename = '{}.tmp'.format(filename)
+    with open(temp_filename, 'wb') as f:
+        pickle.dump({'version': VERSION, 'key': key}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump({'genes_short': genes_short, 'genes_long': genes_long, 'matcher': matcher},
+                    f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_filename, filename)
+
+
+class GeneIndex:
+    """Gene vocabulary loaded from an index file when it is first needed.
+
+    Args:
+        filename (str): Path of the index file.
+        key (str): Expected key of the index (see `index_key`).
+
+    Raises:
+        ValueError: If the index does not exist, or if it was not built
+            with the expected key.
+    """
+    def __init__(self, filename, key):
+        self.filename = filename
+        self._data = None
+        try:
+            with open(filename, 'rb') as f:
+                header = pickle.load(f)
+        except FileNotFoundError:
+            raise ValueError('Index {} does not exist.'.format(filename))
+        except (pickle.UnpicklingError, EOFError):
+            raise ValueError('{} is not a valid index file.'.format(filename))
+        if header.get('version') != VERSION or header.get('key') != key:
+            raise ValueError(
+                'Index {} was built from different genes or synonyms files, or with other settings. '
+                'Please run "pangaea build-index" again.'.format(filename))
+
+    def __getstate__(self):
+        # Processes which receive the index load it from the file
+        state = self.__dict__.copy()
+        state['_data'] = None
+        return state
+
+    def load(self):
+        """Return the contents of the index, loading them if needed.
+
+        Returns:
+            dict: `genes_short`, `genes_long` and `matcher` (or None if
+                no matcher was stored).
+        """
+        if self._data is None:
+            with open(self.filename, 'rb') as f:
+                pickle.load(f) # Header
+                self._data = pickle.load(f)
+        return self._data
@@ -0,0 +1,232 @@
+"""Detect gene names in the candidate words built by the rules model.
+
+The rules model builds candidate words by concatenating the words of each
+n-gram, and a gene is considered found when either:
+    - a short gene name (length <= `LENGTH_THRESHOLD`) *is identical* to
+      the candidate word;
+    - a long gene name (length > `LENGTH_THRESHOLD`) is a *substring*
+      of the candidate word.
+
+Matchers are built once per model from the two dictionaries returned by
+`RulesExtractor.process_genes`, so the cost of indexing the genes is paid
+once rather than for every candidate word.
+
+The relation stems found in each sentence are detected by a `StemMatcher`,
+which is also built once per model.
+"""
+
+import re
+from abc import ABC, abstractmethod
+from collections import defaultdict, deque
+
+
+class GeneMatcher(ABC):
+    def __init__(self, genes_short, genes_long):
+        self.genes_short = genes_short
+        self.genes_long = genes_long
+
+    @abstractmethod
+    def match(self, word):
+        """Return the gene names found in a candidate word.
+
+        The genes are returned in the order in which a scan over
+        `genes_short` followed by `genes_long` would find them, so that
+        all matchers produce identical output.
+
+        Args:
+            word (str): Candidate word (lowercase, no punctuation).
+
+        Returns:
+            list: Original gene names found in the word.
+        """
+        ...
+
+    def match_all(self, words):
+        """Return the gene names found in a batch of candidate words.
+
+        Returns:
+            list: Gene names found in each word, in the order of the words.
+        """
+        genes = []
+        for word in words:
+            genes.extend(self.match(word))
+        return genes
+
+
+class ScanMatcher(GeneMatcher):
+    """Compare the candidate word against every gene name.
+
+    This is the original approach, and it is kept as a reference for
+    testing and benchmarking the faster matchers.
+    """
+    def match(self, word):
+        genes = []
+        for gene in self.genes_short.keys():
+            if gene == word:
+                genes.append(self.genes_short[gene])
+        for gene in self.genes_long.keys():
+            if gene in word:
+                genes.append(self.genes_long[gene])
+        return genes
+
+
+class IndexMatcher(GeneMatcher):
+    """Look up short genes in a dictionary and long genes in an automaton.
+
+    Short genes are matched with a single dictionary lookup, while long genes
+    are matched with an Aho-Corasick automaton which finds all the long gene
+    names contained in the word in a single pass over its characters.
+    """
+    def __init__(self, genes_short, genes_long):
+        super().__init__(genes_short, genes_long)
+        self.long_names = list(genes_long.values())
+        self.automaton = Automaton(genes_long.keys())
+
+    def match(self, word):
+        genes = []
+        gene = self.genes_short.get(word)
+        if gene is not None:
+            genes.append(gene)
+        # Sort by position in `genes_long` to keep the order of a full scan
+        for index in sorted(self.automaton.search(word)):
+            genes.append(self.long_names[index])
+        return genes
+
+
+class Automaton:
+    """Aho-Corasick automaton for finding multiple patterns in a string.
+
+    Each state of the trie is identified by its index in the `goto`,
+    `fail` and `output` lists:
+        - `goto[state]` maps a character to the next state;
+        - `fail[state]` is the state of the longest proper suffix of the
+          current prefix that is also a prefix of a pattern;
+        - `output[state]` contains the indices of all patterns which end
+          at the current state (including those reachable via `fail`).
+
+    Args:
+        patterns (iterable): Strings to be searched for. Patterns are
+            identified by their position in the iterable.
+    """
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [()]
+
+        for index, pattern in enumerate(patterns):
+            state = 0
+            for char in pattern:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][char] = next_state
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(())
+                state = next_state
+            self.output[state] += (index,)
+
+        self._build_fail_links()
+
+    def _build_fail_links(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fail = self.fail[state]
+                while fail and char not in self.goto[fail]:
+                    fail = self.fail[fail]
+                self.fail[next_state] = self.goto[fail].get(char, 0)
+                self.output[next_state] += self.output[self.fail[next_state]]
+
+    def search(self, text):
+        """Return the indices of all patterns found in `text`.
+
+        Returns:
+            set: Indices of the patterns which are substrings of `text`.
+        """
+        goto, fail, output = self.goto, self.fail, self.output
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found.update(output[state])
+        return found
+
+
+class StemMatcher:
+    """Find the relation stems contained in a text in a single pass.
+
+    The stems are compiled into a single regular expression, built from a
+    trie of the stems, so the text is scanned once by the regex engine
+    however many stems there are. At each position of the text, the regex
+    matches the longest stem starting there, and the other stems starting
+    there are the stems which are prefixes of the longest one.
+
+    Args:
+        stems (list): Relation stems, in the order in which they should
+            be returned.
+    """
+    def __init__(self, stems):
+        self.stems = list(stems)
+        positions = defaultdict(list)
+        for index, stem in enumerate(self.stems):
+            positions[stem].append(index)
+        # Positions of each stem and of all the stems which are its prefixes
+        self.prefixes = {
+            stem: [index for end in range(len(stem) + 1) for index in positions.get(stem[:end], ())]
+            for stem in positions}
+        self.regex = re.compile('(?=({}))'.format(self._trie_pattern(positions)))
+
+    @staticmethod
+    def _trie_pattern(stems):
+        """Build a pattern matching the longest of `stems` at a position"""
+        trie = {}
+        for stem in stems:
+            node = trie
+            for char in stem:
+                node = node.setdefault(char, {})
+            node[None] = True
+
+        def build(node):
+            branches = [re.escape(char) + build(child)
+                        for char, child in sorted(node.items(), key=lambda item: str(item[0]))
+                        if char is not None]
+            if not branches:
+                return ''
+            pattern = branches[0] if len(branches) == 1 else '(?:{})'.format('|'.join(branches))
+            # Stems ending here are optional, so the longest stem is matched
+            if None in node:
+                return '(?:{})?'.format(pattern)
+            return pattern
+
+        if not trie:
+            return '(?!)'
+        return build(trie)
+
+    def contains(self, text):
+        """Return True if any of the stems is in `text`"""
+        return self.regex.search(text) is not None
+
+    def find(self, text):
+        """Return the stems found in `text`.
+
+        Returns:
+            list: Stems which are substrings of `text`, in the same order
+                as `stems` (identical to `[stem for stem in stems if stem
+                in text]`).
+        """
+        indices = set()
+        for longest in set(self.regex.findall(text)):
+            indices.update(self.prefixes[longest])
+        return [self.stems[index] for index in sorted(indices)]
+
+
+MATCHERS = {
+    'scan': ScanMatcher,
+    'index': IndexMatcher,
+}
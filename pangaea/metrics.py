@@ -0,0 +1,196 @@
+"""Measure where the time of a run is spent.
+
+With `--profile` or `--metrics-file`, the main process and the worker
+processes record the wall and CPU time spent in each stage of the
+extraction (e.g. reading the XML, splitting the sentences, POS tagging,
+matching the genes, writing the output), and count the items processed
+(sentences, sentences with relation stems, candidate words and genes
+found). The metrics of each batch are returned by the worker process
+with its results and added up by the main process, like the counters of
+`Parser.stats`.
+
+The stages may be nested (e.g. the tagging is part of the extraction), so
+the time of a stage includes the time of its sub-stages. The CPU time is
+the time of the thread running the stage. The stages of the worker
+processes are added up over all the processes, so their total can be
+larger than the wall time of the run.
+
+With `--profile-dir`, each process also runs `cProfile`, and its stats
+are written to the directory when the process exits, to be read with
+`pstats` or tools such as snakeviz.
+"""
+
+import cProfile
+import json
+import os
+import time
+from collections import Counter
+
+# Stages of the main process
+MAIN_STAGES = ['total', 'read papers', 'wait for workers', 'store caches', 'write output']
+
+# Stages of the worker processes, sub-stages of the extraction are
+# written as "extract/<stage>"
+WORKER_STAGES = [
+    'batch', 'parse xml', 'cache lookup', 'extract', 'extract/split sentences',
+    'extract/find stems', 'extract/tokenize', 'extract/screen genes', 'extract/tag',
+    'extract/match genes']
+
+# Counters of the items processed by the models
+COUNTERS = ['papers', 'sentences', 'stem hits', 'sentences tagged', 'candidates', 'gene matches']
+
+
+class Stage:
+    """Context manager adding the time spent in a block to a stage"""
+    __slots__ = ('metrics', 'name', 'wall', 'cpu')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.wall = time.perf_counter()
+        self.cpu = time.thread_time()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.add(self.name, time.perf_counter() - self.wall, time.thread_time() - self.cpu)
+
+
+class NullStage:
+    """Context manager used when the metrics are disabled"""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+NULL_STAGE = NullStage()
+
+
+class Metrics:
+    """Wall and CPU time of the stages of a run, and counters of the items processed.
+
+    Disabled metrics record nothing, so the instrumented code costs only a
+    method call per stage when the run is not profiled.
+
+    Args:
+        enabled (bool, optional): Record the metrics.
+    """
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.wall = Counter()
+        self.cpu = Counter()
+        self.calls = Counter()
+        self.counts = Counter()
+
+    def stage(self, name):
+        """Return a context manager measuring the time spent in a stage.
+
+        Example:
+            >>> with metrics.stage('extract/tag'):
+            ...     tag_sentences(sentences)
+        """
+        if not self.enabled:
+            return NULL_STAGE
+        return Stage(self, name)
+
+    def add(self, name, wall, cpu, calls=1):
+        self.wall[name] += wall
+        self.cpu[name] += cpu
+        self.calls[name] += calls
+
+    def count(self, name, value=1):
+        if self.enabled:
+            self.counts[name] += value
+
+    def timed(self, name, iterable):
+        """Yield the items of an iterable, adding the time taken to produce them to a stage"""
+        if not self.enabled:
+            yield from iterable
+            return
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def update(self, other):
+        """Add the metrics of another process (e.g. of a batch returned by a worker)"""
+        for name in ('wall', 'cpu', 'calls', 'counts'):
+            getattr(self, name).update(getattr(other, name))
+
+    def pop(self):
+        """Return the metrics recorded so far and start again from zero"""
+        metrics = Metrics(self.enabled)
+        metrics.update(self)
+        for counter in (self.wall, self.cpu, self.calls, self.counts):
+            counter.clear()
+        return metrics
+
+    def to_dict(self):
+        return {
+            'stages': {
+                name: {'wall': self.wall[name], 'cpu': self.cpu[name], 'calls': self.calls[name]}
+                for name in ordered(self.calls, MAIN_STAGES + WORKER_STAGES)},
+            'counts': {name: self.counts[name] for name in ordered(self.counts, COUNTERS)},
+        }
+
+    def report(self, processes):
+        """Return a summary of the metrics as a table.
+
+        Args:
+            processes (int): Number of worker processes, used to compute
+                the share of the time the workers were busy.
+        """
+        lines = ['{:28} {:>10} {:>10} {:>10}'.format('Stage', 'Wall (s)', 'CPU (s)', 'Calls')]
+        for title, stages in (('Main process', MAIN_STAGES), ('Worker processes', WORKER_STAGES)):
+            names = [name for name in stages if name in self.calls]
+            if not names:
+                continue
+            lines.append(title)
+            for name in names:
+                label = '  ' * (name.count('/') + 1) + name.rsplit('/', 1)[-1]
+                lines.append('{:28} {:10.2f} {:10.2f} {:10,}'.format(
+                    label, self.wall[name], self.cpu[name], self.calls[name]))
+        if self.wall['total'] and self.wall['batch']:
+            lines.append('Workers busy {:.0%} of the time ({} process{})'.format(
+                self.wall['batch'] / (self.wall['total'] * processes), processes,
+                'es' if processes > 1 else ''))
+        counts = ordered(self.counts, COUNTERS)
+        if counts:
+            lines.append('Counts: ' + ', '.join(
+                '{:,} {}'.format(self.counts[name], name) for name in counts))
+        return '\n'.join(lines)
+
+    def write(self, filename, **info):
+        """Write the metrics to a JSON file, together with other information about the run"""
+        with open(filename, 'w') as f:
+            json.dump(dict(info, **self.to_dict()), f, indent=2)
+
+
+def ordered(names, order):
+    """Return the names in the given order, followed by the others sorted"""
+    known = [name for name in order if name in names]
+    return known + sorted(name for name in names if name not in order)
+
+
+def start_profiler(profile_dir, name):
+    """Profile the current process with cProfile.
+
+    Returns:
+        function: Stops the profiler and writes its stats to
+            `<profile_dir>/<name>-<pid>.prof`.
+    """
+    profiler = cProfile.Profile()
+    profiler.enable()
+
+    def stop():
+        profiler.disable()
+        os.makedirs(profile_dir, exist_ok=True)
+        profiler.dump_stats(os.path.join(profile_dir, '{}-{}.prof'.format(name, os.getpid())))
+    return stop
@@ -2,12 +2,18 @@ import string
 import itertools
 import re
 import json
+import hashlib
+from collections import Counter
 from abc import ABC, abstractmethod
 
 import nltk
 from tqdm import tqdm
 
 from . import utils
+from .index import GeneIndex, index_key, write_index
+from .matchers import MATCHERS, IndexMatcher, StemMatcher
+from .metrics import Metrics
+from .preprocess import Preprocessor
 
 class RelationsExtractor(ABC):
     @abstractmethod
@@ -22,6 +28,37 @@ class RelationsExtractor(ABC):
     def process_genes(self, filename):
         ...
 
+    def parse_batch(self, texts):
+        """Extract the relations from a batch of abstracts.
+
+        Models may override this method to process the abstracts together.
+
+        Returns:
+            list: Relations of each abstract, as returned by `parse`.
+        """
+        return [self.parse(text) for text in texts]
+
+    def load_genes(self):
+        """Load the genes if the model loads them lazily.
+
+        Called before the worker processes are forked, so that they share
+        the genes of the parent process instead of loading their own copy.
+        """
+
+    def get_config(self):
+        """Return the settings which determine the relations extracted.
+
+        Models should include everything that changes their output (e.g.
+        the genes and relation words used), as the configuration is used
+        to decide whether cached results can be reused.
+        """
+        return {}
+
+    def fingerprint(self):
+        """Return a hash of the model type and configuration"""
+        config = {'model': type(self).__name__, 'config': self.get_config()}
+        return hashlib.sha1(json.dumps(config, sort_keys=True).encode('utf-8')).hexdigest()
+
 
 class NERTagger:
     def parse(self, text):
@@ -58,55 +95,195 @@ class RulesExtractor(RelationsExtractor):
     TARGET_TAGS = ['NNP', 'NN','JJ', 'VBP'] # Tags that are considered as candidates for genes
     LENGTH_THRESHOLD = 5 # Length at which to split gene names to apply different rules
 
-    def __init__(self, genes_file, relation_words_file,  synonyms_file=None, *args, **kwargs):
+    def __init__(self, genes_file, relation_words_file,  synonyms_file=None, matcher='index',
+                 stopwords_file=None, prefilter=True, index_file=None, canonical_names=False,
+                 *args, **kwargs):
         self.relation_words = self.get_relation_words(relation_words_file)
-        self.genes_short, self.genes_long = self.process_genes(genes_file, synonyms_file)
+        self.stopwords = utils.load_stopwords(stopwords_file)
+        # The tagger is loaded when the first sentence is tagged
+        self.preprocessor = Preprocessor(self.stopwords)
+        self.genes_file = genes_file
+        self.synonyms_file = synonyms_file
+        self.canonical_names = canonical_names
+        self.matcher_name = matcher
+        if index_file:
+            # The genes are loaded from the index when they are first used
+            self.index = GeneIndex(index_file, self.index_key())
+            self._genes_short = self._genes_long = self._matcher = None
+        else:
+            self.index = None
+            self._genes_short, self._genes_long = self.process_genes(genes_file, synonyms_file)
+            self._matcher = MATCHERS[matcher](self._genes_short, self._genes_long)
+        self.stem_matcher = StemMatcher(self.relation_words)
+        self.prefilter = prefilter
+        self.stats = Counter()
+        self.metrics = Metrics(enabled=False)
+
+    @property
+    def genes_short(self):
+        self.load_genes()
+        return self._genes_short
+
+    @property
+    def genes_long(self):
+        self.load_genes()
+        return self._genes_long
+
+    @property
+    def matcher(self):
+        self.load_genes()
+        return self._matcher
+
+    def load_genes(self):
+        """Load the genes and the matcher from the index if they were not loaded yet"""
+        if self._genes_short is not None:
+            return
+        index = self.index.load()
+        self._genes_short, self._genes_long = index['genes_short'], index['genes_long']
+        if self.matcher_name == 'index' and index['matcher'] is not None:
+            self._matcher = index['matcher']
+        else:
+            self._matcher = MATCHERS[self.matcher_name](self._genes_short, self._genes_long)
+
+    def index_key(self):
+        """Return the key of the index built from the genes and synonyms of the model"""
+        settings = {'length_threshold': self.LENGTH_THRESHOLD, 'canonical_names': self.canonical_names}
+        return index_key(self.genes_file, self.synonyms_file, settings)
+
+    def build_index(self, filename):
+        """Write the genes of the model to an index file (see `pangaea.index`)"""
+        matcher = self.matcher
+        if not isinstance(matcher, IndexMatcher):
+            matcher = IndexMatcher(self.genes_short, self.genes_long)
+        write_index(filename, self.index_key(), self.genes_short, self.genes_long, matcher)
 
     def parse(self, text):
-        relations = []
-        remove = string.punctuation
-        remove = remove.replace("/", "") # don't remove slashes
-        pattern = r"[{}]".format(remove) # create the pattern
-        sentences = nltk.sent_tokenize(text)
+        return self.parse_batch([text])[0]
 
-        for sentence in sentences:
-            detected_genes = set()
-            # Skip sentences which do not containg a relation stem
-            relevant_stems = [stem for stem in self.relation_words if stem in sentence]
-            if not any(relevant_stems):
-                continue
+    def parse_batch(self, texts):
+        """Extract the relations from a batch of abstracts.
+
+        The relevant sentences of all the abstracts are POS tagged together,
+        which is faster than tagging them one at a time. Sentences in which
+        no gene can be found are not tagged (see `screen_genes`), and the
+        number of sentences and papers skipped is counted in `stats`.
 
-            # Remove punctuation
-            sentence_no_punct = re.sub(pattern, '', sentence)
-            sentence_no_punct = sentence_no_punct.replace('/', ' / ')
-            # Tokenize words and convert sentence to lowercase
-            words = nltk.word_tokenize(sentence_no_punct.lower())
-            # Remove stopwords
-            words_cleaned = [word for word in words if word not in utils.get_stopwords()]
-            # POS tag
-            tagged_content = nltk.pos_tag(words_cleaned)
-
-            # Examine n-gram
-            for ngram in nltk.ngrams(tagged_content, self.N):
-                # Skip ngram if it does not contain target tags
-                if not any(tag for word, tag in ngram if tag in self.TARGET_TAGS):
+        The time spent in each step is recorded in `metrics` (see
+        `pangaea.metrics`).
+        """
+        metrics = self.metrics
+        # Skip abstracts and sentences which do not contain a relation stem
+        documents = []
+        with metrics.stage('extract/split sentences'):
+            for text in texts:
+                if self.stem_matcher.contains(text):
+                    documents.append(self.preprocessor.get_document(text))
+                else:
+                    documents.append(None)
+                    self.stats['papers without stems'] += 1
+        relevant = []
+        with metrics.stage('extract/find stems'):
+            for position, document in enumerate(documents):
+                if document is None:
                     continue
+                metrics.count('sentences', len(document.sentences))
+                for index, sentence in enumerate(document.sentences):
+                    relevant_stems = self.stem_matcher.find(sentence)
+                    if any(relevant_stems):
+                        relevant.append((position, index, relevant_stems))
+        metrics.count('stem hits', len(relevant))
 
-                for combination in utils.non_null_powerset(ngram):
-                    # Skip combination if it does not contain target tags
-                    if not any(tag for word, tag in combination if tag in self.TARGET_TAGS):
-                        continue
-                    new_word = ''.join(word for word, tag in combination)
-                    for gene in self.genes_short.keys():
-                        if gene == new_word:
-                            detected_genes.add(self.genes_short[gene])
-                    for gene in self.genes_long.keys():
-                        if gene in new_word:
-                            detected_genes.add(self.genes_long[gene])
-
-            relations.append({'Genes': list(detected_genes), 'Stems': relevant_stems, 'Sentence': sentence})
+        # Remove punctuation, tokenize and remove stopwords, and skip the
+        # sentences in which no gene can be found
+        genes_found = {}
+        to_tag = []
+        for position, index, _ in relevant:
+            document = documents[position]
+            if self.prefilter and index not in document.tags:
+                with metrics.stage('extract/tokenize'):
+                    words = self.preprocessor.get_words(document, index)
+                with metrics.stage('extract/screen genes'):
+                    found = self.screen_genes(words)
+                genes_found[position, index] = found
+                if not found:
+                    self.stats['sentences without genes'] += 1
+                    continue
+            to_tag.append((position, index))
+        if self.prefilter:
+            # Papers whose sentences with relation stems were all screened out
+            tagged_papers = set(position for position, _ in to_tag)
+            screened_papers = set(position for (position, _), found in genes_found.items() if not found)
+            self.stats['papers without genes'] += len(screened_papers - tagged_papers)
+
+        # POS tag
+        with metrics.stage('extract/tag'):
+            self.preprocessor.tag_sentences([(documents[position], index) for position, index in to_tag])
+        metrics.count('sentences tagged', len(to_tag))
+
+        relations = [[] for _ in documents]
+        with metrics.stage('extract/match genes'):
+            for position, index, relevant_stems in relevant:
+                document = documents[position]
+                detected_genes = set()
+                found = genes_found.get((position, index))
+                if found is None or found:
+                    candidates = self.get_candidates(document.get_tagged(index))
+                    metrics.count('candidates', len(candidates))
+                    if found is None:
+                        # Match the words built from the n-grams in one batch
+                        detected_genes.update(self.matcher.match_all(candidates))
+                    else:
+                        # The genes in the candidates were already found by the screen
+                        detected_genes.update(
+                            gene for candidate in candidates for gene in found.get(candidate, ()))
+                metrics.count('gene matches', len(detected_genes))
+
+                relations[position].append(
+                    {'Genes': list(detected_genes), 'Stems': relevant_stems,
+                     'Sentence': document.sentences[index]})
+        for document in documents:
+            if document is not None:
+                self.preprocessor.done(document)
         return relations
 
+    def screen_genes(self, words):
+        """Find the genes which could be detected in a sentence before tagging it.
+
+        The candidate words are built from the n-grams regardless of the
+        tags of the words, so they include all the candidates which are
+        built once the sentence is tagged. If no gene is found in these
+        candidates, no gene can be detected in the sentence.
+
+        Args:
+            words (list): Words of the sentence (without stopwords).
+
+        Returns:
+            dict: Genes found in each candidate word, for the candidates
+                in which at least one gene was found.
+        """
+        found = {}
+        for candidate in utils.ngram_candidates([(word, None) for word in words], self.N):
+            genes = self.matcher.match(candidate)
+            if genes:
+                found[candidate] = genes
+        return found
+
+    def get_config(self):
+        # The order of the genes is kept, as it determines the order of the results
+        return {
+            'N': self.N,
+            'TARGET_TAGS': self.TARGET_TAGS,
+            'LENGTH_THRESHOLD': self.LENGTH_THRESHOLD,
+            'relation_words': self.relation_words,
+            'stopwords': sorted(self.stopwords),
+            'genes_short': list(self.genes_short.items()),
+            'genes_long': list(self.genes_long.items()),
+        }
+
+    def get_candidates(self, tagged_words):
+        """Return the distinct words built from the n-grams of a sentence"""
+        return utils.ngram_candidates(tagged_words, self.N, self.TARGET_TAGS)
+
     def process_genes(self, genes_file, synonyms_file):
         """Parse a JSON file containing genes into 2 dictionaries divided by gene length.
 
@@ -116,7 +293,8 @@ class RulesExtractor(RelationsExtractor):
             - Remove items of 1 letter
             - Create 2 dictionaries based on string length:
                 - The key of the dictionary is the gene name without punctuation
-                - The value is the original gene name
+                - The value is the original gene name, or its official symbol
+                  if `canonical_names` is set (e.g. "p53" is reported as "tp53")
 
         The dictionaries are created to detect genes with different punctuation, but still
         be able to retrieve the original name; and the split by length is added to aid the
@@ -133,12 +311,17 @@ class RulesExtractor(RelationsExtractor):
         """
         
         genes = utils.parse_file(genes_file)
+        canonical = {}
         if synonyms_file:
-            gene_to_syns = utils.process_synonyms(genes, synonyms_file)
+            with open(synonyms_file) as f:
+                gene_to_syns, canonical = utils.resolve_synonyms(genes, json.load(f))
             genes.extend(list(itertools.chain.from_iterable(gene_to_syns.values())))
+        if not self.canonical_names:
+            canonical = {}
 
         genes = [gene.lower() for gene in genes if len(gene) > 1]
-        genes_no_punct = {"".join(l for l in gene if l not in string.punctuation):gene for gene in genes}
+        genes_no_punct = {"".join(l for l in gene if l not in string.punctuation):canonical.get(gene, gene)
+                          for gene in genes}
 
         genes_no_punct_short = {
                 k:v for k, v in genes_no_punct.items() if len(k) <= self.LENGTH_THRESHOLD}
@@ -154,24 +337,43 @@ class SimpleExtractor(RelationsExtractor):
     def __init__(self, genes_file, relation_words_file):
         self.relation_words = self.get_relation_words(relation_words_file)
         self.genes = self.process_genes(genes_file)
+        self.stem_matcher = StemMatcher(self.relation_words)
+        # The default stopwords are used only to share the preprocessed
+        # documents with the rules model, as they do not affect this model
+        self.preprocessor = Preprocessor(utils.load_stopwords())
+        self.metrics = Metrics(enabled=False)
 
     def parse(self, text):
-        sentences = nltk.sent_tokenize(text)
+        metrics = self.metrics
+        # Skip abstracts which do not contain a relation stem
+        if not self.stem_matcher.contains(text.lower()):
+            return []
+        with metrics.stage('extract/split sentences'):
+            document = self.preprocessor.get_document(text)
+        metrics.count('sentences', len(document.sentences))
         results = []
-        for sentence in sentences:
+        for sentence in document.sentences:
             sentence = sentence.lower()
-            relations = [rel_stem for rel_stem in self.relation_words if rel_stem in sentence]
+            with metrics.stage('extract/find stems'):
+                relations = self.stem_matcher.find(sentence)
             if not relations:
                 continue
-            genes = [gene for gene in self.genes if gene in set(sentence.split())]
+            metrics.count('stem hits')
+            with metrics.stage('extract/match genes'):
+                genes = [gene for gene in self.genes if gene in set(sentence.split())]
+            metrics.count('gene matches', len(genes))
             if len(genes) < 2:
                 continue
             results.append({'Genes': genes, 'Stems': relations, 'Sentence': sentence})
+        self.preprocessor.done(document)
         return results
             
     def process_genes(self, filename):
         return [gene.lower() for gene in utils.parse_file(filename)]
 
+    def get_config(self):
+        return {'relation_words': self.relation_words, 'genes': self.genes}
+
 
     def get_relation_words(self, filename):
         return utils.parse_file(filename)
@@ -6,100 +6,515 @@ in the papers within the XML file.
 """
 
 import os
+import io
+import sys
+import glob
+import gzip
+import mmap
+import contextlib
 import json
 import string
 import copy
 import csv
 import itertools
-import functools
 import multiprocessing as mp
+import multiprocessing.util
 import logging
-import threading
+from collections import Counter, namedtuple
 
-from . import models, utils
+from . import models, writers
+from .cache import DocumentCache, ExtractionCache, hash_text
+from .checkpoint import CHECKPOINT_INTERVAL, Checkpoint, check_run
+from .metrics import Metrics, start_profiler
+from .scheduler import SCHEDULERS
+from .sync import SyncIndex, hash_paper
 
 from tqdm import tqdm
 from lxml import etree
 
 #logger = mp.log_to_stderr(logging.DEBUG)
 
+CHUNKSIZE = 5 # Number of papers sent to a worker process at once
+SPLIT_SIZE = 2 ** 22 # Approximate number of bytes of XML parsed by a worker process at once
+
+ARTICLE_START = b'<PubmedArticle>'
+ARTICLE_SET_START = b'<PubmedArticleSet>'
+ARTICLE_SET_END = b'</PubmedArticleSet>'
+
+# Counters of the papers and sentences skipped by the model
+SKIP_COUNTERS = ['papers without stems', 'papers without genes', 'sentences without genes']
+
+# Counters of the articles of the update files (see `Parser.sync_papers`)
+SYNC_COUNTERS = ['articles new', 'articles revised', 'articles unchanged', 'articles deleted']
+
+# Output of a worker process for a batch of papers:
+#   - results: results of the papers in which relations were found
+#   - cache_entries: (pmid, abstract_hash, relations) of the papers
+#     which were not in the cache, to be stored by the main process
+#   - documents: (abstract_hash, document) of the abstracts which were
+#     preprocessed, to be stored in the document cache by the main process
+#   - stats: counters (e.g. papers processed, cache hits and misses)
+#   - metrics: time spent in each stage by the worker process (see
+#     `pangaea.metrics`), or None if the run is not profiled
+Batch = namedtuple('Batch', ['results', 'cache_entries', 'documents', 'stats', 'metrics'])
+
+# Passed to `Parser.write_files` with the results when a checkpoint is due
+COMMIT = object()
+
+# State of each worker process, set once when the process starts
+_worker = {}
+
+
+def init_worker(model=None, cache=None, profile_dir=None, shard=None, chunksize=CHUNKSIZE):
+    """Initialise a worker process with the model and the cache.
+
+    Called once in each worker process, so that the tasks sent to the
+    workers carry only the articles rather than the model (which contains
+    all the genes). When the worker processes are forked, the state is
+    inherited from the parent process instead, and the arguments are None.
+
+    If `profile_dir` is set, the process is profiled with cProfile until
+    it exits (see `pangaea.metrics.start_profiler`). If `shard` is set,
+    only the papers of the shard are extracted from the XML files, which
+    are processed `chunksize` papers at a time (see `extract_worker_range`).
+    """
+    if model is not None:
+        _worker['model'] = model
+        _worker['cache'] = cache
+        _worker['profile_dir'] = profile_dir
+        _worker['shard'] = shard
+        _worker['chunksize'] = chunksize
+    if _worker.get('profile_dir'):
+        stop_profiler = start_profiler(_worker['profile_dir'], 'worker')
+        multiprocessing.util.Finalize(None, stop_profiler, exitpriority=10)
+
+
+def extract_worker_batch(papers):
+    """Extract features from papers using the model of the worker process.
+
+    Papers found in the cache (if any) are not parsed again, and the
+    other papers are parsed together with `model.parse_batch`.
+
+    Args:
+        papers (iterable): Papers as returned by `parse_article`.
+
+    Returns:
+        Batch: Results, new cache entries, counters and metrics of the batch.
+    """
+    model = _worker['model']
+    cache = _worker.get('cache')
+    metrics = model.metrics
+    batch = Batch([], [], [], Counter(), None)
+    with metrics.stage('batch'):
+        papers = list(papers)
+        batch.stats['papers'] += len(papers)
+        relations = [None] * len(papers)
+        if cache is not None:
+            with metrics.stage('cache lookup'):
+                abstract_hashes = [hash_text(paper['Abstract']) for paper in papers]
+                for i, paper in enumerate(papers):
+                    relations[i] = cache.get(paper['PMID'], abstract_hashes[i])
+                    if relations[i] is None:
+                        batch.stats['cache misses'] += 1
+                    else:
+                        batch.stats['cache hits'] += 1
+
+        # Parse the papers which were not in the cache in one batch
+        missing = [i for i, paper_relations in enumerate(relations) if paper_relations is None]
+        with metrics.stage('extract'):
+            parsed = model.parse_batch([papers[i]['Abstract'] for i in missing])
+        for i, paper_relations in zip(missing, parsed):
+            relations[i] = paper_relations
+            if cache is not None:
+                batch.cache_entries.append((papers[i]['PMID'], abstract_hashes[i], paper_relations))
+
+        for paper, paper_relations in zip(papers, relations):
+            result = Parser.extract_features(paper, model, paper_relations)
+            if result:
+                batch.results.append(result)
+    metrics.count('papers', len(papers))
+    if metrics.enabled:
+        batch = batch._replace(metrics=metrics.pop())
+    preprocessor = getattr(model, 'preprocessor', None)
+    if preprocessor is not None:
+        batch.documents.extend(preprocessor.pop_pending())
+        batch.stats.update(preprocessor.stats)
+        preprocessor.stats.clear()
+    model_stats = getattr(model, 'stats', None)
+    if model_stats is not None:
+        batch.stats.update(model_stats)
+        model_stats.clear()
+    return batch
+
+
+def extract_worker_range(task):
+    """Parse a byte range of an XML file and extract features from its papers.
+
+    Only the papers of the shard of the worker process (if any) are
+    extracted. The papers are parsed and extracted `chunksize` papers at
+    a time, so only one chunk of papers (and of their documents) is held
+    in memory, even when the task is a whole file.
+
+    Args:
+        task (tuple): (xml_file, start, end) as returned by `split_xml`,
+            or (xml_file, None, None) to parse the whole file.
+
+    Returns:
+        Batch: Results, new cache entries, counters and metrics of the papers.
+    """
+    papers = parse_range(*task)
+    shard = _worker.get('shard')
+    if shard is not None:
+        papers = (paper for paper in papers if shard.contains(paper['PMID']))
+    papers = iter(_worker['model'].metrics.timed('parse xml', papers))
+    chunksize = _worker.get('chunksize', CHUNKSIZE)
+    batch = Batch([], [], [], Counter(), None)
+    for paper in papers:
+        # The chunk is parsed as it is extracted, within the 'batch' stage
+        chunk = extract_worker_batch(itertools.chain([paper], itertools.islice(papers, chunksize - 1)))
+        batch.results.extend(chunk.results)
+        batch.cache_entries.extend(chunk.cache_entries)
+        batch.documents.extend(chunk.documents)
+        batch.stats.update(chunk.stats)
+        if chunk.metrics is not None:
+            if batch.metrics is None:
+                batch = batch._replace(metrics=chunk.metrics)
+            else:
+                batch.metrics.update(chunk.metrics)
+    return batch
+
+
+def parse_article(elem):
+    """Extract the relevant information from a `PubmedArticle` element.
+
+    Returns:
+        dict: A dictionary containing the relevant information of the
+            article, or None if the article has no abstract.
+    """
+    current_article = {}
+    medline_citation = elem.find('MedlineCitation')
+    article = medline_citation.find('Article')
+
+    current_article['PMID'] = medline_citation.find('PMID').text
+    try:
+        current_article['Year'] = article.find('ArticleDate').find('Year').text
+    except AttributeError:
+        current_article['Year'] = None
+    current_article['Journal Title'] = article.find('Journal').find('Title').text
+    current_article['Article Title'] = article.find('ArticleTitle').text
+    abstract = article.find('Abstract')
+    if abstract is None:
+        return None
+    current_article['Abstract'] = ''.join(abstract.itertext())
+    return current_article
+
+
+def iter_articles(source):
+    """Parse articles from an XML file or file object one at a time.
+
+    Yields:
+        dict: A dictionary containing the relevant information of a
+            single article (only articles with an abstract).
+    """
+    for event, elem in etree.iterparse(source, events=('end',), tag='PubmedArticle'):
+        current_article = parse_article(elem)
+        if current_article is not None:
+            yield current_article
+        elem.clear()
+
+
+def iter_citations(source):
+    """Parse the articles and deleted citations of a PubMed update file.
+
+    Yields:
+        (str, int, dict): PMID, version and paper (see `parse_article`)
+            of each article, in the order of the file. The paper is None
+            for articles without abstract, and for deleted citations, for
+            which the version is None.
+    """
+    for event, elem in etree.iterparse(source, events=('end',), tag=('PubmedArticle', 'DeleteCitation')):
+        if elem.tag == 'DeleteCitation':
+            for pmid in elem.iterfind('PMID'):
+                yield pmid.text, None, None
+        else:
+            pmid = elem.find('MedlineCitation').find('PMID')
+            yield pmid.text, int(pmid.get('Version', 1)), parse_article(elem)
+        elem.clear()
+
+
+def iter_documents(documents):
+    """Parse the articles of a sequence of XML documents one at a time.
+
+    Args:
+        documents (iterable): XML documents containing a `PubmedArticleSet`,
+            as bytes or as files opened in binary mode (e.g. the batches of
+            a streamed download), which are closed once parsed.
+
+    Raises:
+        ValueError: If a document cannot be parsed.
+
+    Yields:
+        dict: A dictionary containing the relevant information of a
+            single article.
+    """
+    for document in documents:
+        if isinstance(document, bytes):
+            document = io.BytesIO(document)
+        with document:
+            try:
+                yield from iter_articles(document)
+            except etree.ParseError as e:
+                raise ValueError('Error parsing the downloaded articles: {}'.format(e))
+
+
+def find_xml_files(paths):
+    """Find the XML files to be parsed.
+
+    Each path may be an XML file (optionally compressed with gzip), a
+    glob pattern, or a directory, in which case all the `.xml` and
+    `.xml.gz` files in the directory are used.
+
+    Raises:
+        ValueError: If a path does not exist or matches no files.
+
+    Returns:
+        list: Paths of the XML files.
+    """
+    xml_files = []
+    for path in paths:
+        if os.path.isdir(path):
+            matches = sorted(
+                os.path.join(path, filename) for filename in os.listdir(path)
+                if filename.endswith(('.xml', '.xml.gz')))
+        elif os.path.exists(path):
+            matches = [path]
+        else:
+            matches = sorted(glob.glob(path))
+            if not matches and not glob.has_magic(path):
+                raise ValueError("File {} does not exist.".format(path))
+        if not matches:
+            raise ValueError("No XML files found in {}.".format(path))
+        xml_files.extend(matches)
+    return xml_files
+
+
+def is_compressed(xml_file):
+    return xml_file.endswith('.gz')
+
+
+def open_xml(xml_file):
+    """Open an XML file in binary mode, decompressing gzip files as a stream"""
+    if is_compressed(xml_file):
+        return gzip.open(xml_file, 'rb')
+    return open(xml_file, 'rb')
+
+
+def split_xml(xml_file, split_size=SPLIT_SIZE):
+    """Split an XML file into byte ranges containing whole articles.
+
+    The file is memory-mapped, and starting from the first article, the
+    function jumps `split_size` bytes ahead and looks for the start of the
+    next article to find the end of the current range. Therefore, only the
+    boundaries of the ranges are searched for, rather than every article.
+
+    Returns:
+        list: (xml_file, start, end) tuples, where `start` is the offset of
+            a `<PubmedArticle>` tag and `end` the offset of the next range
+            (or of the closing `</PubmedArticleSet>` tag).
+    """
+    ranges = []
+    with open(xml_file, 'rb') as f:
+        if not os.fstat(f.fileno()).st_size:
+            return ranges
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            end_of_articles = mm.rfind(ARTICLE_SET_END)
+            if end_of_articles == -1:
+                end_of_articles = len(mm)
+            start = mm.find(ARTICLE_START)
+            while start != -1 and start < end_of_articles:
+                end = mm.find(ARTICLE_START, start + split_size, end_of_articles)
+                if end == -1:
+                    end = end_of_articles
+                ranges.append((xml_file, start, end))
+                start = end
+    return ranges
+
+
+def parse_range(xml_file, start=None, end=None):
+    """Parse the articles in a byte range of an XML file.
+
+    The range is read directly from the file and wrapped in a
+    `<PubmedArticleSet>` element to form a valid XML document. If no
+    range is given, the whole file is parsed as a stream.
+
+    Raises:
+        ValueError: If the range cannot be parsed (lxml parse errors cannot
+            be sent back from the worker processes).
+
+    Yields:
+        dict: A dictionary containing the relevant information of a
+            single article.
+    """
+    try:
+        if start is None:
+            with open_xml(xml_file) as f:
+                yield from iter_articles(f)
+        else:
+            with open(xml_file, 'rb') as f:
+                f.seek(start)
+                data = f.read(end - start)
+            yield from iter_articles(io.BytesIO(ARTICLE_SET_START + data + ARTICLE_SET_END))
+    except etree.ParseError as e:
+        location = xml_file if start is None else 'bytes {}-{} of {}'.format(start, end, xml_file)
+        raise ValueError('Error parsing {}: {}'.format(location, e))
+
+
+def get_pool(processes, model, cache=None, profile_dir=None, shard=None, chunksize=CHUNKSIZE):
+    """Create a pool of processes which receive the model only once.
+
+    On Linux, the processes are forked after storing the model in the
+    module state, so they share the memory of the parent process
+    (copy-on-write) and the model is never pickled. Otherwise, the model
+    is pickled once for each process by the pool initializer.
+
+    Genes loaded lazily (e.g. from `--index`) are loaded before the pool
+    is created, so they are not loaded again by each process.
+    """
+    if model is not None:
+        model.load_genes()
+    if sys.platform.startswith('linux'):
+        _worker.update(model=model, cache=cache, profile_dir=profile_dir, shard=shard,
+                       chunksize=chunksize)
+        return mp.get_context('fork').Pool(processes=processes, initializer=init_worker)
+    return mp.Pool(processes=processes, initializer=init_worker,
+                   initargs=(model, cache, profile_dir, shard, chunksize))
+
 class Parser:
-    def __init__(self, xml_file, model, output_file, cores):
+    def __init__(self, xml_file, model, output_file, cores, ordered=False, chunksize=CHUNKSIZE,
+                 output_formats=('json',), compression=None, flush_interval=writers.FLUSH_INTERVAL,
+                 split_xml=False, cache_file=None, documents_file=None, sync_file=None,
+                 profile=False, metrics_file=None, profile_dir=None, scheduler='fixed', shard=None,
+                 checkpoint_interval=None, resume=False):
         self.model = model
         self.output_file = output_file
-        self.manager = mp.Manager()
-        self.queue = self.manager.Queue()
+        self.output_formats = output_formats
+        self.compression = compression
+        self.flush_interval = flush_interval
         self.cores = cores or mp.cpu_count()
+        self.ordered = ordered
+        self.chunksize = chunksize
+        self.scheduler = SCHEDULERS[scheduler](self.cores, chunksize, model)
+        self.split_xml = split_xml
+        self.cache = ExtractionCache(cache_file, model.fingerprint()) if cache_file else None
+        self.documents = None
+        if documents_file:
+            # The model preprocesses the abstracts, so it reads the documents
+            self.documents = DocumentCache(documents_file, model.preprocessor.fingerprint())
+            model.preprocessor.cache = self.documents
+        self.sync = SyncIndex(sync_file, model.fingerprint()) if sync_file else None
+        self.stats = Counter()
+        # The metrics of the main process, to which those of the workers are added
+        self.profile = profile
+        self.metrics_file = metrics_file
+        self.profile_dir = profile_dir
+        self.metrics = Metrics(enabled=bool(profile or metrics_file or profile_dir))
+        if model is not None:
+            model.metrics = Metrics(enabled=self.metrics.enabled)
+
+        if xml_file is None: # The papers are passed to `process_papers`
+            self.xml_files = []
+        else:
+            self.xml_files = find_xml_files([xml_file] if isinstance(xml_file, str) else xml_file)
 
-        if not os.path.exists(xml_file):
-            raise ValueError("File {} does not exist.".format(xml_file))
-        self.xml_file = xml_file
+        # The papers of a shard (see `pangaea.shard`) are selected by file if
+        # there are multiple files, and by PMID otherwise. The update files
+        # are always processed in order, so with `--sync` they are split by PMID.
+        self.shard = shard
+        self.pmid_shard = shard
+        if shard is not None and len(self.xml_files) > 1 and self.sync is None:
+            self.xml_files = shard.select_files(self.xml_files)
+            self.pmid_shard = None
+
+        # Checkpoints (see `pangaea.checkpoint`) record the number of papers
+        # whose results are written, so the results are written in order
+        self.resume = resume
+        self.checkpoint_interval = checkpoint_interval or (CHECKPOINT_INTERVAL if resume else None)
+        self.checkpoint = None
+        self.position = Counter() # Papers and tasks whose results are written
+        if self.checkpoint_interval:
+            if self.sync is not None:
+                raise ValueError('Checkpoints cannot be used with --sync, which already keeps '
+                                 'the articles processed.')
+            for output_format in output_formats:
+                if not writers.WRITERS[output_format].RESUMABLE:
+                    raise ValueError('Checkpoints cannot be used with the {} format.'.format(output_format))
+            self.checkpoint = Checkpoint(output_file)
+            self.ordered = True
 
     def parse_papers(self):
-        """Parse papers from an XML file into chunks.
+        """Parse papers from the XML files one at a time.
+
+        With a shard split by PMID, only the papers of the shard are
+        returned. When a run is resumed, the papers before the `position`
+        of the checkpoint are skipped.
 
         Yields:
             dict: A dictionary containing the relevant information of a
                 single article.
         """
-        for event, elem in etree.iterparse(self.xml_file, events=('end',), tag='PubmedArticle'):
-            current_article = {}
-            medline_citation = elem.find('MedlineCitation')
-            article = medline_citation.find('Article')
+        skip = self.position['papers']
+        for xml_file in self.xml_files:
+            with open_xml(xml_file) as f:
+                for paper in iter_articles(f):
+                    if self.pmid_shard is None or self.pmid_shard.contains(paper['PMID']):
+                        if skip:
+                            skip -= 1
+                        else:
+                            yield paper
 
-            current_article['PMID'] = medline_citation.find('PMID').text
-            try:
-                current_article['Year'] = article.find('ArticleDate').find('Year').text
-            except AttributeError:
-                current_article['Year'] = None
-            current_article['Journal Title'] = article.find('Journal').find('Title').text
-            current_article['Article Title'] = article.find('ArticleTitle').text
-            abstract = article.find('Abstract')
-            if abstract is not None:
-                current_article['Abstract'] = ''.join(abstract.itertext())
-                yield current_article
-            elem.clear()
-
-
-    def write_files(self):
-        """Write processed data from the queue
-        
-        This function runs as an asynchronous process, and it is
-        the only one that writes to disk. The function is looping
-        waiting for the queue to have data before writing it to file.
-
-        The buffer is flushed periodically to balance user feedback and I/O
-
-        Args
-            queue (Queue): 
+
+    def write_files(self, results):
+        """Write the results returned by the worker processes to disk.
+
+        The results are written as they arrive by one writer for each of
+        the `output_formats`, so only one result is kept in memory at a
+        time. The files are flushed every `flush_interval` results to
+        balance user feedback and I/O.
+
+        When the results are followed by `COMMIT`, the files are committed
+        and a checkpoint is saved (see `commit`). When a run is resumed,
+        the files are appended to from the last checkpoint.
+
+        Args:
+            results (iterable): Results of `extract_features`, where papers
+                without any relations are None.
         """
-        json_output_file = utils.generate_filename(self.output_file, 'json')
-        print('Outputting to {}...'.format(json_output_file))
+        results_writers = [
+            writers.WRITERS[output_format](self.output_file, self.compression, self.flush_interval)
+            for output_format in self.output_formats]
+        print('Outputting to {}...'.format(
+            ', '.join(writer.filename for writer in results_writers)))
+        resumed = self.checkpoint.state if self.checkpoint is not None else None
+        if resumed:
+            for writer in results_writers:
+                writer.resume(resumed['writers'][writer.filename])
 
-        result = self.queue.get()
-        if not result:
+        with contextlib.ExitStack() as stack:
+            for writer in results_writers:
+                stack.enter_context(writer)
+            for result in results:
+                if result is COMMIT:
+                    self.commit(results_writers)
+                elif result:
+                    with self.metrics.stage('write output'):
+                        for writer in results_writers:
+                            writer.write(result)
+
+        if not results_writers[0].count:
             print('No results.')
-            return
 
-        with open(json_output_file, 'w') as f:
-            to_write = '[{}, '.format(json.dumps(result))
-            counter = 0
-            while True:
-                result = self.queue.get()
-                if not result:
-                    to_write = to_write[:-2] + ']' # remove trailing comma
-                    f.write(to_write)
-                    break
-                else:
-                    to_write += '{}, '.format(json.dumps(result))
-                if counter % 50 == 0:
-                    f.write(to_write)
-                    to_write = ''
-                    f.flush()
-                counter += 1
-
-
-    def process_papers(self):
+
+    def process_papers(self, papers=None):
         """Spawn processes to parse the papers in an XML file.
 
         The XML file is expected to contain PubMed articles, and the
@@ -108,29 +523,311 @@ class Parser:
         The format of the genes set is expected to be a plain text file,
         and each gene should be written on a separate line.
 
+        The papers are sent to the worker processes in batches by the
+        `scheduler` (see `pangaea.scheduler`): chunks of `chunksize`
+        papers by default, or batches sized from the estimated cost of the
+        papers with the adaptive scheduler. The results are returned
+        either as soon as they are ready, or in the order of the XML file
+        if `ordered` is set, and they are written to disk by the main
+        process.
+
+        A single XML file is parsed by the main process, which sends the
+        papers to the worker processes. If there are multiple XML files,
+        each worker process parses whole files instead. If `split_xml` is
+        set, uncompressed files are also split into byte ranges (see
+        `split_xml`), so parsing scales with the number of cores even for
+        a single file. The scheduler does not apply to these tasks: each
+        worker process extracts the papers of its part of the files in
+        chunks of `chunksize` papers, and the progress (and checkpoints)
+        advance once per task.
+
+        The pool sends the papers to the worker processes through a pipe,
+        and it stops reading them when the pipe is full, so when `papers`
+        is given (e.g. the articles of a streamed download), they are
+        consumed only slightly faster than they are processed.
+
+        With checkpoints, the results are written in order, and a
+        checkpoint is saved every `checkpoint_interval` papers. If
+        `resume` is set, the run continues from the last checkpoint.
+
         Args:
-            xml_file (str): Path to the XML file
-            output_file (str): Path to an output file to write to
-            genes_set (str, optional): Path to a file containing a subset of genes
-            relations (str, optional): Path to a file containing a new set of relations
-            use_synonyms (bool, optional): Whether the synonyms dictionary should be used
-        """
-        papers = self.parse_papers()
+            papers (iterable, optional): Papers to process instead of the
+                papers of the XML files (see `parse_article`).
 
-        with mp.Pool(processes=self.cores) as pool:
-            threading.Thread(target=self.write_files).start()
+        Raises:
+            ValueError: If the run cannot be resumed from the checkpoint.
+        """
+        if self.checkpoint is not None:
+            if papers is not None:
+                raise ValueError('Checkpoints can only be used with XML files.')
+            self.load_checkpoint()
+        pool = get_pool(self.cores, self.model, self.cache, self.profile_dir, self.pmid_shard,
+                        self.chunksize)
+        with self.metrics.stage('total'), pool:
+            imap = pool.imap if self.ordered else pool.imap_unordered
             try:
-                list(tqdm(pool.imap(functools.partial(self.extract_features, model=self.model, queue=self.queue), papers, chunksize=5)))
-
+                with self.profile_main():
+                    if papers is None and (self.split_xml or len(self.xml_files) > 1):
+                        batches = imap(extract_worker_range, self.get_tasks()[self.position['tasks']:])
+                    else:
+                        if papers is None:
+                            papers = self.parse_papers()
+                        papers = self.metrics.timed('read papers', papers)
+                        batches = self.scheduler.map(pool, extract_worker_batch, papers, self.ordered)
+                    self.write_files(self.collect_results(batches))
+                self.join_pool(pool)
             except etree.ParseError:
                 print('Error parsing the file. Please check if the file has a valid format.')
                 return
-            
-            self.queue.put(None)
+            finally:
+                self.close_caches()
+        if self.checkpoint is not None:
+            # The run is complete
+            self.checkpoint.remove()
+        self.print_stats()
+        self.report_metrics()
+
+
+    def sync_papers(self):
+        """Process the new and revised articles of PubMed update files.
+
+        The files are processed in order, and the articles of each file
+        are compared with the `SyncIndex`: the articles which are not in
+        the index, or whose version or contents changed, are extracted by
+        the worker processes, and the deleted citations are removed from
+        the index. The index is updated once a whole file is processed,
+        so an interrupted run can be started again.
+
+        The results of all the articles in the index are then written to
+        the output files, so the output contains exactly one result for
+        each article with relations, including those processed in
+        previous runs.
+
+        Raises:
+            ValueError: If an XML file cannot be parsed.
+        """
+        with self.metrics.stage('total'):
+            with get_pool(self.cores, self.model, self.cache, self.profile_dir, self.pmid_shard,
+                          self.chunksize) as pool:
+                try:
+                    with self.profile_main():
+                        for xml_file in self.xml_files:
+                            self.sync_file(pool, xml_file)
+                    self.join_pool(pool)
+                finally:
+                    self.close_caches()
+            self.write_files(self.sync.iter_results())
+        self.sync.close()
+        print('Sync: {:,} new, {:,} revised, {:,} unchanged and {:,} deleted articles'.format(
+            *(self.stats[counter] for counter in SYNC_COUNTERS)))
+        self.print_stats()
+        self.report_metrics()
+
+
+    def sync_file(self, pool, xml_file):
+        """Process the new and revised articles of an update file (see `sync_papers`)"""
+        # Only the last occurrence of an article in the file is processed
+        changes = {}
+        try:
+            with open_xml(xml_file) as f:
+                for pmid, version, paper in iter_citations(f):
+                    if self.pmid_shard is None or self.pmid_shard.contains(pmid):
+                        changes[pmid] = (version, paper)
+        except etree.ParseError as e:
+            raise ValueError('Error parsing {}: {}'.format(xml_file, e))
+
+        indexed = self.sync.get_many(changes)
+        papers = []
+        deleted = []
+        for pmid, (version, paper) in changes.items():
+            previous = indexed.get(pmid)
+            if paper is None:
+                # Deleted citation, or article whose abstract was removed
+                if previous is not None:
+                    deleted.append(pmid)
+                    self.stats['articles deleted'] += 1
+                continue
+            paper_hash = hash_paper(paper)
+            if previous is not None and (version < previous[0] or (version, paper_hash) == previous):
+                self.stats['articles unchanged'] += 1
+                continue
+            self.stats['articles revised' if previous is not None else 'articles new'] += 1
+            papers.append((pmid, version, paper_hash, paper))
+
+        batches = self.scheduler.map(
+            pool, extract_worker_batch, [paper for pmid, version, paper_hash, paper in papers])
+        results = {result['PMID']: result for result in self.collect_results(batches)}
+        source = os.path.basename(xml_file)
+        self.sync.update(
+            [(pmid, version, paper_hash, source, results.get(pmid))
+             for pmid, version, paper_hash, paper in papers],
+            deleted)
+
+
+    def get_run(self):
+        """Return the settings of the run which must not change when it is resumed"""
+        return {
+            'inputs': {
+                'files': self.xml_files, 'split_xml': self.split_xml,
+                'shard': str(self.shard) if self.shard is not None else None,
+            },
+            'model': self.model.fingerprint(),
+            'outputs': [writers.WRITERS[output_format].get_filename(self.output_file, self.compression)
+                        for output_format in self.output_formats],
+        }
+
+
+    def load_checkpoint(self):
+        """Load the position of the last checkpoint if the run is resumed.
+
+        Otherwise, or if there is no checkpoint, the run starts from the
+        beginning and any previous checkpoint is removed.
+
+        Raises:
+            ValueError: If the checkpoint was saved by another run.
+        """
+        self.run = self.get_run()
+        self.checkpoint.state = None
+        self.position = Counter()
+        if self.resume and self.checkpoint.exists():
+            state = self.checkpoint.load()
+            check_run(state, self.run)
+            self.checkpoint.state = state
+            self.position.update(state['position'])
+            print('Resuming after {:,} papers'.format(self.position['papers']))
+        else:
+            if self.resume:
+                print('No checkpoint found, starting from the beginning')
+            self.checkpoint.remove()
+        self.committed = self.position['papers']
+
+
+    def commit(self, results_writers):
+        """Commit the output files and save a checkpoint.
+
+        The files are committed before the checkpoint is saved, so the
+        checkpoint never refers to results which are not on disk.
+        """
+        state = {
+            'run': self.run,
+            'position': dict(self.position),
+            'writers': {writer.filename: writer.commit() for writer in results_writers},
+        }
+        self.checkpoint.save(state)
+        self.committed = self.position['papers']
+
+
+    def close_caches(self):
+        for cache in (self.cache, self.documents):
+            if cache is not None:
+                cache.close()
+
+
+    @contextlib.contextmanager
+    def profile_main(self):
+        """Profile the main process with cProfile if `profile_dir` is set.
+
+        The profiler is started once the pool is created, as the worker
+        processes would inherit it when they are forked.
+        """
+        if not self.profile_dir:
+            yield
+            return
+        stop_profiler = start_profiler(self.profile_dir, 'main')
+        try:
+            yield
+        finally:
+            stop_profiler()
+
+
+    def join_pool(self, pool):
+        """Wait for the worker processes to exit once all the papers are processed.
+
+        The pool is otherwise terminated when it is closed, and the
+        profiles of the worker processes are written only when they exit
+        normally.
+        """
+        if self.profile_dir:
+            pool.close()
+            pool.join()
+
+
+    def report_metrics(self):
+        """Print the metrics of the run (`profile`) and write them to `metrics_file`"""
+        if self.profile:
+            print(self.metrics.report(self.cores))
+        if self.metrics_file:
+            self.metrics.write(self.metrics_file, cores=self.cores, stats=self.stats)
+            print('Metrics written to {}'.format(self.metrics_file))
+        if self.profile_dir:
+            print('Profiles written to {}'.format(self.profile_dir))
+
+
+    def print_stats(self):
+        """Print the counters of the caches and of the papers skipped by the model"""
+        if self.cache is not None:
+            print('Cache: {:,} hits, {:,} misses'.format(
+                self.stats['cache hits'], self.stats['cache misses']))
+        if self.documents is not None:
+            print('Documents: {:,} cached, {:,} preprocessed'.format(
+                self.stats['documents cached'], self.stats['documents preprocessed']))
+        if any(self.stats[counter] for counter in SKIP_COUNTERS):
+            print('Skipped: {:,} papers without relation stems, {:,} papers and {:,} sentences '
+                  'without genes'.format(
+                      self.stats['papers without stems'], self.stats['papers without genes'],
+                      self.stats['sentences without genes']))
+
+
+    def collect_results(self, batches):
+        """Collect the results of the batches returned by the worker processes.
+
+        The counters and metrics of the batches are added to `stats` and
+        `metrics`, and the new cache entries and documents are stored in
+        the caches. With checkpoints, `COMMIT` is yielded once the results
+        of `checkpoint_interval` papers are written.
+
+        Yields:
+            dict: Results of the papers in which relations were found.
+        """
+        with tqdm(unit='paper') as progress:
+            for batch in self.metrics.timed('wait for workers', batches):
+                progress.update(batch.stats['papers'])
+                self.stats.update(batch.stats)
+                if batch.metrics is not None:
+                    self.metrics.update(batch.metrics)
+                if self.cache is not None:
+                    with self.metrics.stage('store caches'):
+                        self.cache.put_many(batch.cache_entries)
+                if self.documents is not None:
+                    with self.metrics.stage('store caches'):
+                        self.documents.put_many(batch.documents)
+                yield from batch.results
+                if self.checkpoint is not None:
+                    # The results are in order, so all the papers up to this batch are written
+                    self.position['papers'] += batch.stats['papers']
+                    self.position['tasks'] += 1
+                    if self.position['papers'] - self.committed >= self.checkpoint_interval:
+                        yield COMMIT
+
+
+    def get_tasks(self):
+        """Divide the XML files into parts parsed by the worker processes.
+
+        Returns:
+            list: (xml_file, start, end) tuples, where start and end are
+                None for files which are parsed as a whole.
+        """
+        tasks = []
+        for xml_file in self.xml_files:
+            if self.split_xml and not is_compressed(xml_file):
+                tasks.extend(split_xml(xml_file))
+            else:
+                tasks.append((xml_file, None, None))
+        return tasks
 
 
     @staticmethod
-    def extract_features(paper, model, queue):
+    def extract_features(paper, model, relations=None):
         """Parse paper for gene relations and return them.
 
         The workflow of the parsing process is described in the project-wide
@@ -143,22 +840,20 @@ class Parser:
 
         Args:
             paper (dict): Dictionary containing the relevant article information.
-            relation_stems (list): Stems of relation words.
-            stopwords (list): Stopwords that are not also gene names
-            genes_short (dict): Mapping from gene names (without punctuation)
-                to gene name (with punctuation). Only genes with a length 
-                <= `LENGTH_THRESHOLD`.
-            genes_long (dict): Mapping from gene names (without punctuation)
-                to gene name (with punctuation). Only genes with a length 
-                > `LENGTH_THRESHOLD`.
+            model (RelationsExtractor): Model used to parse the abstract.
+            relations (list, optional): Relations already extracted from the
+                abstract (e.g. from the cache), in which case the abstract
+                is not parsed again.
 
         Returns:
-            list: List containing relevant information, if any was found.
+            dict: Relevant information of the paper, if any relations
+                were found, otherwise None.
         """
         paper_info = {}
         abstract = paper['Abstract']
         paper['Article Title'] = paper['Article Title'] or " "
-        relations = model.parse(abstract)
+        if relations is None:
+            relations = model.parse(abstract)
 
         if relations:
             paper_info['Article Title'] = paper['Article Title']
@@ -166,4 +861,4 @@ class Parser:
             paper_info['PMID'] = paper['PMID']
             paper_info['Year'] = paper['Year']
             paper_info['Relations'] = relations
-            queue.put(paper_info)
+            return paper_info
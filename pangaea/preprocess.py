@@ -0,0 +1,181 @@
+"""Split the abstracts into sentences, and tokenize and tag the sentences.
+
+Sentence splitting, word tokenization and POS tagging do not depend on the
+genes or relation words of a model, and they are the most expensive steps
+of the rules model. `Preprocessor` performs them for any model and keeps
+the results in a `Document`. With a `DocumentCache`, the documents are
+stored between runs, so switching gene lists or models only repeats the
+matching of the genes.
+
+Sentences are tagged only when a model asks for them (e.g. the rules model
+only tags sentences which contain a relation stem), and the tags of other
+sentences are added to the cached document when they are needed later.
+"""
+
+import json
+import re
+import string
+from collections import Counter
+
+import nltk
+
+from .cache import hash_text
+from .tagger import BatchTagger
+
+VERSION = 2 # Increase when the preprocessing changes, to invalidate cached documents
+
+# Punctuation removed before tokenizing (slashes separate words instead)
+PUNCTUATION_PATTERN = re.compile(r"[{}]".format(string.punctuation.replace("/", "")))
+
+
+def normalize(sentence):
+    """Remove punctuation, separate the words around slashes and lowercase the sentence"""
+    sentence = PUNCTUATION_PATTERN.sub('', sentence)
+    sentence = sentence.replace('/', ' / ')
+    return sentence.lower()
+
+
+class Document:
+    """Sentences of an abstract and their POS tagged words.
+
+    Args:
+        abstract_hash (str): Hash of the abstract (None if not cached).
+        sentences (list): Sentences of the abstract.
+        words (dict, optional): Words of each sentence which was tokenized
+            (without stopwords), keyed by the position of the sentence.
+        tags (dict, optional): Tags of the words of each sentence which was
+            tagged, keyed by the position of the sentence.
+    """
+    def __init__(self, abstract_hash, sentences, words=None, tags=None):
+        self.abstract_hash = abstract_hash
+        self.sentences = sentences
+        self.words = words or {}
+        self.tags = tags or {}
+        self.changed = False
+
+    def get_tagged(self, index):
+        """Return the (word, tag) tuples of a sentence which was tagged"""
+        return list(zip(self.words[index], self.tags[index]))
+
+    def to_dict(self):
+        """Return the document as a JSON serializable dictionary.
+
+        The words and tags of each sentence are stored as two separate
+        lists, which is more compact than a list of pairs.
+        """
+        return {
+            'sentences': self.sentences,
+            'words': {str(index): words for index, words in self.words.items()},
+            'tags': {str(index): tags for index, tags in self.tags.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, abstract_hash, document):
+        words = {int(index): words for index, words in document['words'].items()}
+        tags = {int(index): tags for index, tags in document['tags'].items()}
+        return cls(abstract_hash, document['sentences'], words, tags)
+
+
+class Preprocessor:
+    """Split, tokenize and tag the text of the abstracts.
+
+    Args:
+        stopwords (frozenset): Words removed before tagging.
+        cache (DocumentCache, optional): Cache of the documents. Documents
+            which are new or changed are kept in `pending` until they are
+            stored by the main process (see `pop_pending`).
+        tagger (BatchTagger, optional): Tagger used for the sentences,
+            loaded when it is first needed if not provided. The tagger
+            is not pickled, so processes which receive the preprocessor
+            load their own when they first tag a sentence.
+    """
+    def __init__(self, stopwords, cache=None, tagger=None):
+        self.stopwords = stopwords
+        self.cache = cache
+        self.tagger = tagger
+        self.pending = []
+        self.stats = Counter()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['tagger'] = None
+        return state
+
+    def get_config(self):
+        return {'version': VERSION, 'stopwords': sorted(self.stopwords)}
+
+    def fingerprint(self):
+        """Return a hash of the preprocessing settings"""
+        return hash_text(json.dumps(self.get_config(), sort_keys=True))
+
+    def get_document(self, text):
+        """Return the document of an abstract, from the cache if possible"""
+        if self.cache is None:
+            return Document(None, nltk.sent_tokenize(text))
+        abstract_hash = hash_text(text)
+        cached = self.cache.get(abstract_hash)
+        if cached is not None:
+            self.stats['documents cached'] += 1
+            return Document.from_dict(abstract_hash, cached)
+        self.stats['documents preprocessed'] += 1
+        document = Document(abstract_hash, nltk.sent_tokenize(text))
+        document.changed = True
+        return document
+
+    def get_words(self, document, index):
+        """Return the words of a sentence of the document.
+
+        The sentence is normalized and tokenized, and the stopwords are
+        removed.
+
+        Returns:
+            list: Words of the sentence.
+        """
+        words = document.words.get(index)
+        if words is None:
+            words = nltk.word_tokenize(normalize(document.sentences[index]))
+            words = [word for word in words if word not in self.stopwords]
+            document.words[index] = words
+            document.changed = True
+        return words
+
+    def get_tagged(self, document, index):
+        """Return the tagged words of a sentence of the document.
+
+        Returns:
+            list: (word, tag) tuples.
+        """
+        self.tag_sentences([(document, index)])
+        return document.get_tagged(index)
+
+    def tag_sentences(self, sentences):
+        """Tag the sentences of one or more documents in a single batch.
+
+        The words of each sentence (see `get_words`) are POS tagged.
+        Sentences which were already tagged are skipped.
+
+        Args:
+            sentences (list): (document, index) tuples, where `index` is the
+                position of the sentence in the document.
+        """
+        untagged = [(document, index) for document, index in sentences
+                    if index not in document.tags]
+        if not untagged:
+            return
+        if self.tagger is None:
+            self.tagger = BatchTagger()
+        words = [self.get_words(document, index) for document, index in untagged]
+        for (document, index), tagged in zip(untagged, self.tagger.tag_sents(words)):
+            document.tags[index] = [tag for word, tag in tagged]
+            document.changed = True
+
+    def done(self, document):
+        """Mark a document as processed, so it is stored if it changed"""
+        if self.cache is not None and document.changed:
+            self.pending.append((document.abstract_hash, document.to_dict()))
+            document.changed = False
+
+    def pop_pending(self):
+        """Return and clear the documents which should be stored in the cache"""
+        pending, self.pending = self.pending, []
+        return pending
@@ -0,0 +1,202 @@
+"""Send the papers to the worker processes in batches.
+
+The papers are sent to the worker processes in batches, so that the cost
+of the inter-process communication is shared by several papers. Two
+schedulers are available (`--scheduler`):
+    - `FixedScheduler` (the default) sends `chunksize` papers at once
+      with `Pool.imap`;
+    - `AdaptiveScheduler` groups the papers by their estimated cost
+      rather than by count, and sizes the batches from the time the
+      worker processes took to process the previous batches.
+
+The cost of a paper varies a lot: abstracts without relation stems are
+skipped after a single regular expression search, while the sentences of
+the other abstracts are split, tokenized, tagged and matched, which takes
+time proportional to the length of the abstract. With a fixed number of
+papers per batch, some batches take much longer than others, and batches
+of cheap papers spend most of their time in communication.
+
+The adaptive scheduler estimates the cost of a paper from the length of
+its abstract and whether it contains a relation stem, and keeps an
+estimate of the cost processed per second by a worker process. Batches
+are formed as the papers are read, so that each one takes about
+`TARGET_LATENCY` seconds: long enough for the communication to be
+negligible, and short enough for the work to stay balanced until the
+end of the run. Only a few batches per worker process are sent ahead, so
+the size of the batches follows the estimate, and a worker process which
+is done takes the next batch from the queue shared by all the processes.
+"""
+
+import collections
+import queue
+import time
+
+from . import utils
+
+TARGET_LATENCY = 0.2 # Seconds taken by a worker process to process a batch
+PAPER_COST = 200 # Cost of a paper skipped by the model, in characters of abstract
+MAX_PAPERS = 1000 # Maximum number of papers in a batch
+BATCHES_PER_PROCESS = 2 # Number of batches sent ahead to each worker process
+SMOOTHING = 0.2 # Weight of the latest batch in the estimate of the throughput
+
+
+def timed_call(function, papers):
+    """Call `function` in a worker process and measure its duration.
+
+    Returns:
+        (float, object): Duration of the call (s) and value returned.
+    """
+    start = time.perf_counter()
+    value = function(papers)
+    return time.perf_counter() - start, value
+
+
+class FixedScheduler:
+    """Send the papers to the worker processes `chunksize` papers at a time.
+
+    Args:
+        processes (int): Number of worker processes.
+        chunksize (int): Number of papers in a batch.
+        model (RelationsExtractor, optional): Model used by the workers.
+    """
+    def __init__(self, processes, chunksize, model=None):
+        self.processes = processes
+        self.chunksize = chunksize
+
+    def map(self, pool, function, papers, ordered=False):
+        """Apply `function` to batches of papers in the worker processes.
+
+        Args:
+            pool (multiprocessing.Pool): Pool of worker processes.
+            function (callable): Function applied to each batch (a list of
+                papers) in the worker processes.
+            papers (iterable): Papers to process.
+            ordered (bool, optional): Return the values in the order of
+                the papers rather than as soon as they are ready.
+
+        Returns:
+            iterator: Value returned by `function` for each batch.
+        """
+        imap = pool.imap if ordered else pool.imap_unordered
+        return imap(function, utils.chunks(papers, self.chunksize))
+
+
+class AdaptiveScheduler(FixedScheduler):
+    """Send the papers to the worker processes in batches of similar duration.
+
+    Args:
+        processes (int): Number of worker processes.
+        chunksize (int): Not used, the size of the batches is adjusted
+            from the observed latency.
+        model (RelationsExtractor, optional): Model used by the workers,
+            whose `stem_matcher` (if any) is used to estimate the cost of
+            the papers.
+        target_latency (float, optional): Seconds taken by a worker
+            process to process a batch.
+    """
+    def __init__(self, processes, chunksize=None, model=None, target_latency=TARGET_LATENCY):
+        super().__init__(processes, chunksize, model)
+        self.stem_matcher = getattr(model, 'stem_matcher', None)
+        self.target_latency = target_latency
+        self.window = BATCHES_PER_PROCESS * processes
+        self.throughput = None # Cost processed per second by a worker process
+        self.batch_cost = 0 # Each paper is sent alone until the throughput is known
+
+    def estimate_cost(self, paper):
+        """Estimate the cost of extracting the relations of a paper.
+
+        Abstracts without relation stems are skipped by the models, and
+        the others are processed in a time roughly proportional to their
+        length.
+        """
+        abstract = paper['Abstract']
+        if self.stem_matcher is not None and not self.stem_matcher.contains(abstract):
+            return PAPER_COST
+        return PAPER_COST + len(abstract)
+
+    def observe(self, cost, seconds):
+        """Update the size of the batches from the duration of a batch"""
+        throughput = cost / max(seconds, 1e-6)
+        if self.throughput is None:
+            self.throughput = throughput
+        else:
+            self.throughput += SMOOTHING * (throughput - self.throughput)
+        self.batch_cost = self.throughput * self.target_latency
+
+    def batches(self, papers):
+        """Group the papers into batches of `batch_cost`.
+
+        The size of each batch is decided when it is formed, so it uses
+        the latest estimate of the throughput.
+
+        Yields:
+            (list, int): Papers of each batch and their estimated cost.
+        """
+        batch = []
+        cost = 0
+        for paper in papers:
+            batch.append(paper)
+            cost += self.estimate_cost(paper)
+            if cost >= self.batch_cost or len(batch) >= MAX_PAPERS:
+                yield batch, cost
+                batch = []
+                cost = 0
+        if batch:
+            yield batch, cost
+
+    def map(self, pool, function, papers, ordered=False):
+        """Apply `function` to batches of papers in the worker processes.
+
+        Only `window` batches are sent ahead, and a new batch is formed
+        each time a batch is done. The papers are read by the calling
+        thread while the worker processes are busy.
+
+        Args:
+            pool (multiprocessing.Pool): Pool of worker processes.
+            function (callable): Function applied to each batch (a list of
+                papers) in the worker processes.
+            papers (iterable): Papers to process.
+            ordered (bool, optional): Return the values in the order of
+                the papers rather than as soon as they are ready.
+
+        Yields:
+            object: Value returned by `function` for each batch.
+        """
+        batches = self.batches(papers)
+        sent = collections.deque() # Cost and AsyncResult of the batches sent (ordered)
+        done = queue.Queue() # Cost and output of the batches done, or exceptions (unordered)
+        in_flight = 0
+        exhausted = False
+        while True:
+            while not exhausted and in_flight < self.window:
+                try:
+                    batch, cost = next(batches)
+                except StopIteration:
+                    exhausted = True
+                    break
+                if ordered:
+                    sent.append((cost, pool.apply_async(timed_call, (function, batch))))
+                else:
+                    pool.apply_async(timed_call, (function, batch),
+                                     callback=lambda output, cost=cost: done.put((cost, output)),
+                                     error_callback=done.put)
+                in_flight += 1
+            if not in_flight:
+                return
+            in_flight -= 1
+            if ordered:
+                cost, result = sent.popleft()
+                seconds, value = result.get()
+            else:
+                output = done.get()
+                if isinstance(output, BaseException):
+                    raise output
+                cost, (seconds, value) = output
+            self.observe(cost, seconds)
+            yield value
+
+
+SCHEDULERS = {
+    'fixed': FixedScheduler,
+    'adaptive': AdaptiveScheduler,
+}
@@ -0,0 +1,103 @@
+"""Split a run into shards processed independently, and merge their outputs.
+
+With `--shard i/N`, `pangaea local` processes only the i-th of N parts of
+the articles, so the N parts can run as independent jobs (e.g. on the
+nodes of a cluster) without any shared state:
+    - with multiple XML files, the files are sorted by name and dealt to
+      the shards in turn, so each shard parses only its own files;
+    - with a single XML file (or with `--sync`), every shard parses the
+      whole file and keeps the articles whose PMID hashes to the shard.
+
+The assignment depends only on the names of the files and on the PMIDs,
+so it is the same on every machine, whatever the directories of the
+files or the order of the arguments.
+
+`pangaea merge` then combines the outputs of the shards into a single
+output, with one result per PMID.
+"""
+
+import os
+import zlib
+
+from .writers import read_results
+
+
+def parse_shard(text):
+    """Parse a shard given as "i/N", where i is between 1 and N.
+
+    Raises:
+        ValueError: If the shard is not valid.
+
+    Returns:
+        Shard: The i-th of N shards.
+    """
+    try:
+        index, count = (int(part) for part in text.split('/'))
+    except ValueError:
+        raise ValueError('Invalid shard "{}", expected "i/N" (e.g. "1/4").'.format(text))
+    if not 1 <= index <= count:
+        raise ValueError('Invalid shard "{}", i must be between 1 and N.'.format(text))
+    return Shard(index, count)
+
+
+class Shard:
+    """The i-th of N parts of the articles.
+
+    Args:
+        index (int): Position of the shard, from 1 to `count`.
+        count (int): Number of shards.
+    """
+    def __init__(self, index, count):
+        self.index = index
+        self.count = count
+
+    def __str__(self):
+        return '{}/{}'.format(self.index, self.count)
+
+    def contains(self, pmid):
+        """Return True if the article with this PMID belongs to the shard.
+
+        The PMIDs are hashed with CRC32, which is the same on every
+        machine and spreads consecutive PMIDs evenly over the shards.
+        """
+        return zlib.crc32(pmid.encode('utf-8')) % self.count == self.index - 1
+
+    def select_files(self, xml_files):
+        """Return the XML files which belong to the shard.
+
+        The files are sorted by name and dealt to the shards in turn, so
+        the shards get the same number of files (give or take one).
+        """
+        ordered = sorted(xml_files, key=lambda xml_file: (os.path.basename(xml_file), xml_file))
+        selected = set(ordered[self.index - 1::self.count])
+        return [xml_file for xml_file in xml_files if xml_file in selected]
+
+
+def merge_results(results_files, stats=None):
+    """Combine the results of several outputs, keeping one result per PMID.
+
+    The outputs are read one result at a time (see
+    `pangaea.writers.read_results`), in the order given, and only the
+    first result of each PMID is kept, so only the PMIDs are kept in
+    memory.
+
+    Args:
+        results_files (list): Output files of the shards (JSON or JSON
+            Lines, optionally compressed).
+        stats (Counter, optional): Counts the results read and the
+            duplicates skipped.
+
+    Yields:
+        dict: The results, without duplicates.
+    """
+    seen = set()
+    for results_file in results_files:
+        for result in read_results(results_file):
+            if stats is not None:
+                stats['results read'] += 1
+            if result['PMID'] in seen:
+                if stats is not None:
+                    stats['duplicates'] += 1
+                continue
+            seen.add(result['PMID'])
+            yield result
@@ -0,0 +1,103 @@
+"""Keep the results up to date with the daily PubMed update files.
+
+The update files contain new articles, new versions of articles already
+published (e.g. with a corrected abstract), and `<DeleteCitation>`
+elements listing the articles removed from PubMed. The same PMID may
+therefore appear in several files, and processing the files with
+`pangaea local` duplicates the results of the revised articles.
+
+With `--sync`, the PMIDs processed are kept in a `SyncIndex`, together
+with the version and a hash of the contents of each article, the update
+file it came from, and its result. Only the articles which are new or
+whose contents changed are extracted, the result of a revised article
+replaces the previous one, and deleted articles are removed. The output
+is then written from the index, so it contains exactly one result for
+each article with relations.
+"""
+
+import json
+
+from .cache import SQLiteCache, hash_text
+
+QUERY_SIZE = 500 # Number of PMIDs looked up at once
+
+
+def hash_paper(paper):
+    """Return a hash of the contents of a paper which appear in its result"""
+    return hash_text(json.dumps(paper, sort_keys=True))
+
+
+class SyncIndex(SQLiteCache):
+    """Index of the articles processed, stored in an SQLite database.
+
+    Each article is stored with its version, the hash of its contents
+    (see `hash_paper`), the file it was read from, and its result, or
+    NULL if no relations were found.
+
+    The results depend on the model, so an index can only be used with
+    the model configuration it was built with.
+
+    Args:
+        filename (str): Path of the database (created if needed).
+        fingerprint (str): Fingerprint of the model configuration (see
+            `RelationsExtractor.fingerprint`).
+
+    Raises:
+        ValueError: If the index contains articles processed with another
+            model configuration.
+    """
+    SCHEMA = ('CREATE TABLE IF NOT EXISTS articles ('
+              'pmid INTEGER PRIMARY KEY, version INTEGER, hash TEXT, source TEXT, '
+              'model TEXT, result TEXT)')
+
+    def __init__(self, filename, fingerprint):
+        super().__init__(filename, fingerprint)
+        row = self.connection.execute(
+            'SELECT 1 FROM articles WHERE model != ? LIMIT 1', (fingerprint,)).fetchone()
+        if row is not None:
+            raise ValueError('{} was built with other model settings (genes, synonyms, relation '
+                             'words, stopwords or model parameters).'.format(filename))
+
+    def get_many(self, pmids):
+        """Return the version and hash of the articles in the index.
+
+        Returns:
+            dict: (version, hash) of each PMID found.
+        """
+        found = {}
+        pmids = list(pmids)
+        for start in range(0, len(pmids), QUERY_SIZE):
+            part = pmids[start:start + QUERY_SIZE]
+            rows = self.connection.execute(
+                'SELECT pmid, version, hash FROM articles WHERE pmid IN ({})'.format(
+                    ','.join('?' * len(part))), [int(pmid) for pmid in part])
+            for pmid, version, paper_hash in rows:
+                found[str(pmid)] = (version, paper_hash)
+        return found
+
+    def update(self, entries, deleted):
+        """Store the new and revised articles and remove the deleted ones.
+
+        Args:
+            entries (list): (pmid, version, hash, source, result) tuples,
+                where the result is None if no relations were found.
+            deleted (list): PMIDs of the articles to remove.
+        """
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO articles VALUES (?, ?, ?, ?, ?, ?)',
+                [(int(pmid), version, paper_hash, source, self.fingerprint,
+                  json.dumps(result) if result is not None else None)
+                 for pmid, version, paper_hash, source, result in entries])
+            self.connection.executemany(
+                'DELETE FROM articles WHERE pmid = ?', [(int(pmid),) for pmid in deleted])
+
+    def iter_results(self):
+        """Return the results of the articles in the index, by PMID.
+
+        Yields:
+            dict: Result of each article in which relations were found.
+        """
+        for row in self.connection.execute(
+                'SELECT result FROM articles WHERE result IS NOT NULL ORDER BY pmid'):
+            yield json.loads(row[0])
@@ -0,0 +1,199 @@
+"""Tag many sentences at once with the averaged perceptron tagger of NLTK.
+
+`nltk.pos_tag` tags one sentence at a time, and the tagger scores each word
+in pure Python by adding up the weights of its features for every tag.
+`BatchTagger` uses the same weights, stored as a NumPy matrix with one row
+per feature and one column per tag, so that the words of many sentences
+are scored together:
+    - the features which depend only on the words (e.g. the word itself,
+      its suffix, the surrounding words) are scored once for all the words
+      of the batch;
+    - the features which depend on the previous tags are scored position
+      by position, for the words at the same position of every sentence.
+
+The tags are identical to those of `nltk.pos_tag`: the scores are added
+in a different order, so when the two best tags of a word are too close
+to be told apart reliably, the word is scored again exactly as NLTK does.
+
+NumPy is optional, and without it the sentences are tagged one at a time
+by the NLTK tagger (which is still loaded only once). The same fallback is
+used with versions of NLTK whose features differ from those reproduced
+here (see `same_features`).
+"""
+
+from collections import defaultdict
+
+import nltk
+from nltk.tag.perceptron import PerceptronTagger
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MARGIN = 1e-6 # Minimum score difference between the two best tags to trust the vectorized scores
+
+
+def same_features(tagger):
+    """Return True if the tagger computes the features reproduced by `BatchTagger`.
+
+    The features are those of `PerceptronTagger._get_features` in recent
+    versions of NLTK. Older versions (e.g. 3.4.5) differ for empty words,
+    whose prefix feature they cannot compute.
+    """
+    context = tagger.START + ['', 'word'] + tagger.END
+    try:
+        features = tagger._get_features(0, '', context, '-START-', '-START2-')
+    except IndexError:
+        return False
+    return 'i pref1 ' in features
+
+
+class BatchTagger:
+    """POS tag batches of sentences with the averaged perceptron tagger.
+
+    Args:
+        tagger (PerceptronTagger, optional): Trained tagger. Defaults to
+            the English tagger used by `nltk.pos_tag`.
+        vectorize (bool, optional): Score the words with NumPy. Defaults
+            to True if NumPy is installed and the features of the tagger
+            are those reproduced by `BatchTagger` (see `same_features`).
+    """
+    def __init__(self, tagger=None, vectorize=None):
+        self.tagger = tagger or PerceptronTagger()
+        supported = same_features(self.tagger)
+        self.vectorize = np is not None and supported if vectorize is None else vectorize
+        if self.vectorize and np is None:
+            raise ValueError('Vectorized tagging requires the "numpy" package.')
+        if self.vectorize and not supported:
+            raise ValueError('Vectorized tagging does not support the tagger of NLTK {}.'.format(
+                nltk.__version__))
+        self.classes = sorted(self.tagger.model.classes)
+        if len(self.classes) < 2:
+            self.vectorize = False
+        if self.vectorize:
+            self._build_weights()
+
+    def _build_weights(self):
+        """Store the weights of the tagger in a matrix (features x tags).
+
+        The last row is left empty, for the features which have no weights.
+        """
+        model_weights = self.tagger.model.weights
+        class_index = {label: column for column, label in enumerate(self.classes)}
+        self.feature_index = {feature: row for row, feature in enumerate(model_weights)}
+        self.unknown = len(self.feature_index)
+        self.weights = np.zeros((self.unknown + 1, len(self.classes)))
+        for feature, row in self.feature_index.items():
+            for label, weight in model_weights[feature].items():
+                self.weights[row, class_index[label]] = weight
+
+    def tag(self, words):
+        return self.tag_sents([words])[0]
+
+    def tag_sents(self, sentences):
+        """Tag a batch of tokenized sentences.
+
+        Args:
+            sentences (list): Sentences, each one a list of words.
+
+        Returns:
+            list: (word, tag) tuples of each sentence.
+        """
+        if not self.vectorize:
+            return [self.tagger.tag(list(words)) for words in sentences]
+        sentences = [list(words) for words in sentences]
+        tagger = self.tagger
+        contexts = [tagger.START + [tagger.normalize(word) for word in words] + tagger.END
+                    for words in sentences]
+        tags = [[tagger.tagdict.get(word) for word in words] for words in sentences]
+
+        # Score the features which do not depend on the tags for all words
+        positions = {}
+        rows = []
+        for sentence_id, (words, context) in enumerate(zip(sentences, contexts)):
+            for i, word in enumerate(words):
+                if not tags[sentence_id][i]:
+                    positions[sentence_id, i] = len(rows)
+                    rows.append(self._word_rows(word, context, i))
+        if rows:
+            rows = np.array(rows)
+            word_scores = self.weights[rows[:, 0]]
+            for column in range(1, rows.shape[1]):
+                word_scores += self.weights[rows[:, column]]
+
+        # Score the features which depend on the previous tags, one
+        # position at a time for the words of all sentences
+        prev = [tagger.START[0]] * len(sentences)
+        prev2 = [tagger.START[1]] * len(sentences)
+        for i in range(max(map(len, sentences), default=0)):
+            active = [sentence_id for sentence_id, words in enumerate(sentences) if i < len(words)]
+            scored = [sentence_id for sentence_id in active if not tags[sentence_id][i]]
+            if scored:
+                tag_rows = np.array([
+                    self._tag_rows(prev[sentence_id], prev2[sentence_id], contexts[sentence_id], i)
+                    for sentence_id in scored])
+                scores = word_scores[[positions[sentence_id, i] for sentence_id in scored]]
+                for column in range(tag_rows.shape[1]):
+                    scores += self.weights[tag_rows[:, column]]
+                best = scores.argmax(axis=1)
+                top = np.partition(scores, -2, axis=1)
+                margins = top[:, -1] - top[:, -2]
+                for sentence_id, column, margin in zip(scored, best, margins):
+                    if margin < MARGIN:
+                        tags[sentence_id][i] = self._predict(
+                            sentences[sentence_id][i], contexts[sentence_id], i,
+                            prev[sentence_id], prev2[sentence_id])
+                    else:
+                        tags[sentence_id][i] = self.classes[column]
+            for sentence_id in active:
+                prev2[sentence_id] = prev[sentence_id]
+                prev[sentence_id] = tags[sentence_id][i]
+
+        return [list(zip(words, sentence_tags)) for words, sentence_tags in zip(sentences, tags)]
+
+    def _word_rows(self, word, context, i):
+        """Return the rows of the features of a word which do not depend on the tags.
+
+        The names of the features are the same as in
+        `PerceptronTagger._get_features`.
+        """
+        i += len(self.tagger.START)
+        get = self.feature_index.get
+        unknown = self.unknown
+        return [
+            get('bias', unknown),
+            get('i suffix ' + word[-3:], unknown),
+            get('i pref1 ' + (word[0] if word else ''), unknown),
+            get('i word ' + context[i], unknown),
+            get('i-1 word ' + context[i - 1], unknown),
+            get('i-1 suffix ' + context[i - 1][-3:], unknown),
+            get('i-2 word ' + context[i - 2], unknown),
+            get('i+1 word ' + context[i + 1], unknown),
+            get('i+1 suffix ' + context[i + 1][-3:], unknown),
+            get('i+2 word ' + context[i + 2], unknown),
+        ]
+
+    def _tag_rows(self, prev, prev2, context, i):
+        """Return the rows of the features of a word which depend on the previous tags"""
+        i += len(self.tagger.START)
+        get = self.feature_index.get
+        unknown = self.unknown
+        return [
+            get('i-1 tag ' + prev, unknown),
+            get('i-2 tag ' + prev2, unknown),
+            get('i tag+i-2 tag ' + prev + ' ' + prev2, unknown),
+            get('i-1 tag+i word ' + prev + ' ' + context[i], unknown),
+        ]
+
+    def _predict(self, word, context, i, prev, prev2):
+        """Score a word exactly as `AveragedPerceptron.predict` does"""
+        features = self.tagger._get_features(i, word, context, prev, prev2)
+        model_weights = self.tagger.model.weights
+        scores = defaultdict(float)
+        for feature, value in features.items():
+            if feature not in model_weights or value == 0:
+                continue
+            for label, weight in model_weights[feature].items():
+                scores[label] += value * weight
+        return max(self.tagger.model.classes, key=lambda label: (scores[label], label))
@@ -1,6 +1,7 @@
 import json
 import string
 import itertools
+import functools
 
 from . import STOPWORDS_FILE
 
@@ -15,23 +16,55 @@ def process_synonyms(genes, synonyms_file):
         dict: Dictionary containing the gene names provided as keys,
             and the synonyms as values.
     """
-
     with open(synonyms_file) as f:
         gene_to_syns = json.load(f)
+    return resolve_synonyms(genes, gene_to_syns)[0]
+
+
+def resolve_synonyms(genes, gene_to_syns):
+    """Find the synonyms of the genes provided, and their official symbols.
+
+    A gene is matched either by its symbol (case-sensitive), in which case
+    all its synonyms are used, or by one of its synonyms (case-insensitive),
+    in which case the other synonyms and the symbol are used. The genes
+    are looked up in sets, so the whole synonyms database is processed in
+    linear time, and the lists of `gene_to_syns` are not modified.
 
+    Args:
+        genes (list): Gene names provided by the user.
+        gene_to_syns (dict): Symbol of each gene and its synonyms.
+
+    Returns:
+        dict: Gene names found in the database as keys, and their synonyms
+            as values (see `process_synonyms`).
+        dict: Lowercase official symbol of each lowercase gene name or
+            synonym found. An official symbol always resolves to itself,
+            even if it is also a synonym of another gene. If a synonym
+            belongs to multiple genes, the first gene in the database is
+            used.
+    """
+    symbols = set(genes)
+    # First pass: the official symbols, which are never resolved to another gene
+    official = set(symbol.lower() for symbol in gene_to_syns)
+    targets_lower = set(target.lower() for target in genes)
     target_to_syns = {}
-    targets_lower = [target.lower() for target in genes]
+    canonical = {}
 
     for symbol, synonyms in gene_to_syns.items():
-        if symbol in genes:
-            target_to_syns[symbol] = synonyms
+        if symbol in symbols:
+            target_to_syns[symbol] = list(synonyms)
         else:
-            for synonym in synonyms:
-                if synonym.lower() in targets_lower:
-                    target_to_syns[synonym] = synonyms
-                    target_to_syns[synonym].append(symbol)
+            matched = [synonym for synonym in synonyms if synonym.lower() in targets_lower]
+            if not matched:
+                continue
+            for synonym in matched:
+                target_to_syns[synonym] = synonyms + [symbol]
+        canonical[symbol.lower()] = symbol.lower()
+        for synonym in synonyms:
+            name = synonym.lower()
+            canonical.setdefault(name, name if name in official else symbol.lower())
 
-    return target_to_syns
+    return target_to_syns, canonical
 
 
 def get_stopwords(stopwords_file=None):
@@ -55,6 +88,23 @@ def get_stopwords(stopwords_file=None):
         return stopwords_no_punct
 
 
+def load_stopwords(stopwords_file=None):
+    """Load the stopwords once into an immutable set.
+
+    Models should call this function when they are created rather
+    than calling `get_stopwords` for every word, as the latter
+    parses the JSON file on each call. The set can be shared by
+    the worker processes together with the model.
+
+    Args:
+        stopwords_file (str, optional): Path for the stopwords file.
+            Defaults to the module level constant `STOPWORDS_FILE`.
+    Returns:
+        frozenset: Stopwords with no punctuation
+    """
+    return frozenset(get_stopwords(stopwords_file))
+
+
 def non_null_powerset(words):
     """Create the powerset of a list of words (without the empty set).
 
@@ -68,6 +118,68 @@ def non_null_powerset(words):
             for combination in itertools.combinations(words,i)]
 
 
+def ngram_candidates(tagged_words, n, target_tags=None):
+    """Build the candidate words from the n-grams of a tagged sentence.
+
+    A candidate word is the concatenation of a combination of words
+    within an n-gram, and only combinations which contain at least one
+    word tagged with one of the `target_tags` are considered. This gives
+    the same words as going through the `non_null_powerset` of every
+    n-gram, but each word is built only once per sentence: consecutive
+    n-grams share all but one word, so only the combinations containing
+    the last word of an n-gram are new.
+
+    The words are returned in the order in which they would first be
+    built from the powersets, and there are no words if the sentence
+    is shorter than `n`.
+
+    Args:
+        tagged_words (list): List of (word, tag) tuples.
+        n (int): Number of words in the n-grams.
+        target_tags (list, optional): Tags of words which may be part of gene
+            names. If not provided, all the words may be part of gene names.
+
+    Returns:
+        list: Distinct candidate words.
+    """
+    words = [word for word, tag in tagged_words]
+    is_target = [target_tags is None or tag in target_tags for word, tag in tagged_words]
+    candidates = []
+    seen = set()
+    for start in range(len(words) - n + 1):
+        for offsets in _ngram_offsets(n, start == 0):
+            if not any(is_target[start + offset] for offset in offsets):
+                continue
+            candidate = ''.join(words[start + offset] for offset in offsets)
+            if candidate not in seen:
+                seen.add(candidate)
+                candidates.append(candidate)
+    return candidates
+
+
+@functools.lru_cache()
+def _ngram_offsets(n, first):
+    """Offsets of the word combinations within an n-gram.
+
+    Only the first n-gram uses all combinations; the others use only
+    the combinations containing their last word. Combinations are in
+    the same order as in `non_null_powerset`.
+    """
+    if first:
+        return non_null_powerset(range(n))
+    return [combination + (n - 1,) for i in range(n)
+            for combination in itertools.combinations(range(n - 1), i)]
+
+
+def chunks(iterable, size):
+    """Split an iterable into lists of `size` items (the last may be shorter)"""
+    iterator = iter(iterable)
+    chunk = list(itertools.islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(itertools.islice(iterator, size))
+
+
 def generate_filename(filename, ext):
     """Generate a filename with extension
     
@@ -0,0 +1,410 @@
+"""Write the results to disk and read them back.
+
+The writers receive the results one at a time and write them straight to
+the output file, so memory usage does not depend on the number of papers
+processed. The output may be written as a single JSON array (the default)
+or as JSON Lines (one result per line), and optionally compressed. The
+relations may also be written as an edge list, with one row per pair of
+genes found in the same sentence, as CSV or Parquet.
+
+The output file is created only when the first result is written, so no
+file is left behind if there are no results.
+"""
+
+import csv
+import gzip
+import io
+import itertools
+import json
+import os
+from abc import ABC, abstractmethod
+
+from . import utils
+
+FLUSH_INTERVAL = 50 # Number of results written between flushes
+READ_SIZE = 2 ** 16 # Number of characters read at once when streaming JSON arrays
+ROW_GROUP_SIZE = 2 ** 16 # Number of edges buffered before writing a Parquet row group
+
+COMPRESSIONS = {
+    'gzip': 'gz',
+    'zstd': 'zst',
+}
+
+
+def open_file(filename, mode='r', compression=None):
+    """Open a text file, compressed with `compression` if provided.
+
+    Raises:
+        ValueError: If the compression method is unknown, or if its
+            package is not installed.
+    """
+    if compression is None:
+        return open(filename, mode, encoding='utf-8')
+    if compression == 'gzip':
+        return gzip.open(filename, mode + 't', encoding='utf-8')
+    if compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError('zstd compression requires the "zstandard" package.')
+        f = open(filename, mode + 'b')
+        if mode == 'r':
+            stream = zstandard.ZstdDecompressor().stream_reader(f, closefd=True)
+        else:
+            stream = zstandard.ZstdCompressor().stream_writer(f, closefd=True)
+        return io.TextIOWrapper(stream, encoding='utf-8')
+    raise ValueError('Unknown compression "{}".'.format(compression))
+
+
+def get_compression(filename):
+    """Return the compression method based on the file extension"""
+    for compression, ext in COMPRESSIONS.items():
+        if filename.endswith('.' + ext):
+            return compression
+    return None
+
+
+class ResultsWriter(ABC):
+    """Write results to a file as they are produced.
+
+    The file may be written in committed segments (see `commit`), so that
+    writing can be resumed from the last segment after a crash.
+
+    Args:
+        output_file (str): Output filename without extension.
+        compression (str, optional): One of `COMPRESSIONS`.
+        flush_interval (int, optional): Number of results written
+            between flushes.
+    """
+    EXTENSION = None
+    RESUMABLE = True # Whether the file can be written in committed segments
+
+    def __init__(self, output_file, compression=None, flush_interval=FLUSH_INTERVAL):
+        if compression is not None and compression not in COMPRESSIONS:
+            raise ValueError('Unknown compression "{}".'.format(compression))
+        self.filename = self.get_filename(output_file, compression)
+        self.compression = compression
+        self.flush_interval = flush_interval
+        self.count = 0
+        self.f = None
+
+    @classmethod
+    def get_filename(cls, output_file, compression=None):
+        filename = utils.generate_filename(output_file, cls.EXTENSION)
+        if compression:
+            filename = '{}.{}'.format(filename, COMPRESSIONS[compression])
+        return filename
+
+    def open(self, append=False):
+        self.f = open_file(self.filename, 'a' if append else 'w', self.compression)
+
+    def write(self, result):
+        if self.f is None:
+            # The file is appended to after a commit
+            self.open(append=self.count > 0)
+            if not self.count:
+                self.write_header()
+        self.write_result(result)
+        self.count += 1
+        if self.count % self.flush_interval == 0:
+            self.flush()
+
+    def flush(self):
+        self.f.flush()
+
+    def close(self, complete=True):
+        """Close the file, writing its footer only if the results are complete.
+
+        An aborted run (`complete` is False) leaves the file without its
+        footer (e.g. a JSON array without its closing bracket), so it is
+        not mistaken for a complete output.
+        """
+        if not complete:
+            if self.f is not None:
+                self.f.close()
+                self.f = None
+            return
+        if self.f is None and self.count:
+            self.open(append=True)
+        if self.f is not None:
+            self.write_footer()
+            self.f.close()
+            self.f = None
+
+    def commit(self):
+        """Close the current segment of the file and sync it to disk.
+
+        The results written so far are then complete in the file (a
+        compressed file is made of one gzip member or zstd frame per
+        segment), and the next result is appended to a new segment.
+
+        Returns:
+            dict: Number of results and size of the file, to be passed to
+                `resume`.
+        """
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+            with open(self.filename, 'rb') as f:
+                os.fsync(f.fileno())
+        return {'count': self.count, 'size': os.path.getsize(self.filename) if self.count else 0}
+
+    def resume(self, state):
+        """Continue writing a file from a commit, discarding what was written after it.
+
+        Raises:
+            ValueError: If the file is missing or shorter than when it was
+                committed.
+        """
+        self.count = state['count']
+        if not self.count:
+            if os.path.exists(self.filename):
+                os.remove(self.filename)
+            return
+        if not os.path.exists(self.filename) or os.path.getsize(self.filename) < state['size']:
+            raise ValueError('Cannot resume: {} is missing or shorter than at the last '
+                             'checkpoint.'.format(self.filename))
+        os.truncate(self.filename, state['size'])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(complete=exc_type is None)
+
+    def write_header(self):
+        pass
+
+    def write_footer(self):
+        pass
+
+    @abstractmethod
+    def write_result(self, result):
+        ...
+
+
+class JSONWriter(ResultsWriter):
+    """Write the results as a single JSON array"""
+    EXTENSION = 'json'
+
+    def write_header(self):
+        self.f.write('[')
+
+    def write_result(self, result):
+        if self.count:
+            self.f.write(', ')
+        self.f.write(json.dumps(result))
+
+    def write_footer(self):
+        self.f.write(']')
+
+
+class JSONLinesWriter(ResultsWriter):
+    """Write each result as a JSON object on a separate line"""
+    EXTENSION = 'jsonl'
+
+    def write_result(self, result):
+        self.f.write(json.dumps(result))
+        self.f.write('\n')
+
+
+def iter_edges(result):
+    """Convert the relations of a paper into edges.
+
+    An edge is created for each pair of genes found in the same sentence
+    and for each relation stem found in that sentence. Sentences with
+    less than two genes do not create any edges.
+
+    Args:
+        result (dict): Result of `Parser.extract_features`.
+
+    Yields:
+        tuple: (gene_a, gene_b, stem, PMID, sentence_id), where the
+            sentence ID is the position of the relation in the paper.
+    """
+    for sentence_id, relation in enumerate(result['Relations']):
+        for gene_a, gene_b in itertools.combinations(relation['Genes'], 2):
+            for stem in relation['Stems']:
+                yield gene_a, gene_b, stem, result['PMID'], sentence_id
+
+
+class EdgesWriter(ResultsWriter):
+    """Write the relations as a CSV edge list.
+
+    The first three columns (gene_a, gene_b, stem) follow the layout of
+    the pathway edges in `data/demo/edges.csv` (source, target, type),
+    and there is no header row, so both files can be read the same way.
+    """
+    EXTENSION = 'csv'
+    COLUMNS = ['gene_a', 'gene_b', 'stem', 'pmid', 'sentence_id']
+
+    def open(self, append=False):
+        super().open(append)
+        self.csv_writer = csv.writer(self.f, lineterminator='\n')
+
+    def write_result(self, result):
+        self.csv_writer.writerows(iter_edges(result))
+
+
+class ParquetWriter(ResultsWriter):
+    """Write the relations as an edge list in a Parquet file.
+
+    The columns are the same as for `EdgesWriter`. The edges are buffered
+    and written in row groups of `ROW_GROUP_SIZE` edges, and `compression`
+    is used as the Parquet compression codec. Requires `pyarrow`.
+
+    Parquet files cannot be appended to, so they cannot be written in
+    committed segments.
+    """
+    EXTENSION = 'parquet'
+    RESUMABLE = False
+
+    def __init__(self, output_file, compression=None, flush_interval=FLUSH_INTERVAL):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ValueError('Parquet output requires the "pyarrow" package.')
+        super().__init__(output_file, compression, flush_interval)
+        self.pyarrow = pyarrow
+        self.schema = pyarrow.schema(
+            [(column, pyarrow.string()) for column in EdgesWriter.COLUMNS[:-1]]
+            + [(EdgesWriter.COLUMNS[-1], pyarrow.int32())])
+        self.rows = []
+
+    @classmethod
+    def get_filename(cls, output_file, compression=None):
+        # The compression is internal to the Parquet file
+        return utils.generate_filename(output_file, cls.EXTENSION)
+
+    def open(self, append=False):
+        # The file is written under a temporary name until it is complete
+        self.f = self.pyarrow.parquet.ParquetWriter(
+            self.temp_filename(), self.schema, compression=self.compression or 'snappy')
+
+    def temp_filename(self):
+        return '{}.tmp'.format(self.filename)
+
+    def close(self, complete=True):
+        """Close the file, keeping it only if the results are complete.
+
+        Closing a Parquet file always writes its footer, so an aborted run
+        removes the temporary file rather than leaving a valid file with
+        only some of the edges.
+        """
+        if self.f is None:
+            return
+        if complete:
+            self.write_footer()
+        self.f.close()
+        self.f = None
+        if complete:
+            os.replace(self.temp_filename(), self.filename)
+        else:
+            os.remove(self.temp_filename())
+
+    def write_result(self, result):
+        self.rows.extend(iter_edges(result))
+        if len(self.rows) >= ROW_GROUP_SIZE:
+            self.write_rows()
+
+    def write_rows(self):
+        columns = zip(*self.rows)
+        self.f.write_table(self.pyarrow.Table.from_arrays(
+            [self.pyarrow.array(column, type=field.type)
+             for column, field in zip(columns, self.schema)],
+            schema=self.schema))
+        self.rows = []
+
+    def flush(self):
+        # Row groups are written every `ROW_GROUP_SIZE` edges instead
+        pass
+
+    def write_footer(self):
+        if self.rows:
+            self.write_rows()
+
+
+WRITERS = {
+    'json': JSONWriter,
+    'jsonl': JSONLinesWriter,
+    'csv': EdgesWriter,
+    'parquet': ParquetWriter,
+}
+
+
+def read_results(filename):
+    """Read the results from an output file one at a time.
+
+    The format and compression are detected from the file extension
+    (e.g. `output.json`, `output.jsonl.gz`). Results are parsed lazily,
+    so the whole file is never loaded into memory.
+
+    Yields:
+        dict: A result, as written by one of the writers.
+    """
+    compression = get_compression(filename)
+    name = filename[:-len(COMPRESSIONS[compression]) - 1] if compression else filename
+    with open_file(filename, 'r', compression) as f:
+        if name.endswith('.' + JSONLinesWriter.EXTENSION):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from iter_json_array(f)
+
+
+def iter_json_array(f, read_size=READ_SIZE):
+    """Parse the items of a JSON array from a file object one at a time.
+
+    Raises:
+        ValueError: If the file does not contain a JSON array.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+    expected = '['
+
+    while True:
+        # Skip whitespace, reading more data if necessary
+        while pos < len(buffer) and buffer[pos].isspace():
+            pos += 1
+        if pos == len(buffer):
+            if eof:
+                raise ValueError('Unexpected end of JSON array.')
+            buffer, pos = f.read(read_size), 0
+            eof = not buffer
+            continue
+
+        char = buffer[pos]
+        if expected == '[':
+            if char != '[':
+                raise ValueError('Expected a JSON array.')
+            pos += 1
+            expected = 'first'
+        elif expected in ('first', ',') and char == ']':
+            return
+        elif expected == ',':
+            if char != ',':
+                raise ValueError('Expected "," or "]" at character {}.'.format(pos))
+            pos += 1
+            expected = 'item'
+        else:
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                item, end = None, None
+            # The item may continue in the next chunk of the file
+            if end is None or (end == len(buffer) and not eof):
+                chunk = f.read(read_size)
+                if not chunk:
+                    if end is None:
+                        raise ValueError('Invalid JSON item at character {}.'.format(pos))
+                    eof = True
+                    continue
+                buffer, pos = buffer[pos:] + chunk, 0
+                continue
+            yield item
+            pos = end
+            expected = ','
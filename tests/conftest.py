@@ -0,0 +1,103 @@
+"""Local stand-in for the Entrez E-utilities used by the download tests.
+
+The server answers `esearch` with the IDs 1 to `total`, and `efetch` with
+a minimal `PubmedArticle` for each ID requested. Failures can be injected
+to test the retries and the resumption of downloads.
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+ARTICLE = ('<PubmedArticle><MedlineCitation><PMID>{pmid}</PMID><Article>'
+           '<Journal><Title>Journal</Title></Journal><ArticleTitle>Article {pmid}</ArticleTitle>'
+           '<Abstract><AbstractText>TP53 regulates MYC.</AbstractText></Abstract>'
+           '</Article></MedlineCitation></PubmedArticle>\n')
+
+
+def articles_xml(pmids):
+    return ('<?xml version="1.0" ?>\n<PubmedArticleSet>\n'
+            + ''.join(ARTICLE.format(pmid=pmid) for pmid in pmids)
+            + '</PubmedArticleSet>\n')
+
+
+class EntrezHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        self.handle_request(url.path, parse_qs(url.query))
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length'])).decode('utf-8')
+        self.handle_request(urlparse(self.path).path, parse_qs(body))
+
+    def handle_request(self, path, params):
+        server = self.server
+        params = {key: values[0] for key, values in params.items()}
+        with server.lock:
+            server.requests.append((path, params))
+        if path.endswith('esearch.fcgi'):
+            start = int(params['retstart'])
+            end = min(server.total, start + int(params['retmax']))
+            ids = [str(pmid) for pmid in range(start + 1, end + 1)]
+            self.send(json.dumps({'esearchresult': {'idlist': ids}}), 'application/json')
+        elif path.endswith('efetch.fcgi'):
+            with server.lock:
+                server.fetches += 1
+                status = None
+                if server.fail_after is not None and server.fetches > server.fail_after:
+                    status = 500
+                elif server.failures:
+                    server.failures -= 1
+                    status = 503
+                truncate = bool(server.truncated) and status is None
+                if truncate:
+                    server.truncated -= 1
+            if status is not None:
+                self.send_error(status)
+                return
+            text = articles_xml(params['id'].split(','))
+            if truncate:
+                text = text[:len(text) // 2]
+            self.send(text, 'text/xml')
+        else:
+            self.send_error(404)
+
+    def send(self, text, content_type):
+        body = text.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', '{}; charset=UTF-8'.format(content_type))
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def entrez_server():
+    """Start a local E-utilities server.
+
+    The attributes of the server control its responses:
+        - total: number of IDs returned by `esearch`;
+        - failures: number of `efetch` requests answered with an error 503;
+        - truncated: number of `efetch` responses cut in half;
+        - fail_after: number of `efetch` requests after which all the
+          requests fail with an error 500.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), EntrezHandler)
+    server.lock = threading.Lock()
+    server.requests = []
+    server.total = 25
+    server.fetches = 0
+    server.failures = 0
+    server.truncated = 0
+    server.fail_after = None
+    server.url = 'http://127.0.0.1:{}/'.format(server.server_address[1])
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,62 @@
+import pickle
+
+from pangaea import cache, models, parser
+
+GENES_FILE = 'pangaea/data/test/genes_test.txt'
+STEMS_FILE = 'pangaea/data/test/stems_test.csv'
+XML_FILE = 'pangaea/data/test/tp53_test.xml'
+
+RELATIONS = [{'Genes': ['tp53'], 'Stems': ['regul'], 'Sentence': 'tp53 regulates'}]
+
+
+def test_get_put(tmp_path):
+    extraction_cache = cache.ExtractionCache(str(tmp_path / 'cache.db'), 'model')
+    abstract_hash = cache.hash_text('abstract')
+    assert extraction_cache.get('1', abstract_hash) is None
+    extraction_cache.put_many([('1', abstract_hash, RELATIONS)])
+    assert extraction_cache.get('1', abstract_hash) == RELATIONS
+
+
+def test_changed_abstract(tmp_path):
+    extraction_cache = cache.ExtractionCache(str(tmp_path / 'cache.db'), 'model')
+    extraction_cache.put_many([('1', cache.hash_text('abstract'), RELATIONS)])
+    assert extraction_cache.get('1', cache.hash_text('new abstract')) is None
+
+
+def test_changed_model(tmp_path):
+    filename = str(tmp_path / 'cache.db')
+    abstract_hash = cache.hash_text('abstract')
+    cache.ExtractionCache(filename, 'model').put_many([('1', abstract_hash, RELATIONS)])
+    assert cache.ExtractionCache(filename, 'other model').get('1', abstract_hash) is None
+
+
+def test_pickle_without_connection(tmp_path):
+    extraction_cache = cache.ExtractionCache(str(tmp_path / 'cache.db'), 'model')
+    extraction_cache.put_many([('1', cache.hash_text('abstract'), [])])
+    copy = pickle.loads(pickle.dumps(extraction_cache))
+    assert copy.get('1', cache.hash_text('abstract')) == []
+
+
+def test_fingerprint():
+    model = models.RulesExtractor(GENES_FILE, STEMS_FILE)
+    assert model.fingerprint() == models.RulesExtractor(GENES_FILE, STEMS_FILE).fingerprint()
+    model.N = 3
+    assert model.fingerprint() != models.RulesExtractor(GENES_FILE, STEMS_FILE).fingerprint()
+
+
+def test_worker_batch_uses_cache(tmp_path, monkeypatch):
+    model = models.RulesExtractor(GENES_FILE, STEMS_FILE)
+    extraction_cache = cache.ExtractionCache(str(tmp_path / 'cache.db'), model.fingerprint())
+    papers = list(parser.iter_articles(XML_FILE))
+    # The state of the worker is restored after the test
+    monkeypatch.setattr(parser, '_worker', {})
+    parser.init_worker(model, extraction_cache)
+
+    batch = parser.extract_worker_batch(papers)
+    assert batch.stats['cache misses'] == len(papers)
+    extraction_cache.put_many(batch.cache_entries)
+
+    cached_batch = parser.extract_worker_batch(papers)
+    assert cached_batch.stats['cache hits'] == len(papers)
+    assert not cached_batch.cache_entries
+    assert cached_batch.results == batch.results
@@ -0,0 +1,146 @@
+import json
+
+import pytest
+
+from pangaea import models, writers
+from pangaea.checkpoint import Checkpoint, check_run
+from pangaea.parser import Parser
+
+XML_FILE = 'pangaea/data/test/tp53_test.xml'
+GENES_FILE = 'pangaea/data/test/genes_test.txt'
+STEMS_FILE = 'pangaea/data/test/stems_test.csv'
+
+RESULTS = [{'PMID': str(i), 'Relations': []} for i in range(20)]
+
+
+@pytest.mark.parametrize('output_format', ['json', 'jsonl', 'csv'])
+@pytest.mark.parametrize('compression', [None, 'gzip'])
+def test_writer_resume(tmp_path, output_format, compression):
+    output_file = str(tmp_path / 'output')
+    writer = writers.WRITERS[output_format](output_file, compression)
+    for result in RESULTS[:10]:
+        writer.write(result)
+    state = writer.commit()
+    # Results written after the commit are lost in a crash
+    for result in RESULTS[10:15]:
+        writer.write(result)
+    writer.f.flush()
+
+    with writers.WRITERS[output_format](output_file, compression) as writer:
+        writer.resume(state)
+        for result in RESULTS[10:]:
+            writer.write(result)
+    if output_format != 'csv':
+        assert list(writers.read_results(writer.filename)) == RESULTS
+
+
+def test_writer_resume_without_results(tmp_path):
+    output_file = str(tmp_path / 'output')
+    writer = writers.JSONWriter(output_file)
+    for result in RESULTS:
+        writer.write(result)
+    state = writer.commit()
+    with writers.JSONWriter(output_file) as writer:
+        writer.resume(state)
+    with open(writer.filename) as f:
+        assert json.load(f) == RESULTS
+
+
+def test_writer_resume_shorter_file(tmp_path):
+    output_file = str(tmp_path / 'output')
+    writer = writers.JSONWriter(output_file)
+    for result in RESULTS:
+        writer.write(result)
+    state = writer.commit()
+    with open(writer.filename, 'r+') as f:
+        f.truncate(10)
+    with pytest.raises(ValueError):
+        writers.JSONWriter(output_file).resume(state)
+
+
+def test_checkpoint(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / 'output'))
+    assert checkpoint.filename.endswith('output.checkpoint')
+    assert not checkpoint.exists()
+    checkpoint.save({'position': {'papers': 10}})
+    assert checkpoint.load() == {'position': {'papers': 10}}
+    checkpoint.remove()
+    assert not checkpoint.exists()
+
+
+def test_check_run():
+    run = {'inputs': {'files': ['a.xml']}, 'model': 'abc', 'outputs': ['output.json']}
+    check_run({'run': run}, dict(run))
+    with pytest.raises(ValueError, match='model settings'):
+        check_run({'run': run}, dict(run, model='def'))
+    with pytest.raises(ValueError, match='input files'):
+        check_run({'run': run}, dict(run, inputs={'files': ['b.xml']}))
+
+
+def test_checkpoint_unsupported_format():
+    with pytest.raises(ValueError):
+        Parser(XML_FILE, None, '', cores=1, output_formats=['parquet'], resume=True)
+
+
+class Crash(Exception):
+    pass
+
+
+def crash_after_commits(monkeypatch, count):
+    """Interrupt the next run after `count` checkpoints"""
+    commit = Parser.commit
+    commits = []
+
+    def crash(self, results_writers):
+        commit(self, results_writers)
+        commits.append(self.position['papers'])
+        if len(commits) == count:
+            raise Crash
+    monkeypatch.setattr(Parser, 'commit', crash)
+    return commits
+
+
+@pytest.mark.parametrize('multiple_files', [False, True])
+def test_resume(tmp_path, monkeypatch, multiple_files):
+    if multiple_files:
+        with open(XML_FILE, 'rb') as f:
+            data = f.read()
+        xml_file = str(tmp_path / 'xml')
+        (tmp_path / 'xml').mkdir()
+        for name in ['a', 'b', 'c']:
+            (tmp_path / 'xml' / '{}.xml'.format(name)).write_bytes(data)
+    else:
+        xml_file = XML_FILE
+    model = models.RulesExtractor(GENES_FILE, STEMS_FILE)
+    Parser(xml_file, model, str(tmp_path / 'expected'), cores=1, ordered=True,
+           chunksize=1, output_formats=['json', 'jsonl']).process_papers()
+
+    output_file = str(tmp_path / 'output')
+    commits = crash_after_commits(monkeypatch, 2)
+    with pytest.raises(Crash):
+        Parser(xml_file, model, output_file, cores=1, chunksize=1, output_formats=['json', 'jsonl'],
+               checkpoint_interval=2).process_papers()
+    assert Checkpoint(output_file).load()['position']['papers'] == commits[-1]
+    monkeypatch.undo()
+
+    Parser(xml_file, model, output_file, cores=1, chunksize=1, output_formats=['json', 'jsonl'],
+           resume=True).process_papers()
+    assert not Checkpoint(output_file).exists()
+    for extension in ['json', 'jsonl']:
+        with open(str(tmp_path / 'output.{}'.format(extension))) as f:
+            output = f.read()
+        with open(str(tmp_path / 'expected.{}'.format(extension))) as f:
+            assert output == f.read()
+
+
+def test_resume_other_run(tmp_path, monkeypatch):
+    model = models.RulesExtractor(GENES_FILE, STEMS_FILE)
+    output_file = str(tmp_path / 'output')
+    crash_after_commits(monkeypatch, 1)
+    with pytest.raises(Crash):
+        Parser(XML_FILE, model, output_file, cores=1, chunksize=1,
+               checkpoint_interval=1).process_papers()
+    monkeypatch.undo()
+    with pytest.raises(ValueError, match='output files'):
+        Parser(XML_FILE, model, output_file, cores=1, output_formats=['jsonl'],
+               resume=True).process_papers()
@@ -1,6 +1,12 @@
-from unittest.mock import Mock, patch
+import os
+import time
+import tracemalloc
+from unittest.mock import Mock
+
+import pytest
 
 from pangaea import download
+from pangaea.parser import iter_articles
 
 DEFAULT_TERMS = ['tp53', 10, 'relevance']
 
@@ -20,16 +26,156 @@ def get_ids_result(ids_expected):
         }
     }
 
-@patch('pangaea.download.requests.get')
-def test_get_ids_simple(mock_get):
+def test_get_ids_simple():
     ids_expected = [1, 2, 3]
-    mock_get.return_value.json.return_value = get_ids_result(ids_expected)
-    ids = download.get_ids(*DEFAULT_TERMS)
+    client = Mock()
+    client.request.return_value.json.return_value = get_ids_result(ids_expected)
+    ids = download.get_ids(*DEFAULT_TERMS, client=client)
     assert ids == ids_expected
 
-@patch('pangaea.download.requests.get')
-def test_get_ids_no_ids(mock_get):
+def test_get_ids_no_ids():
     ids_expected = []
-    mock_get.return_value.json.return_value = get_ids_result(ids_expected)
-    ids = download.get_ids(*DEFAULT_TERMS)
+    client = Mock()
+    client.request.return_value.json.return_value = get_ids_result(ids_expected)
+    ids = download.get_ids(*DEFAULT_TERMS, client=client)
     assert ids == ids_expected
+
+RESPONSE = (b'<?xml version="1.0" ?>\n<PubmedArticleSet>\n<PubmedArticle>1</PubmedArticle>\n'
+            b'<PubmedArticle>2</PubmedArticle>\n</PubmedArticleSet>\n')
+
+def filter_response(response, first_article, chunk_size):
+    article_filter = download.ArticleSetFilter(first_article)
+    return b''.join(article_filter.feed(response[i:i + chunk_size])
+                    for i in range(0, len(response), chunk_size))
+
+def test_article_set_filter():
+    for chunk_size in [1, 2, 7, 20, len(RESPONSE)]:
+        assert filter_response(RESPONSE, True, chunk_size) == RESPONSE[:RESPONSE.index(b'</PubmedArticleSet>')]
+        assert filter_response(RESPONSE, False, chunk_size) == (
+            b'<PubmedArticle>1</PubmedArticle>\n<PubmedArticle>2</PubmedArticle>\n')
+
+def test_article_set_filter_no_articles():
+    response = b'<?xml version="1.0" ?>\n<PubmedArticleSet>\n</PubmedArticleSet>\n'
+    for chunk_size in [1, 3, len(response)]:
+        assert filter_response(response, False, chunk_size) == b''
+
+def get_client(server, **kwargs):
+    kwargs.setdefault('rate', 1000)
+    return download.EntrezClient(base_url=server.url, backoff=0, **kwargs)
+
+def get_pmids(xml_file):
+    with open(xml_file, 'rb') as f:
+        return [article['PMID'] for article in iter_articles(f)]
+
+@pytest.fixture
+def small_batches(monkeypatch):
+    monkeypatch.setattr(download, 'MAX_POST_LIMIT', 10)
+
+def test_get_ids_server(entrez_server):
+    ids = download.get_ids(*DEFAULT_TERMS, client=get_client(entrez_server))
+    assert ids == [str(pmid) for pmid in range(1, 11)]
+
+def test_download(entrez_server, small_batches, tmp_path):
+    output_file = download.download_pubmed(
+        'tp53', 25, str(tmp_path / 'output'), client=get_client(entrez_server), workers=3)
+    assert get_pmids(output_file) == [str(pmid) for pmid in range(1, 26)]
+    assert os.listdir(str(tmp_path)) == ['output.xml']
+
+class LargeResponse:
+    """Response of many articles, generated as it is read"""
+    def iter_content(self, chunk_size):
+        yield b'<?xml version="1.0" ?>\n<PubmedArticleSet>\n'
+        for pmid in range(20000):
+            yield b'<PubmedArticle><PMID>%d</PMID>' % pmid + b'x' * 500 + b'</PubmedArticle>\n'
+        yield b'</PubmedArticleSet>\n'
+
+def test_stream_response_memory(tmp_path):
+    # The response is streamed to disk, so it is never held in memory
+    tracemalloc.start()
+    with download.save_response(LargeResponse()) as response:
+        with open(str(tmp_path / 'output.xml'), 'wb') as f:
+            download.append_articles(response, f, first_article=False)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert os.path.getsize(str(tmp_path / 'output.xml')) > 10 ** 7
+    assert peak < 10 ** 6
+
+def test_download_retries(entrez_server, small_batches, tmp_path):
+    entrez_server.failures = 2
+    entrez_server.truncated = 1
+    output_file = download.download_pubmed(
+        'tp53', 25, str(tmp_path / 'output'), client=get_client(entrez_server))
+    assert get_pmids(output_file) == [str(pmid) for pmid in range(1, 26)]
+    assert entrez_server.fetches == 6
+
+def test_download_resume(entrez_server, small_batches, tmp_path):
+    output_file = str(tmp_path / 'output')
+    entrez_server.fail_after = 1
+    with pytest.raises(SystemExit):
+        download.download_pubmed('tp53', 25, output_file,
+                                 client=get_client(entrez_server, retries=0), workers=1)
+    checkpoint = download.Checkpoint(str(tmp_path / 'output.xml'))
+    state, ids = checkpoint.load()
+    assert state['articles'] == 10 and len(ids) == 25
+
+    # Only the remaining batches are fetched, and the IDs are not searched again
+    entrez_server.fail_after = None
+    entrez_server.requests.clear()
+    output_file = download.download_pubmed('tp53', 25, output_file, client=get_client(entrez_server))
+    assert get_pmids(output_file) == [str(pmid) for pmid in range(1, 26)]
+    assert [path for path, _ in entrez_server.requests] == ['/efetch.fcgi'] * 2
+    assert not checkpoint.exists()
+
+def test_download_resume_other_query(entrez_server, small_batches, tmp_path):
+    output_file = str(tmp_path / 'output')
+    entrez_server.fail_after = 0
+    with pytest.raises(SystemExit):
+        download.download_pubmed('tp53', 25, output_file, client=get_client(entrez_server, retries=0))
+    with pytest.raises(SystemExit, match='another query'):
+        download.download_pubmed('mdm2', 25, output_file, client=get_client(entrez_server))
+
+def test_api_key(entrez_server):
+    client = get_client(entrez_server, rate=None, api_key='key')
+    assert client.rate == download.API_KEY_RATE_LIMIT
+    download.get_ids(*DEFAULT_TERMS, client=client)
+    assert entrez_server.requests[0][1]['api_key'] == 'key'
+
+def test_rate_limiter():
+    limiter = download.RateLimiter(50, capacity=1)
+    start = time.monotonic()
+    for _ in range(6):
+        limiter.acquire()
+    assert time.monotonic() - start >= 0.09
+
+def test_stream(entrez_server, small_batches, tmp_path):
+    batches = list(download.stream_pubmed(
+        'tp53', 25, output_filename=str(tmp_path / 'output'), client=get_client(entrez_server)))
+    assert len(batches) == 3
+    pmids = [pmid for batch in batches for pmid in iter_articles_pmids(batch)]
+    assert pmids == [str(pmid) for pmid in range(1, 26)]
+    assert get_pmids(str(tmp_path / 'output.xml')) == pmids
+    assert os.listdir(str(tmp_path)) == ['output.xml']
+
+def iter_articles_pmids(document):
+    with document:
+        return [article['PMID'] for article in iter_articles(document)]
+
+def test_stream_backpressure(entrez_server, small_batches):
+    entrez_server.total = 200
+    batches = download.stream_pubmed('tp53', 200, client=get_client(entrez_server),
+                                     workers=1, queue_size=1)
+    next(batches)
+    time.sleep(0.5)
+    # One batch consumed, one in the queue, one waiting to be put, two being fetched
+    assert entrez_server.fetches <= 5
+    batches.close()
+    time.sleep(0.5)
+    assert entrez_server.fetches <= 6
+
+def test_stream_failure(entrez_server, small_batches):
+    entrez_server.fail_after = 1
+    batches = download.stream_pubmed('tp53', 25, client=get_client(entrez_server, retries=0),
+                                     workers=1)
+    next(batches)
+    with pytest.raises(ValueError, match='download failed'):
+        next(batches)
@@ -0,0 +1,71 @@
+import pickle
+
+import pytest
+
+from pangaea import index, models, parser
+
+GENES_FILE = 'pangaea/data/test/genes_test.txt'
+STEMS_FILE = 'pangaea/data/test/stems_test.csv'
+SYNONYMS_FILE = 'pangaea/data/test/gene_to_synonyms_test.json'
+
+
+@pytest.fixture
+def index_file(tmp_path):
+    filename = str(tmp_path / 'genes.index')
+    models.RulesExtractor(GENES_FILE, STEMS_FILE, SYNONYMS_FILE).build_index(filename)
+    return filename
+
+
+def test_same_genes_as_files(index_file):
+    model = models.RulesExtractor(GENES_FILE, STEMS_FILE, SYNONYMS_FILE)
+    indexed_model = models.RulesExtractor(GENES_FILE, STEMS_FILE, SYNONYMS_FILE, index_file=index_file)
+    assert indexed_model.genes_short == model.genes_short
+    assert indexed_model.genes_long == model.genes_long
+    assert indexed_model.fingerprint() == model.fingerprint()
+    text = 'We conclude that p53 associates with MYC.'
+    assert indexed_model.parse(text) == model.parse(text)
+
+
+def test_loaded_lazily(index_file):
+    model = models.RulesExtractor(GENES_FILE, STEMS_FILE, SYNONYMS_FILE, index_file=index_file)
+    assert model.index._data is None
+    model.parse('It appears that elf3 regulates tsku')
+    assert model.index._data is not None
+    assert pickle.loads(pickle.dumps(model.index))._data is None
+
+
+def test_loaded_before_fork(index_file, monkeypatch):
+    monkeypatch.setattr(parser, '_worker', {})
+    model = models.RulesExtractor(GENES_FILE, STEMS_FILE, SYNONYMS_FILE, index_file=index_file)
+    pool = parser.get_pool(1, model)
+    try:
+        # The workers inherit (or receive) the genes already loaded
+        assert model._matcher is not None
+        assert model.index._data is not None
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def test_scan_matcher_from_index(index_file):
+    model = models.RulesExtractor(GENES_FILE, STEMS_FILE, SYNONYMS_FILE, matcher='scan',
+                                  index_file=index_file)
+    assert type(model.matcher).__name__ == 'ScanMatcher'
+
+
+def test_stale_index(index_file):
+    with pytest.raises(ValueError):
+        models.RulesExtractor(GENES_FILE, STEMS_FILE, index_file=index_file)
+
+
+def test_missing_index(tmp_path):
+    with pytest.raises(ValueError):
+        models.RulesExtractor(GENES_FILE, STEMS_FILE, index_file=str(tmp_path / 'missing.index'))
+
+
+def test_index_key_changes_with_files(tmp_path):
+    genes_file = tmp_path / 'genes.txt'
+    genes_file.write_text('tp53\n')
+    key = index.index_key(str(genes_file))
+    genes_file.write_text('tp53\nmyc\n')
+    assert index.index_key(str(genes_file)) != key
@@ -0,0 +1,47 @@
+from pangaea import matchers
+
+GENES_SHORT = {'tp53': 'tp53', 'myc': 'myc', 'elf3': 'elf3', 'il6': 'il-6'}
+GENES_LONG = {'brca1p1': 'brca1p1', 'rca1p1': 'rca1p1', 'znf578': 'znf578', 'hlacdq': 'hla-c/dq'}
+
+WORDS = ['tp53', 'tp53mdm2', 'myc', 'il6', 'brca1p1', 'xbrca1p1x', 'znf578brca1p1',
+         'hlacdqtp53', 'protein', 'rca1p', '']
+
+
+def test_automaton_overlapping_patterns():
+    automaton = matchers.Automaton(['he', 'she', 'his', 'hers'])
+    assert automaton.search('ushers') == {0, 1, 3}
+
+
+def test_automaton_no_match():
+    automaton = matchers.Automaton(['abc', 'bcd'])
+    assert automaton.search('abdabd') == set()
+
+
+def test_index_matcher_same_as_scan():
+    scan = matchers.ScanMatcher(GENES_SHORT, GENES_LONG)
+    index = matchers.IndexMatcher(GENES_SHORT, GENES_LONG)
+    for word in WORDS:
+        assert index.match(word) == scan.match(word)
+
+
+def test_index_matcher_order():
+    index = matchers.IndexMatcher(GENES_SHORT, GENES_LONG)
+    assert index.match('znf578brca1p1') == ['brca1p1', 'rca1p1', 'znf578']
+
+
+STEMS = ['regul', 'activ', 'act', 'regulat', 'induc', 'a.b', 'regul']
+SENTENCES = ['TP53 regulates MDM2', 'it is activated and induced', 'x regulat y',
+             'a.b and axb', 'no relation', '']
+
+
+def test_stem_matcher_same_as_scan():
+    stem_matcher = matchers.StemMatcher(STEMS)
+    for sentence in SENTENCES:
+        assert stem_matcher.find(sentence) == [stem for stem in STEMS if stem in sentence]
+
+
+def test_stem_matcher_contains():
+    stem_matcher = matchers.StemMatcher(STEMS)
+    for sentence in SENTENCES:
+        assert stem_matcher.contains(sentence) == any(stem in sentence for stem in STEMS)
+    assert not matchers.StemMatcher([]).contains('regulates')
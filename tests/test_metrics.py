@@ -0,0 +1,54 @@
+from pangaea.metrics import Metrics, ordered
+
+
+def test_stage():
+    metrics = Metrics()
+    for _ in range(3):
+        with metrics.stage('extract'):
+            sum(range(1000))
+    assert metrics.calls['extract'] == 3
+    assert metrics.wall['extract'] > 0
+
+
+def test_disabled():
+    metrics = Metrics(enabled=False)
+    with metrics.stage('extract'):
+        metrics.count('sentences', 2)
+    assert list(metrics.timed('read papers', [1, 2])) == [1, 2]
+    assert not metrics.calls and not metrics.counts
+
+
+def test_timed():
+    metrics = Metrics()
+    assert list(metrics.timed('read papers', iter([1, 2, 3]))) == [1, 2, 3]
+    # The last call finds the end of the iterable
+    assert metrics.calls['read papers'] == 4
+
+
+def test_pop_and_update():
+    worker = Metrics()
+    total = Metrics()
+    for _ in range(2):
+        with worker.stage('batch'):
+            worker.count('papers', 5)
+        total.update(worker.pop())
+    assert not worker.calls and not worker.counts
+    assert total.calls['batch'] == 2
+    assert total.counts['papers'] == 10
+
+
+def test_report():
+    metrics = Metrics()
+    metrics.add('total', 2, 1)
+    metrics.add('batch', 2, 2)
+    metrics.add('extract/tag', 1, 1)
+    metrics.count('sentences', 1200)
+    lines = metrics.report(processes=2).splitlines()
+    assert lines[1] == 'Main process'
+    assert lines[-1] == 'Counts: 1,200 sentences'
+    assert lines[-2] == 'Workers busy 50% of the time (2 processes)'
+    assert any(line.split(' ' * 10)[0] == '    tag' for line in lines)
+
+
+def test_ordered():
+    assert ordered({'b', 'z', 'a', 'total'}, ['total', 'b']) == ['total', 'b', 'a', 'z']
@@ -1,8 +1,136 @@
+import gzip
+import json
+
+import pytest
+
+from pangaea import download, models, parser
 from pangaea.parser import Parser
 
 XML_FILE = 'pangaea/data/test/tp53_test.xml'
+GENES_FILE = 'pangaea/data/test/genes_test.txt'
+STEMS_FILE = 'pangaea/data/test/stems_test.csv'
 
 def test_parse_papers():
     parser = Parser(XML_FILE, model=None, output_file='', cores=4) 
     papers = list(parser.parse_papers())
     assert len(papers) == 5
+
+def test_write_files(tmp_path):
+    output_file = str(tmp_path / 'output')
+    parser = Parser(XML_FILE, model=None, output_file=output_file, cores=1)
+    results = [{'PMID': '1'}, None, {'PMID': '2'}]
+    parser.write_files(iter(results))
+    with open(output_file + '.json') as f:
+        assert json.load(f) == [{'PMID': '1'}, {'PMID': '2'}]
+
+def test_write_files_no_results(tmp_path):
+    output_file = str(tmp_path / 'output')
+    parser = Parser(XML_FILE, model=None, output_file=output_file, cores=1)
+    parser.write_files(iter([None, None]))
+    assert not (tmp_path / 'output.json').exists()
+
+def test_split_xml_one_article_per_range():
+    ranges = parser.split_xml(XML_FILE, split_size=1)
+    assert len(ranges) == 5
+
+def test_split_xml_same_papers():
+    papers = list(Parser(XML_FILE, model=None, output_file='', cores=1).parse_papers())
+    for split_size in [1, 5000, 10 ** 9]:
+        split_papers = [paper for task in parser.split_xml(XML_FILE, split_size)
+                        for paper in parser.parse_range(*task)]
+        assert split_papers == papers
+
+def make_xml_files(tmp_path):
+    with open(XML_FILE, 'rb') as f:
+        data = f.read()
+    with gzip.open(str(tmp_path / 'a.xml.gz'), 'wb') as f:
+        f.write(data)
+    (tmp_path / 'b.xml').write_bytes(data)
+    (tmp_path / 'c.txt').write_bytes(data)
+
+def test_find_xml_files(tmp_path):
+    make_xml_files(tmp_path)
+    expected = [str(tmp_path / 'a.xml.gz'), str(tmp_path / 'b.xml')]
+    assert parser.find_xml_files([str(tmp_path)]) == expected
+    assert parser.find_xml_files([str(tmp_path / '*.xml*')]) == expected
+
+def test_find_xml_files_missing(tmp_path):
+    with pytest.raises(ValueError):
+        parser.find_xml_files([str(tmp_path / 'missing.xml')])
+    with pytest.raises(ValueError):
+        parser.find_xml_files([str(tmp_path / '*.xml')])
+
+def test_parse_papers_multiple_files(tmp_path):
+    make_xml_files(tmp_path)
+    xml_parser = Parser(str(tmp_path), model=None, output_file='', cores=1)
+    papers = list(xml_parser.parse_papers())
+    assert len(papers) == 10
+    assert papers[:5] == papers[5:]
+
+def test_get_tasks_compressed_not_split(tmp_path):
+    make_xml_files(tmp_path)
+    xml_parser = Parser(str(tmp_path), model=None, output_file='', cores=1, split_xml=True)
+    tasks = xml_parser.get_tasks()
+    assert tasks[0] == (str(tmp_path / 'a.xml.gz'), None, None)
+    assert all(start is not None for xml_file, start, end in tasks[1:])
+
+def test_process_streamed_papers(entrez_server, tmp_path):
+    model = models.RulesExtractor(GENES_FILE, STEMS_FILE)
+    client = download.EntrezClient(base_url=entrez_server.url, rate=1000, backoff=0)
+    xml_file = download.download_pubmed('tp53', 25, str(tmp_path / 'local'), client=client)
+    Parser(xml_file, model, str(tmp_path / 'local'), cores=2, ordered=True).process_papers()
+    papers = parser.iter_documents(download.stream_pubmed('tp53', 25, client=client))
+    Parser(None, model, str(tmp_path / 'stream'), cores=2, ordered=True).process_papers(papers)
+    with open(str(tmp_path / 'local.json')) as f:
+        expected = json.load(f)
+    assert len(expected) == 25
+    with open(str(tmp_path / 'stream.json')) as f:
+        assert json.load(f) == expected
+
+def test_process_papers_metrics(tmp_path):
+    model = models.RulesExtractor(GENES_FILE, STEMS_FILE)
+    metrics_file = str(tmp_path / 'metrics.json')
+    profile_dir = str(tmp_path / 'profiles')
+    Parser(XML_FILE, model, str(tmp_path / 'output'), cores=2, chunksize=1,
+           metrics_file=metrics_file, profile_dir=profile_dir).process_papers()
+    with open(metrics_file) as f:
+        metrics = json.load(f)
+    # The metrics of the batches of all the workers are added up
+    assert metrics['counts']['papers'] == 5
+    assert metrics['stages']['batch']['calls'] == 5
+    assert metrics['counts']['stem hits'] <= metrics['counts']['sentences']
+    assert metrics['stages']['total']['wall'] >= metrics['stages']['wait for workers']['wall']
+    profiles = sorted(path.name.split('-')[0] for path in (tmp_path / 'profiles').iterdir())
+    assert profiles == ['main', 'worker', 'worker']
+
+def test_process_papers_without_metrics(tmp_path):
+    model = models.RulesExtractor(GENES_FILE, STEMS_FILE)
+    xml_parser = Parser(XML_FILE, model, str(tmp_path / 'output'), cores=1)
+    xml_parser.process_papers()
+    assert not model.metrics.enabled
+    assert not xml_parser.metrics.calls
+
+def test_process_papers_adaptive_scheduler(tmp_path):
+    model = models.RulesExtractor(GENES_FILE, STEMS_FILE)
+    for scheduler in ['fixed', 'adaptive']:
+        Parser(XML_FILE, model, str(tmp_path / scheduler), cores=2, ordered=True,
+               scheduler=scheduler).process_papers()
+    with open(str(tmp_path / 'fixed.json')) as f:
+        expected = json.load(f)
+    with open(str(tmp_path / 'adaptive.json')) as f:
+        assert json.load(f) == expected
+
+def test_extract_worker_range_in_chunks(monkeypatch):
+    model = models.RulesExtractor(GENES_FILE, STEMS_FILE)
+    monkeypatch.setattr(parser, '_worker', {})
+    parser.init_worker(model, chunksize=5)
+    expected = parser.extract_worker_range((XML_FILE, None, None))
+    sizes = []
+    parse_batch = model.parse_batch
+    monkeypatch.setattr(model, 'parse_batch', lambda texts: sizes.append(len(texts)) or parse_batch(texts))
+    parser.init_worker(model, chunksize=2)
+    batch = parser.extract_worker_range((XML_FILE, None, None))
+    # The whole file is extracted in chunks of papers
+    assert sizes == [2, 2, 1]
+    assert batch.stats['papers'] == 5
+    assert batch.results == expected.results
@@ -0,0 +1,74 @@
+import pickle
+
+from pangaea import cache, models, parser, preprocess
+
+GENES_FILE = 'pangaea/data/test/genes_test.txt'
+STEMS_FILE = 'pangaea/data/test/stems_test.csv'
+XML_FILE = 'pangaea/data/test/tp53_test.xml'
+
+
+def test_normalize():
+    assert preprocess.normalize('TP53/MDM2 (p53), binds.') == 'tp53 / mdm2 p53 binds'
+
+
+def test_document_round_trip():
+    document = preprocess.Document('hash', ['First.', 'Second one.', 'Third.'])
+    document.words = {0: [], 1: ['second', 'one'], 2: ['third']}
+    document.tags = {0: [], 1: ['JJ', 'CD']}
+    copy = preprocess.Document.from_dict('hash', document.to_dict())
+    assert copy.sentences == document.sentences
+    assert copy.words == document.words
+    assert copy.get_tagged(1) == [('second', 'JJ'), ('one', 'CD')]
+
+
+def test_document_cache(tmp_path):
+    filename = str(tmp_path / 'documents.db')
+    documents = cache.DocumentCache(filename, 'preprocessor')
+    assert documents.get('hash') is None
+    documents.put_many([('hash', {'sentences': ['A.'], 'words': {}, 'tags': {}})])
+    assert documents.get('hash') == {'sentences': ['A.'], 'words': {}, 'tags': {}}
+    assert cache.DocumentCache(filename, 'other preprocessor').get('hash') is None
+
+
+def cached_parse(model, documents, papers):
+    model.preprocessor.cache = documents
+    relations = [model.parse(paper['Abstract']) for paper in papers]
+    documents.put_many(model.preprocessor.pop_pending())
+    return relations
+
+
+def test_cached_documents_give_same_relations(tmp_path):
+    papers = list(parser.iter_articles(XML_FILE))
+    model = models.RulesExtractor(GENES_FILE, STEMS_FILE)
+    expected = [model.parse(paper['Abstract']) for paper in papers]
+
+    documents = cache.DocumentCache(str(tmp_path / 'documents.db'), model.preprocessor.fingerprint())
+    assert cached_parse(model, documents, papers) == expected
+    assert model.preprocessor.stats['documents preprocessed'] == len(papers)
+
+    cached_model = models.RulesExtractor(GENES_FILE, STEMS_FILE)
+    assert cached_parse(cached_model, documents, papers) == expected
+    assert cached_model.preprocessor.stats['documents cached'] == len(papers)
+    assert not cached_model.preprocessor.pending
+
+
+def test_documents_shared_between_models(tmp_path):
+    papers = list(parser.iter_articles(XML_FILE))
+    rules_model = models.RulesExtractor(GENES_FILE, STEMS_FILE)
+    simple_model = models.SimpleExtractor(GENES_FILE, STEMS_FILE)
+    assert rules_model.preprocessor.fingerprint() == simple_model.preprocessor.fingerprint()
+
+    expected = [simple_model.parse(paper['Abstract']) for paper in papers]
+    documents = cache.DocumentCache(str(tmp_path / 'documents.db'), rules_model.preprocessor.fingerprint())
+    cached_parse(rules_model, documents, papers)
+    assert cached_parse(simple_model, documents, papers) == expected
+    assert simple_model.preprocessor.stats['documents cached'] == len(papers)
+
+
+def test_tagger_loaded_lazily():
+    model = models.RulesExtractor(GENES_FILE, STEMS_FILE)
+    assert model.preprocessor.tagger is None
+    model.parse('It appears that elf3 regulates tsku')
+    assert model.preprocessor.tagger is not None
+    # Processes which receive the model load their own tagger
+    assert pickle.loads(pickle.dumps(model)).preprocessor.tagger is None
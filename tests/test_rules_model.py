@@ -1,9 +1,14 @@
+import nltk
+
+import pangaea
 from pangaea import parser
 from pangaea import models
+from pangaea import utils
 
 GENES_FILE = 'pangaea/data/test/genes_test.txt'
 STEMS_FILE = 'pangaea/data/test/stems_test.csv'
 SYNONYMS_FILE = 'pangaea/data/test/gene_to_synonyms_test.json'
+XML_FILE = 'pangaea/data/test/tp53_test.xml'
 
 def test_one_interaction():
     model = models.RulesExtractor(GENES_FILE, STEMS_FILE)
@@ -21,8 +26,58 @@ def test_synonyms_interaction():
     results = model.parse('We conclude that p53 associates with MYC.')
     assert len(results) == 1
 
+def test_canonical_names():
+    text = 'We conclude that p53 associates with MYC.'
+    model = models.RulesExtractor(GENES_FILE, STEMS_FILE, synonyms_file=SYNONYMS_FILE)
+    assert sorted(model.parse(text)[0]['Genes']) == ['myc', 'p53']
+    model = models.RulesExtractor(GENES_FILE, STEMS_FILE, synonyms_file=SYNONYMS_FILE,
+                                  canonical_names=True)
+    assert sorted(model.parse(text)[0]['Genes']) == ['myc', 'tp53']
+
 def test_no_synonyms_interaction():
     """p53 is a synonym for tp53"""
     model = models.RulesExtractor(GENES_FILE, STEMS_FILE)
     results = model.parse('We conclude that p53 associates with MYC.')
     assert len(results) == 0
+
+class PowersetRulesExtractor(models.RulesExtractor):
+    """Build candidate words from the powerset of every n-gram (previous approach)"""
+    def get_candidates(self, tagged_words):
+        candidates = []
+        for ngram in nltk.ngrams(tagged_words, self.N):
+            for combination in utils.non_null_powerset(ngram):
+                if any(tag in self.TARGET_TAGS for word, tag in combination):
+                    candidates.append(''.join(word for word, tag in combination))
+        return candidates
+
+def test_candidates_same_genes_as_powerset():
+    model = models.RulesExtractor(pangaea.GENES_FILE, pangaea.STEMS_FILE)
+    reference = PowersetRulesExtractor(pangaea.GENES_FILE, pangaea.STEMS_FILE)
+    papers = parser.Parser(XML_FILE, model=None, output_file='', cores=1).parse_papers()
+    for paper in papers:
+        relations = model.parse(paper['Abstract'])
+        expected = reference.parse(paper['Abstract'])
+        assert [set(r['Genes']) for r in relations] == [set(r['Genes']) for r in expected]
+
+def test_prefilter_same_relations():
+    model = models.RulesExtractor(GENES_FILE, STEMS_FILE)
+    unfiltered_model = models.RulesExtractor(GENES_FILE, STEMS_FILE, prefilter=False)
+    abstracts = [paper['Abstract'] for paper in parser.iter_articles(XML_FILE)]
+    abstracts.append('It appears that elf3 regulates tsku. This regulates nothing.')
+    assert model.parse_batch(abstracts) == unfiltered_model.parse_batch(abstracts)
+
+def test_prefilter_counts_skipped():
+    model = models.RulesExtractor(GENES_FILE, STEMS_FILE)
+    results = model.parse_batch(['It appears that elf3 regulates tsku. This regulates nothing.',
+                                 'This regulates nothing.', 'No relation here.'])
+    assert [len(relations) for relations in results] == [2, 1, 0]
+    assert results[1][0]['Genes'] == []
+    assert model.stats['sentences without genes'] == 2
+    assert model.stats['papers without genes'] == 1
+    assert model.stats['papers without stems'] == 1
+
+def test_no_prefilter_no_papers_without_genes():
+    model = models.RulesExtractor(GENES_FILE, STEMS_FILE, prefilter=False)
+    model.parse_batch(['This regulates nothing.'])
+    # The sentences are not screened, so no paper is known to have no genes
+    assert model.stats['papers without genes'] == 0
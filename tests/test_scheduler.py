@@ -0,0 +1,78 @@
+import multiprocessing as mp
+
+import pytest
+
+from pangaea import models
+from pangaea.scheduler import AdaptiveScheduler, FixedScheduler, PAPER_COST
+
+GENES_FILE = 'pangaea/data/test/genes_test.txt'
+STEMS_FILE = 'pangaea/data/test/stems_test.csv'
+
+
+def paper_ids(papers):
+    return [paper['PMID'] for paper in papers]
+
+
+def fail_on_second(papers):
+    if papers[0]['PMID'] == '1':
+        raise ValueError('Cannot parse paper 1')
+    return paper_ids(papers)
+
+
+def make_papers(number, abstract='TP53 regulates MYC.'):
+    return [{'PMID': str(i), 'Abstract': abstract} for i in range(number)]
+
+
+@pytest.fixture(scope='module')
+def pool():
+    with mp.get_context('fork').Pool(2) as pool:
+        yield pool
+
+
+def test_estimate_cost():
+    model = models.RulesExtractor(GENES_FILE, STEMS_FILE)
+    scheduler = AdaptiveScheduler(2, model=model)
+    assert scheduler.estimate_cost({'Abstract': 'Nothing to see here.'}) == PAPER_COST
+    assert scheduler.estimate_cost({'Abstract': 'TP53 regulates MYC.'}) == PAPER_COST + 19
+
+
+def test_batches_by_cost():
+    scheduler = AdaptiveScheduler(2)
+    scheduler.batch_cost = 3 * PAPER_COST
+    papers = make_papers(7, abstract='')
+    batches = list(scheduler.batches(papers))
+    assert [len(batch) for batch, cost in batches] == [3, 3, 1]
+    assert [cost for batch, cost in batches] == [3 * PAPER_COST, 3 * PAPER_COST, PAPER_COST]
+
+
+def test_observe():
+    scheduler = AdaptiveScheduler(2, target_latency=0.5)
+    scheduler.observe(1000, 1)
+    assert scheduler.batch_cost == 500
+    # Slower batches make the batches smaller
+    scheduler.observe(1000, 10)
+    assert scheduler.batch_cost < 500
+
+
+@pytest.mark.parametrize('ordered', [True, False])
+def test_map(pool, ordered):
+    papers = make_papers(50)
+    scheduler = AdaptiveScheduler(2)
+    batches = list(scheduler.map(pool, paper_ids, papers, ordered))
+    pmids = [pmid for batch in batches for pmid in batch]
+    if ordered:
+        assert pmids == paper_ids(papers)
+    else:
+        assert sorted(pmids) == sorted(paper_ids(papers))
+    assert scheduler.throughput is not None
+
+
+def test_map_error(pool):
+    scheduler = AdaptiveScheduler(2)
+    with pytest.raises(ValueError, match='paper 1'):
+        list(scheduler.map(pool, fail_on_second, make_papers(5)))
+
+
+def test_fixed_map(pool):
+    batches = list(FixedScheduler(2, 3).map(pool, paper_ids, make_papers(7), ordered=True))
+    assert batches == [['0', '1', '2'], ['3', '4', '5'], ['6']]
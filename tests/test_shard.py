@@ -0,0 +1,99 @@
+import json
+
+import pytest
+
+from pangaea import models, writers
+from pangaea.parser import Parser
+from pangaea.shard import Shard, merge_results, parse_shard
+
+XML_FILE = 'pangaea/data/test/tp53_test.xml'
+GENES_FILE = 'pangaea/data/test/genes_test.txt'
+STEMS_FILE = 'pangaea/data/test/stems_test.csv'
+
+
+def test_parse_shard():
+    shard = parse_shard('2/8')
+    assert (shard.index, shard.count) == (2, 8)
+    assert str(shard) == '2/8'
+    for text in ['0/8', '9/8', '2', 'a/b', '1/2/3']:
+        with pytest.raises(ValueError):
+            parse_shard(text)
+
+
+def test_pmids_in_one_shard():
+    shards = [Shard(index, 4) for index in range(1, 5)]
+    counts = [0] * 4
+    for pmid in range(10000):
+        found = [i for i, shard in enumerate(shards) if shard.contains(str(pmid))]
+        assert len(found) == 1
+        counts[found[0]] += 1
+    assert min(counts) > 2000
+
+
+def test_select_files():
+    xml_files = ['b/pubmed3.xml', 'a/pubmed1.xml', 'b/pubmed2.xml.gz', 'a/pubmed4.xml']
+    selected = [Shard(index, 3).select_files(xml_files) for index in range(1, 4)]
+    assert selected == [['a/pubmed1.xml', 'a/pubmed4.xml'], ['b/pubmed2.xml.gz'], ['b/pubmed3.xml']]
+    # The files are selected by name, whatever their order or directory
+    moved = ['c/pubmed4.xml', 'c/pubmed3.xml', 'c/pubmed2.xml.gz', 'c/pubmed1.xml']
+    assert Shard(1, 3).select_files(moved) == ['c/pubmed4.xml', 'c/pubmed1.xml']
+
+
+def write_results(filename, pmids):
+    with writers.JSONLinesWriter(filename) as writer:
+        for pmid in pmids:
+            writer.write({'PMID': pmid, 'Relations': []})
+    return writer.filename
+
+
+def test_merge_results(tmp_path):
+    first = write_results(str(tmp_path / 'first'), ['1', '2', '3'])
+    second = write_results(str(tmp_path / 'second'), ['3', '4'])
+    stats = {'results read': 0, 'duplicates': 0}
+    merged = list(merge_results([first, second], stats))
+    assert [result['PMID'] for result in merged] == ['1', '2', '3', '4']
+    assert stats == {'results read': 5, 'duplicates': 1}
+
+
+def run_shards(tmp_path, xml_file, count):
+    model = models.RulesExtractor(GENES_FILE, STEMS_FILE)
+    results_files = []
+    for index in range(1, count + 1):
+        output_file = str(tmp_path / 'shard{}'.format(index))
+        Parser(xml_file, model, output_file, cores=1, output_formats=['jsonl'],
+               shard=Shard(index, count)).process_papers()
+        if (tmp_path / 'shard{}.jsonl'.format(index)).exists():
+            results_files.append(output_file + '.jsonl')
+    return results_files
+
+
+def get_pmids(results):
+    return sorted(result['PMID'] for result in results)
+
+
+def test_shards_by_pmid(tmp_path):
+    model = models.RulesExtractor(GENES_FILE, STEMS_FILE)
+    Parser(XML_FILE, model, str(tmp_path / 'output'), cores=1).process_papers()
+    with open(str(tmp_path / 'output.json')) as f:
+        expected = get_pmids(json.load(f))
+    results_files = run_shards(tmp_path, XML_FILE, 3)
+    shard_pmids = [get_pmids(writers.read_results(results_file)) for results_file in results_files]
+    assert sum(len(pmids) for pmids in shard_pmids) == len(expected)
+    assert get_pmids(merge_results(results_files)) == expected
+
+
+def test_shards_by_file(tmp_path):
+    with open(XML_FILE, 'rb') as f:
+        data = f.read()
+    xml_dir = tmp_path / 'xml'
+    xml_dir.mkdir()
+    for name in ['a', 'b', 'c']:
+        (xml_dir / '{}.xml'.format(name)).write_bytes(data)
+    parser = Parser(str(xml_dir), None, '', cores=1, shard=Shard(2, 2))
+    assert parser.xml_files == [str(xml_dir / 'b.xml')]
+    assert parser.pmid_shard is None
+    # Each file contains the same articles, so there are duplicates to remove
+    results_files = run_shards(tmp_path, str(xml_dir), 2)
+    stats = {'results read': 0, 'duplicates': 0}
+    assert len(list(merge_results(results_files, stats))) == 5
+    assert stats == {'results read': 15, 'duplicates': 10}
@@ -0,0 +1,127 @@
+import json
+
+import pytest
+
+from pangaea import models, parser, sync
+from pangaea.parser import Parser
+from pangaea.shard import Shard
+
+GENES_FILE = 'pangaea/data/test/genes_test.txt'
+STEMS_FILE = 'pangaea/data/test/stems_test.csv'
+
+ARTICLE = ('<PubmedArticle><MedlineCitation><PMID Version="{version}">{pmid}</PMID><Article>'
+           '<Journal><Title>Journal</Title></Journal><ArticleTitle>Article {pmid}</ArticleTitle>'
+           '<Abstract><AbstractText>{abstract}</AbstractText></Abstract>'
+           '</Article></MedlineCitation></PubmedArticle>\n')
+
+RELATION = 'TP53 regulates MYC.'
+NO_RELATION = 'Nothing to see here.'
+
+
+def write_update_file(filename, articles=(), deleted=()):
+    with open(filename, 'w') as f:
+        f.write('<?xml version="1.0" ?>\n<PubmedArticleSet>\n')
+        for pmid, abstract, version in articles:
+            f.write(ARTICLE.format(pmid=pmid, abstract=abstract, version=version))
+        if deleted:
+            f.write('<DeleteCitation>{}</DeleteCitation>\n'.format(
+                ''.join('<PMID Version="1">{}</PMID>'.format(pmid) for pmid in deleted)))
+        f.write('</PubmedArticleSet>\n')
+    return filename
+
+
+def sync_files(tmp_path, xml_files, model=None):
+    model = model or models.RulesExtractor(GENES_FILE, STEMS_FILE)
+    output_file = str(tmp_path / 'output')
+    parser = Parser(xml_files, model, output_file, cores=1,
+                    sync_file=str(tmp_path / 'sync.db'))
+    parser.sync_papers()
+    with open(output_file + '.json') as f:
+        results = json.load(f)
+    return results, parser.stats
+
+
+@pytest.fixture
+def update_files(tmp_path):
+    first = write_update_file(str(tmp_path / 'pubmed0001.xml'), [
+        ('1', RELATION, 1), ('2', RELATION, 1), ('3', NO_RELATION, 1)])
+    second = write_update_file(str(tmp_path / 'pubmed0002.xml'), [
+        ('2', 'MYC regulates TP53.', 1), ('3', NO_RELATION, 1), ('4', RELATION, 1)], deleted=['1'])
+    return first, second
+
+
+def test_iter_citations(update_files):
+    with open(update_files[1], 'rb') as f:
+        citations = list(parser.iter_citations(f))
+    assert [(pmid, version) for pmid, version, paper in citations] == [
+        ('2', 1), ('3', 1), ('4', 1), ('1', None)]
+    assert citations[-1][2] is None
+    assert citations[0][2]['Abstract'] == 'MYC regulates TP53.'
+
+
+def test_sync(tmp_path, update_files):
+    results, stats = sync_files(tmp_path, [update_files[0]])
+    assert [result['PMID'] for result in results] == ['1', '2']
+    assert stats['articles new'] == 3
+
+    results, stats = sync_files(tmp_path, [update_files[1]])
+    assert [result['PMID'] for result in results] == ['2', '4']
+    assert results[0]['Relations'][0]['Sentence'] == 'MYC regulates TP53.'
+    assert [stats[counter] for counter in parser.SYNC_COUNTERS] == [1, 1, 1, 1]
+    assert stats['papers'] == 2
+
+
+def test_sync_unchanged(tmp_path, update_files):
+    expected, _ = sync_files(tmp_path, list(update_files))
+    results, stats = sync_files(tmp_path, [update_files[1]])
+    assert results == expected
+    assert stats['articles unchanged'] == 3
+    assert stats['papers'] == 0
+
+
+def test_sync_same_as_local(tmp_path, update_files):
+    # Without revisions or deletions, the output is the same as with `local`
+    results, _ = sync_files(tmp_path, [update_files[0]])
+    model = models.RulesExtractor(GENES_FILE, STEMS_FILE)
+    Parser(update_files[0], model, str(tmp_path / 'local'), cores=1, ordered=True).process_papers()
+    with open(str(tmp_path / 'local.json')) as f:
+        assert results == json.load(f)
+
+
+def test_sync_newer_version(tmp_path):
+    write_update_file(str(tmp_path / 'first.xml'), [('1', RELATION, 2)])
+    write_update_file(str(tmp_path / 'second.xml'), [('1', NO_RELATION, 1)])
+    results, stats = sync_files(tmp_path, [str(tmp_path / 'first.xml'), str(tmp_path / 'second.xml')])
+    assert [result['PMID'] for result in results] == ['1']
+    assert stats['articles unchanged'] == 1
+
+
+def test_sync_other_model(tmp_path, update_files):
+    sync_files(tmp_path, [update_files[0]])
+    with pytest.raises(ValueError, match='other model settings'):
+        sync_files(tmp_path, [update_files[1]], model=models.SimpleExtractor(GENES_FILE, STEMS_FILE))
+
+
+def test_sync_index_source(tmp_path, update_files):
+    sync_files(tmp_path, list(update_files))
+    index = sync.SyncIndex(str(tmp_path / 'sync.db'), models.RulesExtractor(GENES_FILE, STEMS_FILE).fingerprint())
+    sources = dict(index.connection.execute('SELECT pmid, source FROM articles'))
+    assert sources == {2: 'pubmed0002.xml', 3: 'pubmed0001.xml', 4: 'pubmed0002.xml'}
+
+
+def test_sync_shards(tmp_path, update_files):
+    expected, _ = sync_files(tmp_path, list(update_files))
+    pmids = []
+    for index in [1, 2]:
+        shard_path = tmp_path / 'shard{}'.format(index)
+        shard_path.mkdir()
+        model = models.RulesExtractor(GENES_FILE, STEMS_FILE)
+        # Update files are split by PMID, so each shard reads all the files in order
+        xml_parser = Parser(list(update_files), model, str(shard_path / 'output'), cores=1,
+                            sync_file=str(shard_path / 'sync.db'), shard=Shard(index, 2))
+        assert xml_parser.xml_files == list(update_files)
+        xml_parser.sync_papers()
+        if (shard_path / 'output.json').exists():
+            with open(str(shard_path / 'output.json')) as f:
+                pmids.extend(result['PMID'] for result in json.load(f))
+    assert sorted(pmids) == [result['PMID'] for result in expected]
@@ -0,0 +1,101 @@
+import random
+
+import nltk
+import pytest
+from nltk.tag.perceptron import PerceptronTagger
+
+from pangaea import models, parser
+from pangaea.tagger import BatchTagger
+
+GENES_FILE = 'pangaea/data/test/genes_test.txt'
+STEMS_FILE = 'pangaea/data/test/stems_test.csv'
+XML_FILE = 'pangaea/data/test/tp53_test.xml'
+
+WORDS = {
+    'NN': ['gene', 'protein', 'cell', 'expression', 'pathway', 'kinase'],
+    'NNP': ['tp53', 'mdm2', 'brca1', 'elf3', 'il-6'],
+    'VBZ': ['regulates', 'binds', 'activates', 'inhibits'],
+    'JJ': ['novel', 'mutant', 'human', 'significant'],
+    'CD': ['2019', '3', '42'],
+    'DT': ['the', 'a', 'this'],
+}
+
+
+def random_sentences(n, seed):
+    generator = random.Random(seed)
+    sentences = []
+    for _ in range(n):
+        sentence = []
+        for _ in range(generator.randint(0, 12)):
+            tag = generator.choice(sorted(WORDS))
+            word = generator.choice(WORDS[tag])
+            # Make the words ambiguous, so that the tagger learns weights
+            if generator.random() < 0.3:
+                tag = generator.choice(sorted(WORDS))
+            sentence.append((word, tag))
+        sentences.append(sentence)
+    return sentences
+
+
+@pytest.fixture(scope='module')
+def trained_tagger():
+    random.seed(0)
+    tagger = PerceptronTagger(load=False)
+    tagger.train([sentence for sentence in random_sentences(200, 1) if sentence], nr_iter=3)
+    # Keep the tag dictionary small, so that most words are scored
+    tagger.tagdict = {'the': 'DT'}
+    return tagger
+
+
+def test_same_tags_as_perceptron(trained_tagger):
+    pytest.importorskip('numpy')
+    sentences = [[word for word, tag in sentence] for sentence in random_sentences(300, 2)]
+    sentences.append(['unseen', 'words', 'with-hyphen', '1999', ''])
+    expected = [trained_tagger.tag(sentence) for sentence in sentences]
+    assert BatchTagger(trained_tagger, vectorize=True).tag_sents(sentences) == expected
+
+
+def test_ties_use_exact_scores():
+    pytest.importorskip('numpy')
+    # An untrained tagger scores all tags 0, so the tags are decided by the tie-break
+    tagger = PerceptronTagger(load=False)
+    tagger.model.classes = {'NN', 'VB', 'JJ'}
+    sentences = [['some', 'words'], ['more']]
+    assert BatchTagger(tagger, vectorize=True).tag_sents(sentences) == \
+        [tagger.tag(sentence) for sentence in sentences]
+
+
+def test_python_fallback(trained_tagger):
+    sentences = [[word for word, tag in sentence] for sentence in random_sentences(20, 3)]
+    assert BatchTagger(trained_tagger, vectorize=False).tag_sents(sentences) == \
+        [trained_tagger.tag(sentence) for sentence in sentences]
+
+
+class OldFeaturesTagger(PerceptronTagger):
+    """Tagger computing the prefix of the words as NLTK 3.4.5 does"""
+    def _get_features(self, i, word, context, prev, prev2):
+        word[0]
+        return super()._get_features(i, word, context, prev, prev2)
+
+
+def test_other_features_fallback(trained_tagger):
+    tagger = OldFeaturesTagger(load=False)
+    tagger.model = trained_tagger.model
+    tagger.tagdict = trained_tagger.tagdict
+    assert not BatchTagger(tagger).vectorize
+    sentences = [[word for word, tag in sentence] for sentence in random_sentences(20, 4)]
+    assert BatchTagger(tagger).tag_sents(sentences) == [tagger.tag(sentence) for sentence in sentences]
+    with pytest.raises(ValueError):
+        BatchTagger(tagger, vectorize=True)
+
+
+def test_same_tags_as_pos_tag():
+    sentences = [nltk.word_tokenize(paper['Abstract'].lower())
+                 for paper in parser.iter_articles(XML_FILE)]
+    assert BatchTagger().tag_sents(sentences) == [nltk.pos_tag(sentence) for sentence in sentences]
+
+
+def test_parse_batch():
+    model = models.RulesExtractor(GENES_FILE, STEMS_FILE)
+    abstracts = [paper['Abstract'] for paper in parser.iter_articles(XML_FILE)]
+    assert model.parse_batch(abstracts) == [model.parse(abstract) for abstract in abstracts]
@@ -12,6 +12,27 @@ def test_process_synonyms():
     syns = utils.process_synonyms(genes, SYNONYMS_FILE)
     assert {'tp53':['p53']} == syns
 
+def test_resolve_synonyms_by_synonym():
+    gene_to_syns = {'TP53': ['p53', 'LFS1'], 'MYC': ['c-Myc']}
+    syns, canonical = utils.resolve_synonyms(['P53', 'MYC'], gene_to_syns)
+    assert syns == {'p53': ['p53', 'LFS1', 'TP53'], 'MYC': ['c-Myc']}
+    assert canonical == {'tp53': 'tp53', 'p53': 'tp53', 'lfs1': 'tp53', 'myc': 'myc', 'c-myc': 'myc'}
+    # The lists of the database are not modified
+    assert gene_to_syns['TP53'] == ['p53', 'LFS1']
+
+def test_resolve_synonyms_symbol_synonym_of_other_gene():
+    # ABC is listed as a synonym of XYZ before its own entry
+    gene_to_syns = {'XYZ': ['ABC'], 'ABC': ['ABC1']}
+    _, canonical = utils.resolve_synonyms(['ABC', 'XYZ'], gene_to_syns)
+    assert canonical == {'xyz': 'xyz', 'abc': 'abc', 'abc1': 'abc'}
+    _, canonical = utils.resolve_synonyms(['abc'], gene_to_syns)
+    assert canonical['abc'] == 'abc'
+
+def test_resolve_synonyms_symbol_lowercase_in_genes():
+    # The symbol is appended once, even if it also matches the genes
+    syns, _ = utils.resolve_synonyms(['p53', 'tp53'], {'TP53': ['p53']})
+    assert syns == {'p53': ['p53', 'TP53']}
+
 def test_generate_filename_no_ext():
     assert utils.generate_filename('output', 'json') == 'output.json'
 
@@ -20,3 +41,37 @@ def test_generate_filename_json_ext():
 
 def test_generate_filename_other_ext():
     assert utils.generate_filename('output.csv', 'json') == 'output.json'
+
+def test_load_stopwords():
+    stopwords = utils.load_stopwords()
+    assert isinstance(stopwords, frozenset)
+    assert stopwords == set(utils.get_stopwords())
+
+def powerset_candidates(tagged_words, n, target_tags):
+    """Candidate words as built before, from the powerset of each n-gram"""
+    candidates = []
+    for i in range(len(tagged_words) - n + 1):
+        for combination in utils.non_null_powerset(tagged_words[i:i + n]):
+            if any(tag in target_tags for word, tag in combination):
+                candidates.append(''.join(word for word, tag in combination))
+    return candidates
+
+def test_ngram_candidates_same_as_powerset():
+    tagged = [('we', 'PRP'), ('found', 'VBD'), ('tp', 'NN'), ('53', 'CD'),
+              ('binds', 'VBZ'), ('mdm', 'NN'), ('2', 'CD'), ('tp', 'NN'), ('protein', 'NN')]
+    for n in range(1, 6):
+        expected = powerset_candidates(tagged, n, ['NN'])
+        candidates = utils.ngram_candidates(tagged, n, ['NN'])
+        assert candidates == list(dict.fromkeys(expected))
+
+def test_ngram_candidates_short_sentence():
+    assert utils.ngram_candidates([('tp53', 'NN')], 4, ['NN']) == []
+
+def test_ngram_candidates_all_targets():
+    tagged = [('tp', 'CD'), ('53', 'CD'), ('binds', 'VBZ')]
+    assert utils.ngram_candidates(tagged, 2) == ['tp', '53', 'tp53', 'binds', '53binds']
+    assert utils.ngram_candidates(tagged, 2, ['NN']) == []
+
+def test_chunks():
+    assert list(utils.chunks(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(utils.chunks([], 2)) == []
@@ -0,0 +1,114 @@
+import io
+import json
+
+import pytest
+
+from pangaea import writers
+
+RESULTS = [{'PMID': str(i), 'Relations': [
+               {'Genes': ['tp53', 'myc'], 'Stems': ['regul'], 'Sentence': 'a, b] [c'}]}
+           for i in range(20)]
+
+
+def write(output_file, output_format, compression=None):
+    with writers.WRITERS[output_format](output_file, compression, flush_interval=3) as writer:
+        for result in RESULTS:
+            writer.write(result)
+    return writer.filename
+
+
+@pytest.mark.parametrize('output_format', ['json', 'jsonl'])
+@pytest.mark.parametrize('compression', [None, 'gzip'])
+def test_write_and_read(tmp_path, output_format, compression):
+    filename = write(str(tmp_path / 'output'), output_format, compression)
+    assert list(writers.read_results(filename)) == RESULTS
+
+
+def test_json_writer_valid_json(tmp_path):
+    filename = write(str(tmp_path / 'output'), 'json')
+    assert filename.endswith('output.json')
+    with open(filename) as f:
+        assert json.load(f) == RESULTS
+
+
+def test_filename_compression():
+    assert writers.JSONLinesWriter.get_filename('output.json', 'gzip') == 'output.jsonl.gz'
+
+
+def test_no_results_no_file(tmp_path):
+    with writers.JSONWriter(str(tmp_path / 'output')):
+        pass
+    assert not list(tmp_path.iterdir())
+
+
+def test_aborted_json_not_closed(tmp_path):
+    with pytest.raises(KeyboardInterrupt):
+        with writers.JSONWriter(str(tmp_path / 'output')) as writer:
+            for result in RESULTS[:3]:
+                writer.write(result)
+            raise KeyboardInterrupt
+    with open(writer.filename) as f:
+        content = f.read()
+    # The output is visibly truncated rather than a shorter valid array
+    assert content.startswith('[') and not content.endswith(']')
+    with pytest.raises(ValueError):
+        json.loads(content)
+
+
+def test_aborted_parquet_removed(tmp_path):
+    pytest.importorskip('pyarrow.parquet')
+    with pytest.raises(KeyboardInterrupt):
+        with writers.ParquetWriter(str(tmp_path / 'output')) as writer:
+            for result in RESULTS[:10]:
+                writer.write(result)
+            raise KeyboardInterrupt
+    # No file which could be read as a complete (empty) edge list
+    assert not list(tmp_path.iterdir())
+
+
+def test_iter_json_array_small_reads():
+    text = ' [ ' + ' ,\n'.join(json.dumps(result) for result in RESULTS) + ' ] '
+    assert list(writers.iter_json_array(io.StringIO(text), read_size=7)) == RESULTS
+
+
+def test_iter_json_array_empty():
+    assert list(writers.iter_json_array(io.StringIO('[]'))) == []
+
+
+def test_iter_json_array_truncated():
+    with pytest.raises(ValueError):
+        list(writers.iter_json_array(io.StringIO('[{"PMID": "1"}, {"PMID"'), read_size=4))
+
+
+def test_write_and_read_zstd(tmp_path):
+    pytest.importorskip('zstandard')
+    filename = write(str(tmp_path / 'output'), 'jsonl', 'zstd')
+    assert filename.endswith('output.jsonl.zst')
+    assert list(writers.read_results(filename)) == RESULTS
+
+
+def test_iter_edges():
+    result = {'PMID': '1', 'Relations': [
+        {'Genes': ['tp53'], 'Stems': ['regul']},
+        {'Genes': ['tp53', 'myc', 'elf3'], 'Stems': ['bind', 'regul']}]}
+    assert list(writers.iter_edges(result)) == [
+        ('tp53', 'myc', 'bind', '1', 1), ('tp53', 'myc', 'regul', '1', 1),
+        ('tp53', 'elf3', 'bind', '1', 1), ('tp53', 'elf3', 'regul', '1', 1),
+        ('myc', 'elf3', 'bind', '1', 1), ('myc', 'elf3', 'regul', '1', 1)]
+
+
+def test_edges_writer(tmp_path):
+    filename = write(str(tmp_path / 'output'), 'csv')
+    with open(filename) as f:
+        rows = f.read().splitlines()
+    assert rows[:2] == ['tp53,myc,regul,0,0', 'tp53,myc,regul,1,0']
+    assert len(rows) == len(RESULTS)
+
+
+def test_parquet_writer(tmp_path):
+    parquet = pytest.importorskip('pyarrow.parquet')
+    filename = write(str(tmp_path / 'output'), 'parquet', 'gzip')
+    assert filename.endswith('output.parquet')
+    table = parquet.read_table(filename)
+    assert table.column_names == writers.EdgesWriter.COLUMNS
+    assert table.num_rows == len(RESULTS)